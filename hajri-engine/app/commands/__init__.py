@@ -0,0 +1 @@
+"""Commands module - one-off maintenance scripts (python -m app.commands.<name>)."""
@@ -0,0 +1,34 @@
+"""
+Rebuild student read models from stored attendance_summary rows.
+
+Usage:
+    python -m app.commands.rebuild_read_models [--batch-id ID] [--semester-id ID]
+
+With no ids every student with a current context is rebuilt. Nothing is
+recomputed - use /engine/admin/recompute-batch for that.
+"""
+
+import argparse
+import asyncio
+import json
+
+from app.core.database import get_async_supabase_client, close_async_supabase_client
+from app.services.read_models import rebuild_read_models
+
+
+async def main(batch_id=None, semester_id=None) -> dict:
+    db = await get_async_supabase_client()
+    try:
+        return await rebuild_read_models(db, batch_id=batch_id, semester_id=semester_id)
+    finally:
+        await close_async_supabase_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-id", help="Only students currently in this batch")
+    parser.add_argument("--semester-id", help="Only students currently in this semester")
+    args = parser.parse_args()
+    
+    result = asyncio.run(main(args.batch_id, args.semester_id))
+    print(json.dumps(result, indent=2))
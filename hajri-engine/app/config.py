@@ -16,6 +16,12 @@ class Settings(BaseSettings):
     supabase_service_key: str
     supabase_jwt_secret: str
     
+    # Database connection pool (shared async PostgREST client)
+    db_pool_max_connections: int = 50
+    db_pool_max_keepalive: int = 20
+    db_pool_keepalive_expiry: float = 30.0
+    db_timeout_seconds: float = 30.0
+    
     # App settings
     debug: bool = False
     dev_mode: bool = True  # Allow test requests without real JWT
@@ -27,6 +33,40 @@ class Settings(BaseSettings):
     # Attendance defaults
     default_required_percentage: float = 75.0
     
+    # Batch recompute: max students recomputed at once
+    batch_recompute_concurrency: int = 10
+    
+    # Recompute queue: worker count and optional SQLite file for durability
+    recompute_workers: int = 4
+    recompute_debounce_seconds: float = 2.0
+    recompute_queue_path: Optional[str] = None
+    
+    # Verified JWT cache: max tokens, and longest a token stays cached (never past exp)
+    auth_cache_size: int = 10000
+    auth_cache_ttl_seconds: float = 300.0
+    
+    # Predictions/dashboard response cache: redis:// URL to share it, else in-memory
+    response_cache_url: Optional[str] = None
+    response_cache_ttl_seconds: float = 300.0
+    
+    # Student context (app_users) cache used by auth
+    student_context_ttl_seconds: float = 30.0
+    student_context_cache_size: int = 10000
+    
+    # Semester totals: 0 = calendar cache per run, >0 = shared across runs for N seconds
+    calendar_cache_ttl_seconds: float = 0.0
+    
+    # Teaching calendar index (non-teaching dates per academic year)
+    teaching_calendar_ttl_seconds: float = 600.0
+    
+    # OCR subject code index per batch/semester used by snapshot confirm
+    subject_code_index_ttl_seconds: float = 600.0
+    subject_code_index_cache_size: int = 1000
+    
+    # Bulk semester totals: batches in flight, rows per upsert request
+    semester_totals_concurrency: int = 8
+    semester_totals_upsert_chunk: int = 500
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -4,18 +4,22 @@ Validates Bearer tokens from mobile app.
 Supports dev_mode for testing without real JWT.
 
 Auth Flow:
-1. Decode JWT to get user_id (sub claim)
-2. Lookup app_users table to get student_id
-3. Return AuthenticatedUser with student_id
+1. Decode JWT to get user_id (sub claim) - memoized per token until exp
+2. Lookup app_users table (cached) to get student_id and batch/semester
+3. Return AuthenticatedUser with student_id and context
 """
 
-from typing import Optional
+import hashlib
+import time
+from typing import Dict, Optional
 from fastapi import HTTPException, Security, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from pydantic import BaseModel
 from app.config import get_settings
-from app.core.database import get_supabase_client
+from app.core.database import get_async_supabase_client
+from app.core.cache import TTLCache
+from app.core.context import load_app_user, context_from_app_user
 
 
 security = HTTPBearer(auto_error=False)  # Don't auto-error, we handle it
@@ -28,6 +32,8 @@ class AuthenticatedUser(BaseModel):
     email: Optional[str] = None
     student_id: Optional[str] = None
     is_admin: bool = False
+    # Active batch/semester resolved during auth (see app.core.context)
+    context: Optional[Dict] = None
 
 
 async def get_current_user(
@@ -63,6 +69,45 @@ async def get_current_user(
         raise HTTPException(status_code=401, detail="Authorization header required")
     
     token = credentials.credentials
+    verified = verify_token(token)
+    
+    # Look up student_id and active batch/semester from app_users (cached)
+    app_user = None
+    try:
+        db = await get_async_supabase_client()
+        app_user = await load_app_user(db, verified.user_id)
+    except Exception:
+        # If lookup fails, continue without student_id
+        pass
+    
+    context = context_from_app_user(app_user)
+    request.state.student_context = context
+    
+    return verified.model_copy(update={
+        "student_id": app_user.get("student_id") if app_user else None,
+        "context": context
+    })
+
+
+def verify_token(token: str) -> AuthenticatedUser:
+    """
+    Verify a Supabase JWT and return the user it identifies
+    (without student_id/context, which come from app_users).
+    
+    Verified tokens are memoized by SHA-256 hash in a bounded LRU
+    until their exp (capped at auth_cache_ttl_seconds), so a client
+    polling with the same token skips decoding entirely.
+    
+    Raises:
+        HTTPException: If token is invalid or expired.
+    """
+    settings = get_settings()
+    cache = get_token_cache()
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    
+    cached = cache.get(token_key)
+    if cached is not None:
+        return cached
     
     try:
         # Decode JWT using Supabase JWT secret
@@ -72,41 +117,70 @@ async def get_current_user(
             algorithms=["HS256"],
             audience="authenticated"
         )
-        
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token: no user ID")
-        
-        # Extract user metadata
-        app_metadata = payload.get("app_metadata", {})
-        
-        # Look up student_id from app_users table
-        student_id = None
-        try:
-            db = get_supabase_client()
-            result = db.table("app_users") \
-                .select("student_id") \
-                .eq("id", user_id) \
-                .maybe_single() \
-                .execute()
-            if result.data:
-                student_id = result.data.get("student_id")
-        except Exception:
-            # If lookup fails, continue without student_id
-            pass
-        
-        return AuthenticatedUser(
-            user_id=user_id,
-            email=payload.get("email"),
-            student_id=student_id,
-            is_admin=app_metadata.get("is_admin", False)
-        )
-        
     except JWTError as e:
         raise HTTPException(
             status_code=401,
             detail=f"Invalid or expired token: {str(e)}"
         )
+    
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token: no user ID")
+    
+    # Extract user metadata
+    app_metadata = payload.get("app_metadata", {})
+    
+    verified = AuthenticatedUser(
+        user_id=user_id,
+        email=payload.get("email"),
+        is_admin=app_metadata.get("is_admin", False)
+    )
+    
+    ttl = settings.auth_cache_ttl_seconds
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        cache.set(token_key, verified, ttl_seconds=ttl)
+    
+    return verified
+
+
+_token_cache: Optional[TTLCache] = None
+
+
+def get_token_cache() -> TTLCache:
+    """Process-wide LRU of verified tokens."""
+    global _token_cache
+    
+    if _token_cache is None:
+        settings = get_settings()
+        _token_cache = TTLCache(
+            ttl_seconds=settings.auth_cache_ttl_seconds,
+            maxsize=settings.auth_cache_size
+        )
+    
+    return _token_cache
+
+
+def token_cache_stats() -> Dict:
+    """Size, hits, misses and hit rate of the verified token cache."""
+    stats = get_token_cache().stats()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def flush_token_cache() -> int:
+    """
+    Forget every verified token (e.g. after rotating the JWT secret).
+    
+    Returns:
+        Number of entries dropped.
+    """
+    cache = get_token_cache()
+    dropped = len(cache)
+    cache.clear()
+    return dropped
 
 
 async def get_current_student(
@@ -0,0 +1,102 @@
+"""
+In-process caching helpers for HAJRI Engine.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small dict-backed cache with optional expiry and size bound.
+    
+    ttl_seconds=None keeps entries until cleared (e.g. a per-run cache).
+    maxsize evicts the least recently used entry when full.
+    get_or_load() also de-duplicates concurrent loads of the same key.
+    """
+    
+    def __init__(self, ttl_seconds: Optional[float] = None, maxsize: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        self._data.clear()
+    
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, or await loader() once and cache it."""
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        
+        pending = self._loading.get(key)
+        if pending is not None:
+            # Another task is already loading this key
+            self.hits += 1
+            return await asyncio.shield(pending)
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._loading.pop(key, None)
+    
+    def stats(self) -> Dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
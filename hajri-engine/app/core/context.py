@@ -0,0 +1,107 @@
+"""
+Student context resolution for HAJRI Engine.
+
+A request resolves user -> student -> batch/semester once, in auth:
+the app_users row is read (or taken from a short-TTL cache keyed by
+user_id) and the context is attached to the AuthenticatedUser and
+request.state, so handlers don't query app_users again.
+
+Call invalidate_student_context() whenever current_batch_id or
+current_semester_id change; changes made outside the engine are picked
+up when the TTL expires. The student_id -> user_id mapping it needs
+lives in the same bounded cache. Users without a complete context
+(no app_users row yet, or mid-onboarding) are not cached, so they get
+in as soon as onboarding finishes.
+"""
+
+from typing import Dict, Optional
+from supabase import AsyncClient
+
+from app.config import get_settings
+from app.core.cache import TTLCache
+
+
+_cache: Optional[TTLCache] = None
+
+
+def get_context_cache() -> TTLCache:
+    """Process-wide app_users cache, sized and timed from settings."""
+    global _cache
+    
+    if _cache is None:
+        settings = get_settings()
+        _cache = TTLCache(
+            ttl_seconds=settings.student_context_ttl_seconds,
+            maxsize=settings.student_context_cache_size
+        )
+    
+    return _cache
+
+
+def context_from_app_user(row: Optional[Dict]) -> Optional[Dict]:
+    """
+    Build the student context (same shape as get_student_context)
+    from an app_users row.
+    
+    Returns:
+        Context dict, or None if the user has no student or no
+        active batch/semester.
+    """
+    if not row or not row.get("student_id"):
+        return None
+    if not row.get("current_batch_id") or not row.get("current_semester_id"):
+        return None
+    
+    return {
+        "student_id": row["student_id"],
+        "batch_id": row["current_batch_id"],
+        "semester_id": row["current_semester_id"],
+        "preferences": row.get("preferences") or {}
+    }
+
+
+async def load_app_user(db: AsyncClient, user_id: str) -> Optional[Dict]:
+    """
+    Get the app_users row for an auth user, from cache if fresh.
+    
+    Returns:
+        Dict with student_id, current_batch_id, current_semester_id,
+        preferences - or None if the user has no app_users row.
+    """
+    async def load() -> Optional[Dict]:
+        result = await db.table("app_users") \
+            .select("student_id, current_batch_id, current_semester_id, preferences") \
+            .eq("id", user_id) \
+            .maybe_single() \
+            .execute()
+        return result.data if result else None
+    
+    cache = get_context_cache()
+    row = await cache.get_or_load(user_id, load)
+    if context_from_app_user(row) is None:
+        # Re-read next time rather than refuse the user until the TTL expires
+        cache.invalidate(user_id)
+    else:
+        cache.set(("student", row["student_id"]), user_id)
+    return row
+
+
+def invalidate_student_context(
+    user_id: Optional[str] = None,
+    student_id: Optional[str] = None
+) -> None:
+    """
+    Drop a cached context by user_id and/or student_id.
+    With neither, the whole cache is cleared.
+    """
+    cache = get_context_cache()
+    
+    if user_id is None and student_id is None:
+        cache.clear()
+        return
+    
+    if student_id is not None:
+        user_id = cache.get(("student", student_id)) or user_id
+        cache.invalidate(("student", student_id))
+    if user_id is not None:
+        cache.invalidate(user_id)
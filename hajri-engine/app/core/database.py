@@ -1,17 +1,36 @@
 """
 Supabase database connection and helpers.
+
+Request handlers and services use the async client so PostgREST
+round trips don't block the event loop. The underlying httpx pool
+is shared by every request in the worker and sized from settings.
 """
 
-from supabase import create_client, Client
+import asyncio
+from typing import Optional
+import httpx
+from postgrest.exceptions import APIError
+from supabase import create_client, acreate_client, Client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
 from functools import lru_cache
 from app.config import get_settings
 
 
+_async_client: Optional[AsyncClient] = None
+_async_client_lock = asyncio.Lock()
+
+# PostgREST "function not found in schema cache" / Postgres undefined_function
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+# Postgres undefined_column - also what selecting a missing computed field gives
+MISSING_COLUMN_CODES = ("42703",)
+
+
 @lru_cache()
 def get_supabase_client() -> Client:
     """
-    Get Supabase client with service role key.
+    Get synchronous Supabase client with service role key.
     Service role bypasses RLS for engine computations.
+    Only for scripts - async code should use get_async_supabase_client.
     """
     settings = get_settings()
     return create_client(
@@ -20,6 +39,73 @@ def get_supabase_client() -> Client:
     )
 
 
-def get_db() -> Client:
+def build_http_pool() -> httpx.AsyncClient:
+    """
+    Build the pooled HTTP client shared by all PostgREST calls.
+    """
+    settings = get_settings()
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.db_pool_max_connections,
+            max_keepalive_connections=settings.db_pool_max_keepalive,
+            keepalive_expiry=settings.db_pool_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(settings.db_timeout_seconds)
+    )
+
+
+async def get_async_supabase_client() -> AsyncClient:
+    """
+    Get the shared async Supabase client with service role key.
+    Created once per process on first use.
+    """
+    global _async_client
+    
+    if _async_client is not None:
+        return _async_client
+    
+    async with _async_client_lock:
+        if _async_client is None:
+            settings = get_settings()
+            _async_client = await acreate_client(
+                settings.supabase_url,
+                settings.supabase_service_key,
+                options=AsyncClientOptions(
+                    httpx_client=build_http_pool(),
+                    postgrest_client_timeout=settings.db_timeout_seconds
+                )
+            )
+    
+    return _async_client
+
+
+async def close_async_supabase_client() -> None:
+    """Close the shared async client and its connection pool."""
+    global _async_client
+    
+    if _async_client is None:
+        return
+    
+    await _async_client.postgrest.aclose()
+    _async_client = None
+
+
+async def get_db() -> AsyncClient:
     """Dependency for FastAPI routes."""
-    return get_supabase_client()
+    return await get_async_supabase_client()
+
+
+def is_missing_function(error: Exception) -> bool:
+    """
+    True if an RPC failed because the SQL function isn't installed
+    (its migration hasn't been run), not because the call itself failed.
+    """
+    return isinstance(error, APIError) and error.code in MISSING_FUNCTION_CODES
+
+
+def is_missing_column(error: Exception) -> bool:
+    """
+    True if a select failed because a column or computed field isn't
+    there (its migration hasn't been run).
+    """
+    return isinstance(error, APIError) and error.code in MISSING_COLUMN_CODES
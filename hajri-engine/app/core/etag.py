@@ -0,0 +1,33 @@
+"""
+ETag / conditional GET helpers for HAJRI Engine.
+"""
+
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the given parts (body bytes or version values)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match already names this ETag."""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header.split(",")]
+    # GZipMiddleware doesn't alter ETags, but proxies may weaken them
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the ETag."""
+    return Response(status_code=304, headers={"ETag": etag})
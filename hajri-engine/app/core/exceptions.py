@@ -3,7 +3,7 @@ Policy violation exceptions for HAJRI Engine.
 These are NOT crashes - they are explainable rule violations.
 """
 
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 
 class PolicyViolation(Exception):
@@ -95,6 +95,18 @@ class InvalidDateError(PolicyViolation):
         )
 
 
+class BulkValidationError(PolicyViolation):
+    """One or more entries of a bulk request broke a rule; nothing was written."""
+    
+    def __init__(self, violations: List[Dict[str, Any]]):
+        super().__init__(
+            message=f"{len(violations)} entries were rejected. No attendance was saved.",
+            rule="BULK_VALIDATION",
+            suggestion="Fix or remove the listed entries and resend the batch.",
+            details={"violations": violations}
+        )
+
+
 class SubjectNotFoundError(PolicyViolation):
     """Subject code from OCR couldn't be matched."""
     
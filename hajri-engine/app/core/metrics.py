@@ -0,0 +1,31 @@
+"""
+Small metrics helpers for HAJRI Engine.
+"""
+
+import math
+from typing import Dict, Iterable, Sequence
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted values (0 if empty)."""
+    if not sorted_values:
+        return 0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_percentiles(samples_ms: Iterable[float]) -> Dict[str, int]:
+    """
+    Summarise latencies in milliseconds.
+    
+    Returns:
+        Dict with count, p50, p90, p99 and max.
+    """
+    values = sorted(samples_ms)
+    return {
+        "count": len(values),
+        "p50": int(percentile(values, 50)),
+        "p90": int(percentile(values, 90)),
+        "p99": int(percentile(values, 99)),
+        "max": int(values[-1]) if values else 0
+    }
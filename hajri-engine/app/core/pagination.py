@@ -0,0 +1,72 @@
+"""
+Keyset pagination helpers for HAJRI Engine.
+
+List endpoints page with an opaque cursor holding the sort key of the
+last row returned (e.g. confirmed_at + id), so the next page is an
+index range scan ("rows after this key") instead of an OFFSET scan.
+"""
+
+import base64
+import json
+import re
+from typing import Any, List, Optional, Sequence
+
+
+# Shapes a cursor value may take. Values are spliced into PostgREST
+# filters, so anything else (quotes, commas, parentheses) is rejected.
+CURSOR_PATTERNS = {
+    "date": re.compile(r"\d{4}-\d{2}-\d{2}"),
+    "timestamp": re.compile(
+        r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}(:?\d{2})?)?"
+    ),
+    "uuid": re.compile(r"[0-9a-fA-F]{8}-([0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}"),
+}
+
+
+class InvalidCursorError(ValueError):
+    """A cursor that wasn't issued by encode_cursor (or has the wrong shape)."""
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque, URL-safe cursor for a row's sort key."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], kinds: Sequence[str]) -> Optional[List[Any]]:
+    """
+    Sort key from a cursor, or None for the first page.
+    
+    kinds names the shape of each value in order (see CURSOR_PATTERNS),
+    e.g. ("timestamp", "uuid") for a (confirmed_at, id) key.
+    
+    Raises:
+        InvalidCursorError: if the cursor is malformed, has the wrong
+        number of values, or a value isn't of its kind.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(str(e))
+    if not isinstance(values, list) or len(values) != len(kinds):
+        raise InvalidCursorError(f"expected {len(kinds)} cursor values")
+    for value, kind in zip(values, kinds):
+        if not isinstance(value, str) or not CURSOR_PATTERNS[kind].fullmatch(value):
+            raise InvalidCursorError(f"cursor value is not a {kind}")
+    return values
+
+
+def keyset_filter(columns: Sequence[str], values: Sequence[Any], descending: bool = True) -> str:
+    """
+    PostgREST or() filter for rows strictly after a two-column sort key,
+    e.g. confirmed_at < t OR (confirmed_at = t AND id < i) when descending.
+    """
+    op = "lt" if descending else "gt"
+    (first, second), (first_value, second_value) = columns, values
+    return (
+        f'{first}.{op}."{first_value}",'
+        f'and({first}.eq."{first_value}",{second}.{op}."{second_value}")'
+    )
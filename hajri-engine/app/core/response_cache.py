@@ -0,0 +1,200 @@
+"""
+Read-through response cache for HAJRI Engine.
+
+Per-student JSON responses (predictions, dashboard) are cached under a
+key that includes the student's recompute version and the batch's
+semester-totals version:
+- recompute_for_student / recompute_incremental bump the student version
+- persisting semester totals bumps the batch version
+so a cached body is never served after the data behind it changed;
+old entries simply stop being addressed and expire.
+
+The default backend is in-process memory. Set RESPONSE_CACHE_URL to a
+redis:// URL to share the cache between workers (needs the optional
+`redis` package); any client with async get/set/incr works.
+"""
+
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.config import get_settings
+from app.core.cache import TTLCache
+from app.core.etag import make_etag, etag_matches, not_modified
+
+
+logger = logging.getLogger("hajri-engine.cache")
+
+
+class MemoryBackend:
+    """
+    Process-local backend on TTLCache.
+    
+    Versions are bounded like the entries, so one can be evicted. Every
+    version handed out comes from one increasing counter: a version that
+    was evicted (or never set) gets a fresh value, never one an older
+    entry may still be stored under.
+    """
+    
+    def __init__(self, maxsize: int = 50000):
+        self.entries = TTLCache(maxsize=maxsize)
+        self.versions = TTLCache(maxsize=maxsize)
+        self._clock = 0
+    
+    async def get(self, key: str) -> Optional[str]:
+        return self.entries.get(key)
+    
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        self.entries.set(key, value, ttl_seconds=ttl_seconds)
+    
+    async def get_version(self, key: str) -> int:
+        version = self.versions.get(key)
+        if version is None:
+            await self.bump_version(key)
+            version = self.versions.get(key)
+        return version
+    
+    async def bump_version(self, key: str) -> None:
+        self._clock += 1
+        self.versions.set(key, self._clock)
+
+
+class RedisBackend:
+    """
+    Shared backend on a Redis-compatible async client
+    (redis.asyncio.Redis, or any stand-in with get/set/incr).
+    """
+    
+    def __init__(self, client: Any = None, url: Optional[str] = None):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError(
+                    "RESPONSE_CACHE_URL is a redis URL but the 'redis' package is not installed"
+                ) from e
+            client = redis.from_url(url, decode_responses=True)
+        self.client = client
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+    
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        await self.client.set(key, value, ex=max(1, int(ttl_seconds)))
+    
+    async def get_version(self, key: str) -> int:
+        return int(await self.client.get(key) or 0)
+    
+    async def bump_version(self, key: str) -> None:
+        await self.client.incr(key)
+
+
+class ResponseCache:
+    """Versioned per-student response cache with ETags."""
+    
+    def __init__(self, backend: Any, ttl_seconds: float = 300.0):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+    
+    async def _key(self, kind: str, student_id: str, batch_id: str, semester_id: str) -> str:
+        student_version = await self.backend.get_version(f"hajri:ver:student:{student_id}")
+        batch_version = await self.backend.get_version(f"hajri:ver:batch:{batch_id}")
+        return f"hajri:resp:{kind}:{student_id}:{batch_id}:{semester_id}:{student_version}:{batch_version}"
+    
+    async def get_or_build(
+        self,
+        kind: str,
+        student_id: str,
+        batch_id: str,
+        semester_id: str,
+        build: Callable[[], Awaitable[BaseModel]]
+    ) -> Tuple[str, str, bool]:
+        """
+        Cached JSON body for a student, or build() it and cache it.
+        A cache backend failure falls back to building the response.
+        
+        Returns:
+            Tuple of (etag, json_body, hit)
+        """
+        key = None
+        try:
+            key = await self._key(kind, student_id, batch_id, semester_id)
+            cached = await self.backend.get(key)
+            if cached:
+                entry = json.loads(cached)
+                self.counters["hits"] += 1
+                return entry["etag"], entry["body"], True
+        except Exception:
+            self.counters["errors"] += 1
+            logger.exception("Response cache read failed")
+        
+        self.counters["misses"] += 1
+        body = (await build()).model_dump_json()
+        etag = make_etag(body.encode())
+        
+        if key is not None:
+            try:
+                await self.backend.set(key, json.dumps({"etag": etag, "body": body}), self.ttl_seconds)
+            except Exception:
+                self.counters["errors"] += 1
+                logger.exception("Response cache write failed")
+        
+        return etag, body, False
+    
+    async def respond(
+        self,
+        request: Request,
+        kind: str,
+        student_id: str,
+        batch_id: str,
+        semester_id: str,
+        build: Callable[[], Awaitable[BaseModel]]
+    ) -> Response:
+        """JSON response (or 304 if the client's ETag is current) via the cache."""
+        etag, body, hit = await self.get_or_build(kind, student_id, batch_id, semester_id, build)
+        
+        if etag_matches(request, etag):
+            self.counters["not_modified"] += 1
+            return not_modified(etag)
+        
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": etag, "X-Cache": "HIT" if hit else "MISS"}
+        )
+    
+    async def invalidate_student(self, student_id: str) -> None:
+        await self._bump(f"hajri:ver:student:{student_id}")
+    
+    async def invalidate_batch(self, batch_id: str) -> None:
+        await self._bump(f"hajri:ver:batch:{batch_id}")
+    
+    async def _bump(self, key: str) -> None:
+        # Never fail a recompute because the cache is unreachable
+        try:
+            await self.backend.bump_version(key)
+        except Exception:
+            self.counters["errors"] += 1
+            logger.exception(f"Response cache invalidation failed for {key}")
+    
+    def stats(self) -> Dict:
+        return {"backend": type(self.backend).__name__, **self.counters}
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache, backend chosen from settings."""
+    global _response_cache
+    
+    if _response_cache is None:
+        settings = get_settings()
+        url = settings.response_cache_url
+        backend = RedisBackend(url=url) if url else MemoryBackend()
+        _response_cache = ResponseCache(backend, ttl_seconds=settings.response_cache_ttl_seconds)
+    
+    return _response_cache
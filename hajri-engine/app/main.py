@@ -19,6 +19,10 @@ from typing import Dict, Any
 
 from app.config import get_settings
 from app.core.exceptions import PolicyViolation
+from app.core.database import get_async_supabase_client, close_async_supabase_client
+from app.core.auth import token_cache_stats
+from app.core.response_cache import get_response_cache
+from app.services.recompute_queue import get_recompute_queue
 from app.routers import snapshots, attendance, predictions, engine
 
 # Configure logging
@@ -77,11 +81,18 @@ async def lifespan(app: FastAPI):
     logger.info(f"   Dev mode: {settings.dev_mode}")
     logger.info(f"   Timezone: {settings.default_timezone}")
     logger.info(f"   Required attendance: {settings.default_required_percentage}%")
+    logger.info(f"   DB pool: {settings.db_pool_max_connections} connections")
+    
+    queue = get_recompute_queue()
+    await queue.start(await get_async_supabase_client())
+    logger.info(f"   Recompute workers: {settings.recompute_workers} (persistent: {queue.store is not None})")
     
     yield  # App runs here
     
     # Shutdown
     logger.info("👋 HAJRI Engine shutting down...")
+    await queue.stop()
+    await close_async_supabase_client()
     logger.info(f"   Total requests served: {request_stats['total_requests']}")
     logger.info(f"   Peak concurrent: {request_stats['peak_concurrent']}")
     logger.info(f"   Errors: {request_stats['errors']}")
@@ -181,6 +192,7 @@ async def health_check():
             "peak_concurrent": request_stats["peak_concurrent"],
             "errors": request_stats["errors"]
         },
+        "recompute_queue": get_recompute_queue().stats(),
         "config": {
             "debug": settings.debug,
             "dev_mode": settings.dev_mode,
@@ -203,5 +215,8 @@ async def get_stats():
     """Get server statistics."""
     return {
         "timestamp": pendulum.now("UTC").isoformat(),
-        **request_stats
+        **request_stats,
+        "recompute_queue": get_recompute_queue().stats(),
+        "auth_cache": token_cache_stats(),
+        "response_cache": get_response_cache().stats()
     }
@@ -6,7 +6,7 @@ from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field, field_validator
-from app.models.enums import ClassType, AttendanceStatus, PredictionStatus
+from app.models.enums import ClassType, AttendanceStatus, PredictionStatus, ComputeTrigger
 
 
 # =============================================================================
@@ -51,6 +51,32 @@ class SnapshotConfirmResponse(BaseModel):
     warnings: List[str] = []
 
 
+class SnapshotSubjectPercentage(BaseModel):
+    """One subject's percentage in a snapshot (history "percentages" projection)."""
+    course_code: str
+    class_type: Optional[str] = None
+    percentage: float
+
+
+class SnapshotHistoryItem(BaseModel):
+    """
+    A past snapshot. fields=full returns entries, fields=percentages
+    returns percentages only.
+    """
+    id: str
+    confirmed_at: datetime
+    captured_at: Optional[datetime] = None
+    source_type: Optional[str] = None
+    entries: Optional[List[Dict[str, Any]]] = None
+    percentages: Optional[List[SnapshotSubjectPercentage]] = None
+
+
+class SnapshotHistoryResponse(BaseModel):
+    """One page of snapshot history, newest first."""
+    snapshots: List[SnapshotHistoryItem]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= for the next page; null on the last page")
+
+
 # =============================================================================
 # MANUAL ATTENDANCE SCHEMAS
 # =============================================================================
@@ -78,6 +104,12 @@ class ManualAttendanceBulkRequest(BaseModel):
     entries: List[ManualAttendanceRequest] = Field(..., min_length=1, max_length=50)
 
 
+class ManualAttendanceBulkResponse(BaseModel):
+    """Response after a bulk add - one upsert, one recompute."""
+    entries: List[ManualAttendanceResponse]
+    recompute_triggered: bool
+
+
 # =============================================================================
 # ATTENDANCE SUMMARY SCHEMAS
 # =============================================================================
@@ -233,6 +265,52 @@ class RecomputeResponse(BaseModel):
     status: str
 
 
+class BatchRecomputeRequest(BaseModel):
+    """Request to recompute every student in a batch and/or semester."""
+    batch_id: Optional[str] = Field(None, description="Recompute students currently in this batch")
+    semester_id: Optional[str] = Field(None, description="Recompute students currently in this semester")
+    trigger: ComputeTrigger = Field(default=ComputeTrigger.CALENDAR_UPDATE)
+    concurrency: Optional[int] = Field(None, ge=1, le=50, description="Max students in flight")
+
+
+class StudentRecomputeResult(BaseModel):
+    """Outcome of one student's recompute within a batch run."""
+    student_id: str
+    batch_id: str
+    status: str
+    subjects_updated: int
+    duration_ms: int
+    error: Optional[str] = None
+
+
+class BatchRecomputeResponse(BaseModel):
+    """Response from a batch recompute."""
+    students_processed: int
+    students_failed: int
+    subjects_updated: int
+    groups: int
+    duration_ms: int
+    results: List[StudentRecomputeResult]
+
+
+class ConsistencyMismatch(BaseModel):
+    """One stored value that differs from a full recompute."""
+    table: str
+    subject_id: str
+    field: Optional[str] = Field(None, description="None when the whole row is missing")
+    stored: Any = None
+    expected: Any = None
+
+
+class ConsistencyReport(BaseModel):
+    """Stored rows vs full in-memory recompute for one student."""
+    student_id: str
+    consistent: bool
+    subjects_checked: int
+    mismatches: List[ConsistencyMismatch]
+    repaired: bool = False
+
+
 # =============================================================================
 # ERROR RESPONSE SCHEMAS
 # =============================================================================
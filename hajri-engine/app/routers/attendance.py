@@ -3,23 +3,30 @@ Attendance API endpoints for HAJRI Engine.
 """
 
 from datetime import date
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
-from supabase import Client
+from typing import AsyncIterator, Dict, Optional
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from supabase import AsyncClient
 import pendulum
 
 from app.core.auth import AuthenticatedUser, get_current_student
 from app.core.database import get_db
+from app.core.etag import make_etag, etag_matches, not_modified
+from app.core.pagination import decode_cursor, InvalidCursorError
 from app.core.exceptions import (
     PolicyViolation,
     SnapshotLockViolation,
     NoSnapshotError,
     InvalidDateError,
-    DuplicateEntryError
+    DuplicateEntryError,
+    BulkValidationError
 )
 from app.models.schemas import (
     ManualAttendanceRequest,
     ManualAttendanceResponse,
     ManualAttendanceBulkRequest,
+    ManualAttendanceBulkResponse,
     AttendanceSummaryResponse,
     SubjectSummary,
     PolicyViolationResponse
@@ -27,10 +34,20 @@ from app.models.schemas import (
 from app.models.enums import ComputeTrigger, AttendanceStatus
 from app.services.snapshots import get_latest_snapshot
 from app.services.attendance import (
-    recompute_for_student,
     get_student_context,
-    get_subjects_for_batch
+    get_subjects_for_batch,
+    get_summary_version,
+    list_manual_entries,
+    iter_manual_entries,
+    manual_entry_delta,
+    manual_entry_key,
+    manual_entry_row,
+    upsert_manual_entries,
+    validate_manual_entries
 )
+from app.services.recompute_queue import get_recompute_queue
+from app.services.read_models import get_read_model, is_current, render_summary
+from app.services.semester_totals import is_teaching_day, non_teaching_days
 from app.services.predictions import compute_percentage, determine_status
 from app.config import get_settings
 
@@ -48,9 +65,8 @@ router = APIRouter(prefix="/attendance", tags=["Attendance"])
 )
 async def add_manual_attendance(
     request: ManualAttendanceRequest,
-    background_tasks: BackgroundTasks,
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Add a manual attendance entry.
@@ -64,7 +80,7 @@ async def add_manual_attendance(
     
     try:
         # Get context
-        context = await get_student_context(db, user.student_id)
+        context = user.context or await get_student_context(db, user.student_id)
         batch_id = context["batch_id"]
         
         # Get latest snapshot
@@ -83,58 +99,30 @@ async def add_manual_attendance(
                 str(snapshot_date)
             )
         
-        # Validate it's a teaching day (call database function)
-        teaching_check = db.rpc(
-            "is_teaching_day",
-            {"check_date": request.event_date.isoformat()}
-        ).execute()
-        
-        if teaching_check.data is False:
+        # Validate it's a teaching day (in-memory teaching calendar)
+        if not await is_teaching_day(db, request.event_date):
             raise InvalidDateError(
                 str(request.event_date),
                 "Not a teaching day (holiday or weekly off)"
             )
         
-        # Check for duplicate
-        existing = db.table("manual_attendance") \
-            .select("id") \
-            .eq("student_id", user.student_id) \
-            .eq("subject_id", request.subject_id) \
-            .eq("event_date", request.event_date.isoformat()) \
-            .eq("class_type", request.class_type.value) \
-            .limit(1) \
-            .execute()
-        
-        if existing.data:
-            # Update existing entry
-            result = db.table("manual_attendance") \
-                .update({
-                    "status": request.status.value,
-                    "period_slot": request.period_slot
-                }) \
-                .eq("id", existing.data[0]["id"]) \
-                .execute()
-            entry_id = existing.data[0]["id"]
-        else:
-            # Insert new entry
-            result = db.table("manual_attendance").insert({
-                "student_id": user.student_id,
-                "subject_id": request.subject_id,
-                "snapshot_id": snapshot_id,
-                "event_date": request.event_date.isoformat(),
-                "class_type": request.class_type.value,
-                "status": request.status.value,
-                "period_slot": request.period_slot
-            }).execute()
-            entry_id = result.data[0]["id"]
+        # Insert or update in one round trip (an existing entry for the
+        # same subject/date/class type is updated, never duplicated)
+        written = await upsert_manual_entries(db, [manual_entry_row(
+            user.student_id, snapshot_id, request.subject_id, request.event_date,
+            request.class_type, request.status, request.period_slot
+        )])
+        entry_id = written[0]["id"]
+        old_status = written[0]["previous_status"]
         
-        # Trigger recomputation in background
-        background_tasks.add_task(
-            recompute_for_student,
-            db,
+        # Queue recomputation (coalesced per student, incremental)
+        await get_recompute_queue().enqueue(
             user.student_id,
             ComputeTrigger.MANUAL_ENTRY,
-            entry_id
+            entry_id,
+            delta=manual_entry_delta(
+                request.subject_id, request.event_date, old_status, request.status
+            )
         )
         
         return ManualAttendanceResponse(
@@ -149,24 +137,141 @@ async def add_manual_attendance(
         raise HTTPException(status_code=400, detail=e.to_dict())
 
 
+@router.post(
+    "/manual/bulk",
+    response_model=ManualAttendanceBulkResponse,
+    responses={
+        400: {"model": PolicyViolationResponse, "description": "Policy violation"},
+        401: {"description": "Unauthorized"}
+    }
+)
+async def add_manual_attendance_bulk(
+    request: ManualAttendanceBulkRequest,
+    user: AuthenticatedUser = Depends(get_current_student),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Add up to 50 manual attendance entries at once (e.g. back-filling a week).
+    
+    Same rules as POST /manual, checked for every entry before anything
+    is written - one bad entry rejects the batch and lists every violation.
+    Valid batches are saved with one upsert and trigger one recompute.
+    If an entry repeats (same subject, date and class type) the last one wins.
+    """
+    try:
+        context = user.context or await get_student_context(db, user.student_id)
+        batch_id = context["batch_id"]
+        
+        snapshot = await get_latest_snapshot(db, user.student_id, batch_id)
+        if not snapshot:
+            raise NoSnapshotError(user.student_id)
+        
+        snapshot_date = pendulum.parse(snapshot["confirmed_at"]).date()
+        
+        # Each date against its own academic year's calendar (a batch
+        # may span two); one calendar load per year at most
+        non_teaching = await non_teaching_days(db, [entry.event_date for entry in request.entries])
+        
+        violations = validate_manual_entries(request.entries, snapshot_date, non_teaching)
+        if violations:
+            raise BulkValidationError(violations)
+        
+        # One upsert can't touch the same row twice
+        entries = {
+            manual_entry_key(entry.subject_id, entry.event_date, entry.class_type): entry
+            for entry in request.entries
+        }
+        
+        # One upsert; previous statuses come back with it so the
+        # recompute can stay incremental
+        written = await upsert_manual_entries(db, [
+            manual_entry_row(
+                user.student_id, snapshot["id"], entry.subject_id, entry.event_date,
+                entry.class_type, entry.status, entry.period_slot
+            )
+            for entry in entries.values()
+        ])
+        by_key = {
+            manual_entry_key(row["subject_id"], row["event_date"], row["class_type"]): row
+            for row in written
+        }
+        
+        # Exactly one recompute for the whole batch
+        await get_recompute_queue().enqueue(
+            user.student_id,
+            ComputeTrigger.MANUAL_ENTRY,
+            written[-1]["id"] if written else None,
+            deltas=[
+                manual_entry_delta(
+                    entry.subject_id, entry.event_date, by_key[key]["previous_status"], entry.status
+                )
+                for key, entry in entries.items()
+            ]
+        )
+        
+        return ManualAttendanceBulkResponse(
+            entries=[
+                ManualAttendanceResponse(
+                    id=by_key[key]["id"],
+                    subject_id=entry.subject_id,
+                    event_date=entry.event_date,
+                    status=entry.status,
+                    recompute_triggered=True
+                )
+                for key, entry in entries.items()
+            ],
+            recompute_triggered=True
+        )
+        
+    except PolicyViolation as e:
+        raise HTTPException(status_code=400, detail=e.to_dict())
+
+
+def _summary_etag(student_id: str, context: Dict, last_recomputed_at: Optional[str]) -> str:
+    return make_etag(
+        "summary", student_id, context["batch_id"], context["semester_id"], last_recomputed_at
+    )
+
+
 @router.get(
     "/summary",
     response_model=AttendanceSummaryResponse
 )
 async def get_summary(
+    request: Request,
+    response: Response,
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get pre-computed attendance summary.
     
     This is a READ-ONLY endpoint - no computation happens here.
-    Data is pre-computed on every snapshot confirm or manual entry.
+    Data is pre-computed on every snapshot confirm or manual entry
+    and served from the student's read model (one primary-key read);
+    without one it falls back to joining attendance_summary.
+    
+    ETag is derived from the latest last_recomputed_at; a matching
+    If-None-Match gets 304 without any further query.
     """
-    context = await get_student_context(db, user.student_id)
+    context = user.context or await get_student_context(db, user.student_id)
+    
+    document = await get_read_model(db, user.student_id)
+    if is_current(document, context):
+        etag = _summary_etag(user.student_id, context, document["last_recomputed_at"])
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        return render_summary(document)
+    
+    if request.headers.get("if-none-match"):
+        version = await get_summary_version(db, user.student_id, context["batch_id"])
+        etag = _summary_etag(user.student_id, context, version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
     
     # Get all summaries for this student
-    result = db.table("attendance_summary") \
+    result = await db.table("attendance_summary") \
         .select("*, subjects(code, name, type)") \
         .eq("student_id", user.student_id) \
         .eq("batch_id", context["batch_id"]) \
@@ -176,6 +281,11 @@ async def get_summary(
     overall_present = 0
     overall_total = 0
     snapshot_at = None
+    last_recomputed_at = max(
+        (row["last_recomputed_at"] for row in result.data or [] if row.get("last_recomputed_at")),
+        default=None
+    )
+    response.headers["ETag"] = _summary_etag(user.student_id, context, last_recomputed_at)
     
     for row in result.data or []:
         subj = row.get("subjects", {})
@@ -205,7 +315,7 @@ async def get_summary(
     # Get semester number (schema uses semester_number, not name)
     semester_name = ""
     try:
-        semester_result = db.table("semesters") \
+        semester_result = await db.table("semesters") \
             .select("semester_number") \
             .eq("id", context["semester_id"]) \
             .single() \
@@ -232,44 +342,61 @@ async def get_summary(
 @router.get("/manual")
 async def get_manual_entries(
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     subject_id: str = None,
     from_date: date = None,
-    to_date: date = None
+    to_date: date = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    include_subject: bool = True,
+    output_format: str = Query("json", alias="format", pattern="^(json|ndjson)$")
 ):
     """
-    Get manual attendance entries for the current student.
+    Get manual attendance entries for the current student, newest first.
+    
+    Pages are keyset-paginated: pass the returned next_cursor as ?cursor=
+    for older entries. include_subject=false omits the subject code/name
+    join. format=ndjson streams every entry from the cursor on, one JSON
+    object per line (limit is ignored), for exports.
     """
-    query = db.table("manual_attendance") \
-        .select("*, subjects(code, name)") \
-        .eq("student_id", user.student_id) \
-        .order("event_date", desc=True)
+    try:
+        after = decode_cursor(cursor, ("date", "uuid"))
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    filters = {
+        "subject_id": subject_id,
+        "from_date": from_date,
+        "to_date": to_date,
+        "include_subject": include_subject
+    }
     
-    if subject_id:
-        query = query.eq("subject_id", subject_id)
-    if from_date:
-        query = query.gte("event_date", from_date.isoformat())
-    if to_date:
-        query = query.lte("event_date", to_date.isoformat())
+    if output_format == "ndjson":
+        async def lines() -> AsyncIterator[str]:
+            async for row in iter_manual_entries(db, user.student_id, after, **filters):
+                yield json.dumps(row, default=str) + "\n"
+        
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
     
-    result = query.limit(100).execute()
+    entries, next_cursor = await list_manual_entries(
+        db, user.student_id, limit, after, **filters
+    )
     
-    return {"entries": result.data or []}
+    return {"entries": entries, "next_cursor": next_cursor}
 
 
 @router.delete("/manual/{entry_id}")
 async def delete_manual_entry(
     entry_id: str,
-    background_tasks: BackgroundTasks,
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Delete a manual attendance entry.
     """
     # Verify ownership
-    existing = db.table("manual_attendance") \
-        .select("id") \
+    existing = await db.table("manual_attendance") \
+        .select("id, subject_id, event_date, status") \
         .eq("id", entry_id) \
         .eq("student_id", user.student_id) \
         .single() \
@@ -279,15 +406,19 @@ async def delete_manual_entry(
         raise HTTPException(status_code=404, detail="Entry not found")
     
     # Delete
-    db.table("manual_attendance").delete().eq("id", entry_id).execute()
+    await db.table("manual_attendance").delete().eq("id", entry_id).execute()
     
-    # Trigger recomputation
-    background_tasks.add_task(
-        recompute_for_student,
-        db,
+    # Queue recomputation (coalesced per student, incremental)
+    await get_recompute_queue().enqueue(
         user.student_id,
         ComputeTrigger.MANUAL_ENTRY,
-        entry_id
+        entry_id,
+        delta=manual_entry_delta(
+            existing.data["subject_id"],
+            date.fromisoformat(existing.data["event_date"]),
+            existing.data["status"],
+            None
+        )
     )
     
     return {"deleted": True, "recompute_triggered": True}
@@ -3,16 +3,38 @@ Engine control API endpoints for HAJRI Engine.
 Internal/debug endpoints for forcing recomputation.
 """
 
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from supabase import Client
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from supabase import AsyncClient
 import pendulum
 
-from app.core.auth import AuthenticatedUser, get_current_user
+from app.core.auth import (
+    AuthenticatedUser,
+    get_current_user,
+    token_cache_stats,
+    flush_token_cache
+)
 from app.core.database import get_db
-from app.models.schemas import RecomputeRequest, RecomputeResponse
+from app.core.metrics import latency_percentiles
+from app.core.context import invalidate_student_context, get_context_cache
+from app.models.schemas import (
+    RecomputeRequest,
+    RecomputeResponse,
+    BatchRecomputeRequest,
+    BatchRecomputeResponse,
+    ConsistencyReport
+)
 from app.models.enums import ComputeTrigger
-from app.services.attendance import recompute_for_student
+from app.services.attendance import (
+    recompute_for_student,
+    recompute_batch,
+    check_consistency,
+    manual_entry_row,
+    upsert_manual_entries
+)
+from app.services.recompute_queue import get_recompute_queue
+from app.services.read_models import rebuild_read_models
+from app.services.snapshots import invalidate_subject_code_index, get_subject_code_cache
 from app.services.semester_totals import (
     calculate_semester_totals,
     persist_semester_totals,
@@ -20,8 +42,19 @@ from app.services.semester_totals import (
     get_teaching_period_for_semester,
     get_non_teaching_dates,
     get_weekly_off_settings,
-    is_saturday_off
+    is_saturday_off,
+    weekday_counts,
+    teaching_days_by_weekday,
+    get_calendar_cache,
+    new_run_calendar_cache,
+    get_teaching_calendar_index,
+    invalidate_teaching_calendars,
+    CalendarCache,
+    calculate_semester_totals_many,
+    semester_total_rows,
+    upsert_semester_total_rows
 )
+from app.config import get_settings
 
 
 router = APIRouter(prefix="/engine", tags=["Engine Control"])
@@ -34,7 +67,7 @@ router = APIRouter(prefix="/engine", tags=["Engine Control"])
 async def force_recompute(
     request: RecomputeRequest,
     user: AuthenticatedUser = Depends(get_current_user),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Force recomputation for a student.
@@ -80,6 +113,207 @@ async def force_recompute(
     )
 
 
+@router.post(
+    "/admin/recompute-batch",
+    response_model=BatchRecomputeResponse
+)
+async def admin_recompute_batch(
+    request: BatchRecomputeRequest,
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Recompute every student in a batch and/or semester.
+    
+    Run after a timetable or calendar change. Batch-level data is
+    loaded once and students are recomputed with bounded concurrency.
+    Returns per-student timing and failures.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if not request.batch_id and not request.semester_id:
+        raise HTTPException(
+            status_code=400,
+            detail="Specify batch_id and/or semester_id"
+        )
+    
+    start = pendulum.now("UTC")
+    
+    result = await recompute_batch(
+        db,
+        batch_id=request.batch_id,
+        semester_id=request.semester_id,
+        trigger=request.trigger,
+        concurrency=request.concurrency
+    )
+    
+    end = pendulum.now("UTC")
+    duration_ms = int((end - start).total_seconds() * 1000)
+    
+    return BatchRecomputeResponse(duration_ms=duration_ms, **result)
+
+
+@router.post("/admin/rebuild-read-models")
+async def admin_rebuild_read_models(
+    batch_id: Optional[str] = None,
+    semester_id: Optional[str] = None,
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Rebuild student read models from stored attendance_summary rows.
+    
+    Nothing is recomputed. Run after deploying the read model table or
+    after semester totals change; with no ids every student is rebuilt.
+    Same as `python -m app.commands.rebuild_read_models`.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    start = pendulum.now("UTC")
+    result = await rebuild_read_models(db, batch_id=batch_id, semester_id=semester_id)
+    result["duration_ms"] = int((pendulum.now("UTC") - start).total_seconds() * 1000)
+    
+    return result
+
+
+@router.get("/admin/queue")
+async def admin_queue_stats(
+    user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Recompute queue depth, lag and throughput.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return get_recompute_queue().stats()
+
+
+@router.get("/admin/auth-cache")
+async def admin_auth_cache_stats(
+    user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Verified token cache size and hit rate.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return token_cache_stats()
+
+
+@router.post("/admin/auth-cache/flush")
+async def admin_flush_auth_cache(
+    user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Drop every cached verified token, e.g. after rotating the JWT secret.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {"flushed": flush_token_cache()}
+
+
+@router.post("/admin/context-cache/invalidate")
+async def admin_invalidate_context(
+    student_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Drop cached student context after current_batch_id / current_semester_id
+    change outside the engine. With no ids, the whole cache is cleared.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    invalidate_student_context(user_id=user_id, student_id=student_id)
+    return {"invalidated": True, "cache": get_context_cache().stats()}
+
+
+@router.post("/admin/teaching-calendar/invalidate")
+async def admin_invalidate_teaching_calendar(
+    academic_year_id: Optional[str] = None,
+    user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Drop cached teaching calendars after holidays, vacations, exams or
+    weekly offs change outside the engine. With no id, every year is dropped.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    invalidate_teaching_calendars(academic_year_id)
+    return {"invalidated": True, "cache": get_teaching_calendar_index().stats()}
+
+
+@router.post("/admin/subject-codes/invalidate")
+async def admin_invalidate_subject_codes(
+    batch_id: Optional[str] = None,
+    semester_id: Optional[str] = None,
+    user: AuthenticatedUser = Depends(get_current_user)
+):
+    """
+    Drop the cached OCR subject code index after subject_code_mappings or
+    subject codes change. Without both ids, the whole cache is cleared.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    invalidate_subject_code_index(batch_id=batch_id, semester_id=semester_id)
+    return {"invalidated": True, "cache": get_subject_code_cache().stats()}
+
+
+@router.get(
+    "/admin/consistency/{student_id}",
+    response_model=ConsistencyReport
+)
+async def admin_check_consistency(
+    student_id: str,
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Compare a student's stored summary/prediction rows with a full recompute.
+    
+    Use to verify the incremental manual-entry path. Read-only - see
+    POST /admin/consistency/{student_id}/repair to fix differences.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    report = await check_consistency(db, student_id)
+    return ConsistencyReport(**report)
+
+
+@router.post(
+    "/admin/consistency/{student_id}/repair",
+    response_model=ConsistencyReport
+)
+async def admin_repair_consistency(
+    student_id: str,
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Check a student like GET /admin/consistency/{student_id} and fully
+    recompute them if their stored rows differ.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    report = await check_consistency(db, student_id)
+    
+    if not report["consistent"]:
+        await recompute_for_student(db, student_id, ComputeTrigger.FORCE_RECOMPUTE)
+        report["repaired"] = True
+    
+    return ConsistencyReport(**report)
+
+
 @router.get("/health")
 async def health_check():
     """
@@ -95,7 +329,7 @@ async def health_check():
 @router.post("/test-recompute/{student_id}")
 async def test_recompute(
     student_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Test recompute endpoint - NO AUTH REQUIRED.
@@ -134,7 +368,7 @@ async def test_recompute(
 @router.get("/logs")
 async def get_computation_logs(
     user: AuthenticatedUser = Depends(get_current_user),
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_db),
     limit: int = 20
 ):
     """
@@ -143,7 +377,7 @@ async def get_computation_logs(
     if not user.student_id:
         raise HTTPException(status_code=400, detail="Not a student")
     
-    result = db.table("engine_computation_log") \
+    result = await db.table("engine_computation_log") \
         .select("*") \
         .eq("student_id", user.student_id) \
         .order("created_at", desc=True) \
@@ -163,7 +397,7 @@ async def admin_calculate_semester_totals(
     semester_id: str,
     persist: bool = True,
     user: AuthenticatedUser = Depends(get_current_user),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     PRE-PROCESS 1: Calculate total lectures/labs for each subject in semester.
@@ -183,7 +417,7 @@ async def test_calculate_semester_totals(
     batch_id: str,
     semester_id: str,
     persist: bool = True,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Test version of semester totals calculation - NO AUTH.
@@ -199,7 +433,9 @@ async def test_calculate_semester_totals_bulk(
     branch: str = None,
     semester_num: int = None,
     persist: bool = True,
-    db: Client = Depends(get_db)
+    parallel: bool = False,
+    concurrency: Optional[int] = Query(None, ge=1, le=50),
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Calculate semester totals for multiple batches at once.
@@ -208,8 +444,11 @@ async def test_calculate_semester_totals_bulk(
     Use either:
     - class_id + semester_id: All batches in a specific class
     - department + branch + semester_num: All matching batches
+    
+    By default batches are calculated and persisted one by one;
+    parallel=true computes up to `concurrency` batches at a time and
+    persists every batch's rows in grouped upserts.
     """
-    import asyncio
     start = pendulum.now("UTC")
     
     try:
@@ -219,7 +458,7 @@ async def test_calculate_semester_totals_bulk(
         if class_id:
             query = query.eq("class_id", class_id)
         
-        result = query.execute()
+        result = await query.execute()
         batches = result.data or []
         
         # Filter by semester_id if provided
@@ -229,11 +468,17 @@ async def test_calculate_semester_totals_bulk(
         if not batches:
             return {"error": "No batches found matching criteria"}
         
-        # Calculate for each batch
+        # Calculate for each batch, sharing calendar lookups across batches;
+        # the run's own cache, so its stats count only this run
+        calendar_cache = new_run_calendar_cache()
         results = []
         total_subjects = 0
         errors = []
+        rows_persisted = 0
+        persist_failures = []
         
+        targets = []
+        names = {}
         for batch in batches:
             batch_id = batch["id"]
             sem_id = semester_id or batch.get("classes", {}).get("semester_id")
@@ -242,45 +487,104 @@ async def test_calculate_semester_totals_bulk(
                 errors.append(f"Batch {batch_id}: No semester_id")
                 continue
             
-            try:
-                calc_result = await _calculate_semester_totals_impl(db, batch_id, sem_id, persist)
-                if calc_result.get("status") == "success":
-                    results.append({
-                        "batch_id": batch_id,
-                        "batch_name": batch.get("name") or batch.get("batch_letter") or "Full",
-                        "subjects_calculated": calc_result.get("subjects_calculated", 0),
-                        "duration_ms": calc_result.get("duration_ms", 0)
-                    })
-                    total_subjects += calc_result.get("subjects_calculated", 0)
-                else:
-                    errors.append(f"Batch {batch_id}: {calc_result.get('message')}")
-            except Exception as e:
-                errors.append(f"Batch {batch_id}: {str(e)}")
+            targets.append((batch_id, sem_id))
+            names[batch_id] = batch.get("name") or batch.get("batch_letter") or "Full"
+        
+        if parallel:
+            outcomes = await calculate_semester_totals_many(
+                db, targets, concurrency=concurrency, calendar_cache=calendar_cache
+            )
+            
+            calculated_at = pendulum.now("UTC").isoformat()
+            rows = []
+            for outcome in outcomes:
+                batch_id = outcome["batch_id"]
+                if outcome["error"]:
+                    errors.append(f"Batch {batch_id}: {outcome['error']}")
+                    continue
+                if not outcome["totals"]:
+                    errors.append(f"Batch {batch_id}: No subjects found. Check timetable is published.")
+                    continue
+                
+                rows.extend(semester_total_rows(
+                    batch_id, outcome["semester_id"], outcome["totals"], calculated_at
+                ))
+                results.append({
+                    "batch_id": batch_id,
+                    "batch_name": names[batch_id],
+                    "subjects_calculated": len(outcome["totals"]),
+                    "duration_ms": outcome["duration_ms"]
+                })
+                total_subjects += len(outcome["totals"])
+            
+            if persist and rows:
+                persist_outcomes = await upsert_semester_total_rows(db, rows)
+                rows_persisted = sum(1 for o in persist_outcomes if o["status"] == "upserted")
+                persist_failures = [o for o in persist_outcomes if o["status"] == "failed"]
+        else:
+            for batch_id, sem_id in targets:
+                try:
+                    calc_result = await _calculate_semester_totals_impl(
+                        db, batch_id, sem_id, persist, calendar_cache=calendar_cache
+                    )
+                    if calc_result.get("status") == "success":
+                        results.append({
+                            "batch_id": batch_id,
+                            "batch_name": names[batch_id],
+                            "subjects_calculated": calc_result.get("subjects_calculated", 0),
+                            "duration_ms": calc_result.get("duration_ms", 0)
+                        })
+                        total_subjects += calc_result.get("subjects_calculated", 0)
+                        rows_persisted += calc_result.get("subjects_persisted", 0)
+                        persist_failures.extend(calc_result.get("persist_failures") or [])
+                    else:
+                        errors.append(f"Batch {batch_id}: {calc_result.get('message')}")
+                except Exception as e:
+                    errors.append(f"Batch {batch_id}: {str(e)}")
         
         end = pendulum.now("UTC")
         duration_ms = int((end - start).total_seconds() * 1000)
+        cache_stats = calendar_cache.stats()
         
         return {
             "status": "success",
+            "mode": "parallel" if parallel else "sequential",
+            "concurrency": (concurrency or get_settings().semester_totals_concurrency) if parallel else 1,
             "batches_processed": len(results),
             "total_subjects": total_subjects,
             "duration_ms": duration_ms,
+            "batch_latency_ms": latency_percentiles(r["duration_ms"] for r in results),
+            "rows_persisted": rows_persisted if persist else None,
+            "persist_failures": persist_failures or None,
+            "calendar_cache": {
+                "hits": cache_stats["hits"],
+                "misses": cache_stats["misses"],
+                "calendars_computed": cache_stats["calendars"]["misses"]
+            },
             "results": results,
             "errors": errors if errors else None
         }
-        
+    
     except Exception as e:
         import traceback
         return {"error": str(e), "traceback": traceback.format_exc()}
 
 
-async def _calculate_semester_totals_impl(db: Client, batch_id: str, semester_id: str, persist: bool):
+async def _calculate_semester_totals_impl(
+    db: AsyncClient,
+    batch_id: str,
+    semester_id: str,
+    persist: bool,
+    calendar_cache: Optional[CalendarCache] = None
+):
     """Internal implementation for semester totals calculation."""
     start = pendulum.now("UTC")
     
     try:
         # Calculate totals
-        totals = await calculate_semester_totals(db, batch_id, semester_id)
+        totals = await calculate_semester_totals(
+            db, batch_id, semester_id, calendar_cache or get_calendar_cache()
+        )
         
         if not totals:
             return {
@@ -290,9 +594,11 @@ async def _calculate_semester_totals_impl(db: Client, batch_id: str, semester_id
             }
         
         # Persist if requested
-        persisted_count = 0
+        persist_outcomes = []
         if persist:
-            persisted_count = await persist_semester_totals(db, batch_id, semester_id, totals)
+            persist_outcomes = await persist_semester_totals(db, batch_id, semester_id, totals)
+        persisted_count = sum(1 for o in persist_outcomes if o["status"] == "upserted")
+        persist_failures = [o for o in persist_outcomes if o["status"] == "failed"]
         
         end = pendulum.now("UTC")
         duration_ms = int((end - start).total_seconds() * 1000)
@@ -315,6 +621,7 @@ async def _calculate_semester_totals_impl(db: Client, batch_id: str, semester_id
             "semester_id": semester_id,
             "subjects_calculated": len(subjects_list),
             "subjects_persisted": persisted_count,
+            "persist_failures": persist_failures or None,
             "duration_ms": duration_ms,
             "subjects": subjects_list
         }
@@ -332,7 +639,7 @@ async def get_semester_totals(
     batch_id: str,
     semester_id: str,
     user: AuthenticatedUser = Depends(get_current_user),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get precomputed semester totals for a batch.
@@ -344,7 +651,7 @@ async def get_semester_totals(
 async def test_get_semester_totals(
     batch_id: str,
     semester_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get precomputed semester totals for a batch - NO AUTH for testing.
@@ -352,9 +659,9 @@ async def test_get_semester_totals(
     return await _get_semester_totals_impl(db, batch_id, semester_id)
 
 
-async def _get_semester_totals_impl(db: Client, batch_id: str, semester_id: str):
+async def _get_semester_totals_impl(db: AsyncClient, batch_id: str, semester_id: str):
     """Internal implementation for getting semester totals."""
-    result = db.table("semester_subject_totals") \
+    result = await db.table("semester_subject_totals") \
         .select("*, subjects(code, name, type)") \
         .eq("batch_id", batch_id) \
         .eq("semester_id", semester_id) \
@@ -395,7 +702,7 @@ async def _get_semester_totals_impl(db: Client, batch_id: str, semester_id: str)
 @router.get("/debug/student-context")
 async def debug_student_context(
     student_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Debug endpoint to see full student context and engine data.
@@ -407,7 +714,7 @@ async def debug_student_context(
         raise HTTPException(status_code=400, detail="No student_id specified")
     
     # Get app_user context
-    app_user = db.table("app_users") \
+    app_user = await db.table("app_users") \
         .select("*, students(*)") \
         .eq("student_id", target_student_id) \
         .single() \
@@ -420,13 +727,13 @@ async def debug_student_context(
     semester_id = app_user.data.get("current_semester_id")
     
     # Get subjects
-    subjects = db.table("course_offerings") \
+    subjects = await db.table("course_offerings") \
         .select("*, subjects(*)") \
         .eq("batch_id", batch_id) \
         .execute()
     
     # Get timetable
-    timetable_version = db.table("timetable_versions") \
+    timetable_version = await db.table("timetable_versions") \
         .select("id, name, status") \
         .eq("batch_id", batch_id) \
         .eq("status", "published") \
@@ -436,14 +743,14 @@ async def debug_student_context(
     timetable_events = []
     if timetable_version.data:
         version_id = timetable_version.data[0]["id"]
-        events = db.table("timetable_events") \
+        events = await db.table("timetable_events") \
             .select("*, course_offerings(*, subjects(*))") \
             .eq("version_id", version_id) \
             .execute()
         timetable_events = events.data or []
     
     # Get snapshot
-    snapshot = db.table("ocr_snapshots") \
+    snapshot = await db.table("ocr_snapshots") \
         .select("*") \
         .eq("student_id", target_student_id) \
         .order("confirmed_at", desc=True) \
@@ -451,26 +758,26 @@ async def debug_student_context(
         .execute()
     
     # Get semester totals
-    semester_totals = db.table("semester_subject_totals") \
+    semester_totals = await db.table("semester_subject_totals") \
         .select("*, subjects(code, name)") \
         .eq("batch_id", batch_id) \
         .eq("semester_id", semester_id) \
         .execute()
     
     # Get attendance summary
-    summary = db.table("attendance_summary") \
+    summary = await db.table("attendance_summary") \
         .select("*, subjects(code, name)") \
         .eq("student_id", target_student_id) \
         .execute()
     
     # Get predictions
-    predictions = db.table("attendance_predictions") \
+    predictions = await db.table("attendance_predictions") \
         .select("*, subjects(code, name)") \
         .eq("student_id", target_student_id) \
         .execute()
     
     # Get manual attendance entries
-    manual_entries = db.table("manual_attendance") \
+    manual_entries = await db.table("manual_attendance") \
         .select("*, subjects(code, name)") \
         .eq("student_id", target_student_id) \
         .order("event_date", desc=False) \
@@ -517,7 +824,7 @@ async def test_add_manual_attendance(
     event_date: str,
     status: str = "PRESENT",
     class_type: str = "LECTURE",
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Add/update manual attendance entry for testing.
@@ -532,7 +839,7 @@ async def test_add_manual_attendance(
     """
     try:
         # Get student's snapshot
-        snapshot = db.table("ocr_snapshots") \
+        snapshot = await db.table("ocr_snapshots") \
             .select("id, confirmed_at") \
             .eq("student_id", student_id) \
             .order("confirmed_at", desc=True) \
@@ -544,41 +851,15 @@ async def test_add_manual_attendance(
         
         snapshot_id = snapshot.data[0]["id"]
         
-        # Check if entry already exists
-        existing = db.table("manual_attendance") \
-            .select("id") \
-            .eq("student_id", student_id) \
-            .eq("subject_id", subject_id) \
-            .eq("event_date", event_date) \
-            .eq("class_type", class_type) \
-            .limit(1) \
-            .execute()
-        
-        if existing.data:
-            # Update existing
-            result = db.table("manual_attendance") \
-                .update({"status": status}) \
-                .eq("id", existing.data[0]["id"]) \
-                .execute()
-            action = "updated"
-            entry_id = existing.data[0]["id"]
-        else:
-            # Insert new
-            result = db.table("manual_attendance").insert({
-                "student_id": student_id,
-                "subject_id": subject_id,
-                "snapshot_id": snapshot_id,
-                "event_date": event_date,
-                "class_type": class_type,
-                "status": status
-            }).execute()
-            action = "created"
-            entry_id = result.data[0]["id"]
+        # Insert or update in one round trip
+        written = await upsert_manual_entries(db, [manual_entry_row(
+            student_id, snapshot_id, subject_id, event_date, class_type, status
+        )])
         
         return {
             "success": True,
-            "action": action,
-            "entry_id": entry_id,
+            "action": "updated" if written[0]["previous_status"] else "created",
+            "entry_id": written[0]["id"],
             "event_date": event_date,
             "status": status
         }
@@ -596,7 +877,7 @@ async def test_bulk_add_manual_attendance(
     num_days: int = 10,
     pattern: str = "PPPPPPPPPP",  # P=Present, A=Absent, skip weekends
     class_type: str = "LECTURE",
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Add multiple days of manual attendance for testing.
@@ -614,7 +895,7 @@ async def test_bulk_add_manual_attendance(
     
     try:
         # Get student's snapshot
-        snapshot = db.table("ocr_snapshots") \
+        snapshot = await db.table("ocr_snapshots") \
             .select("id, confirmed_at") \
             .eq("student_id", student_id) \
             .order("confirmed_at", desc=True) \
@@ -628,57 +909,35 @@ async def test_bulk_add_manual_attendance(
         
         # Generate entries
         current = pendulum.parse(start_date)
-        entries_created = []
+        rows = []
         pattern_idx = 0
         
-        while len(entries_created) < num_days and pattern_idx < len(pattern):
+        while len(rows) < num_days and pattern_idx < len(pattern):
             # Skip weekends (Sunday = 0 in some systems, we use Python weekday)
             if current.weekday() == 6:  # Sunday
                 current = current.add(days=1)
                 continue
             
             status = "PRESENT" if pattern[pattern_idx].upper() == "P" else "ABSENT"
-            date_str = current.format("YYYY-MM-DD")
-            
-            # Check if exists
-            existing = db.table("manual_attendance") \
-                .select("id") \
-                .eq("student_id", student_id) \
-                .eq("subject_id", subject_id) \
-                .eq("event_date", date_str) \
-                .eq("class_type", class_type) \
-                .limit(1) \
-                .execute()
-            
-            if existing.data:
-                db.table("manual_attendance") \
-                    .update({"status": status}) \
-                    .eq("id", existing.data[0]["id"]) \
-                    .execute()
-                action = "updated"
-                entry_id = existing.data[0]["id"]
-            else:
-                result = db.table("manual_attendance").insert({
-                    "student_id": student_id,
-                    "subject_id": subject_id,
-                    "snapshot_id": snapshot_id,
-                    "event_date": date_str,
-                    "class_type": class_type,
-                    "status": status
-                }).execute()
-                action = "created"
-                entry_id = result.data[0]["id"]
-            
-            entries_created.append({
-                "date": date_str,
-                "status": status,
-                "action": action,
-                "id": entry_id
-            })
+            rows.append(manual_entry_row(
+                student_id, snapshot_id, subject_id, current.format("YYYY-MM-DD"), class_type, status
+            ))
             
             pattern_idx += 1
             current = current.add(days=1)
         
+        # All generated days in one upsert
+        written = await upsert_manual_entries(db, rows) if rows else []
+        entries_created = [
+            {
+                "date": row["event_date"],
+                "status": row["status"],
+                "action": "updated" if row["previous_status"] else "created",
+                "id": row["id"]
+            }
+            for row in written
+        ]
+        
         return {
             "success": True,
             "entries_created": len(entries_created),
@@ -694,7 +953,7 @@ async def test_bulk_add_manual_attendance(
 async def test_update_manual_attendance(
     entry_id: str,
     status: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Update a specific manual attendance entry.
@@ -705,7 +964,7 @@ async def test_update_manual_attendance(
         status: New status (PRESENT, ABSENT, CANCELLED)
     """
     try:
-        result = db.table("manual_attendance") \
+        result = await db.table("manual_attendance") \
             .update({"status": status}) \
             .eq("id", entry_id) \
             .execute()
@@ -728,14 +987,14 @@ async def test_update_manual_attendance(
 @router.delete("/test/manual-attendance/{entry_id}")
 async def test_delete_manual_attendance(
     entry_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Delete a specific manual attendance entry.
     NO AUTH - for test portal only.
     """
     try:
-        db.table("manual_attendance") \
+        await db.table("manual_attendance") \
             .delete() \
             .eq("id", entry_id) \
             .execute()
@@ -750,14 +1009,14 @@ async def test_delete_manual_attendance(
 @router.delete("/test/clear-manual-attendance/{student_id}")
 async def test_clear_manual_attendance(
     student_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Delete all manual attendance entries for a student.
     NO AUTH - for test portal only.
     """
     try:
-        result = db.table("manual_attendance") \
+        result = await db.table("manual_attendance") \
             .delete() \
             .eq("student_id", student_id) \
             .execute()
@@ -776,7 +1035,7 @@ async def test_clear_manual_attendance(
 @router.get("/test/batch/{batch_id}")
 async def test_get_batch_details(
     batch_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get detailed batch information including subjects, timetable, students.
@@ -784,7 +1043,7 @@ async def test_get_batch_details(
     """
     try:
         # Get batch info
-        batch = db.table("batches") \
+        batch = await db.table("batches") \
             .select("*, classes(name)") \
             .eq("id", batch_id) \
             .single() \
@@ -794,13 +1053,13 @@ async def test_get_batch_details(
             return {"error": "Batch not found"}
         
         # Get subjects/course offerings
-        offerings = db.table("course_offerings") \
+        offerings = await db.table("course_offerings") \
             .select("*, subjects(id, code, name, type, credits)") \
             .eq("batch_id", batch_id) \
             .execute()
         
         # Get timetable events
-        version = db.table("timetable_versions") \
+        version = await db.table("timetable_versions") \
             .select("id, name, status") \
             .eq("batch_id", batch_id) \
             .eq("status", "published") \
@@ -811,7 +1070,7 @@ async def test_get_batch_details(
         events = []
         weekly_summary = {}
         if version.data:
-            events_result = db.table("timetable_events") \
+            events_result = await db.table("timetable_events") \
                 .select("*, course_offerings(subjects(code, name, type))") \
                 .eq("version_id", version.data[0]["id"]) \
                 .order("day_of_week") \
@@ -840,14 +1099,14 @@ async def test_get_batch_details(
                 weekly_summary[key]["days"].append(day_name)
         
         # Get students in this batch
-        students = db.table("students") \
+        students = await db.table("students") \
             .select("id, name, roll_number") \
             .eq("batch_id", batch_id) \
             .limit(10) \
             .execute()
         
         # Get academic year
-        academic_year = db.table("academic_years") \
+        academic_year = await db.table("academic_years") \
             .select("*") \
             .limit(1) \
             .execute()
@@ -888,7 +1147,7 @@ async def test_setup_real_batch_test(
     batch_id: str,
     semester_start: str = "2025-12-15",
     semester_end: str = "2026-04-10",
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Set up a test student in a real batch with real timetable.
@@ -900,7 +1159,7 @@ async def test_setup_real_batch_test(
         test_student_id = "11111111-1111-1111-1111-111111111111"
         
         # Get batch info
-        batch = db.table("batches") \
+        batch = await db.table("batches") \
             .select("*") \
             .eq("id", batch_id) \
             .single() \
@@ -910,7 +1169,7 @@ async def test_setup_real_batch_test(
             return {"error": "Batch not found"}
         
         # Check for any existing semester or create one
-        existing_sem = db.table("semesters") \
+        existing_sem = await db.table("semesters") \
             .select("id") \
             .order("created_at", desc=True) \
             .limit(1) \
@@ -920,7 +1179,7 @@ async def test_setup_real_batch_test(
             semester_id = existing_sem.data[0]["id"]
         else:
             # Create a new semester
-            new_sem = db.table("semesters").insert({
+            new_sem = await db.table("semesters").insert({
                 "name": "Even Semester 2025-26",
                 "start_date": semester_start,
                 "end_date": semester_end
@@ -928,7 +1187,7 @@ async def test_setup_real_batch_test(
             semester_id = new_sem.data[0]["id"]
         
         # Check if test student exists
-        existing = db.table("students") \
+        existing = await db.table("students") \
             .select("id") \
             .eq("id", test_student_id) \
             .limit(1) \
@@ -936,14 +1195,14 @@ async def test_setup_real_batch_test(
         
         if existing.data:
             # Update to new batch
-            db.table("students") \
+            await db.table("students") \
                 .update({"batch_id": batch_id}) \
                 .eq("id", test_student_id) \
                 .execute()
             action = "updated"
         else:
             # Create test student
-            db.table("students").insert({
+            await db.table("students").insert({
                 "id": test_student_id,
                 "name": "Test Student (Real Batch)",
                 "roll_number": "TEST001",
@@ -953,14 +1212,14 @@ async def test_setup_real_batch_test(
             action = "created"
         
         # Update or create app_user
-        app_user = db.table("app_users") \
+        app_user = await db.table("app_users") \
             .select("id") \
             .eq("student_id", test_student_id) \
             .limit(1) \
             .execute()
         
         if app_user.data:
-            db.table("app_users") \
+            await db.table("app_users") \
                 .update({
                     "current_batch_id": batch_id,
                     "current_semester_id": semester_id
@@ -968,18 +1227,19 @@ async def test_setup_real_batch_test(
                 .eq("id", app_user.data[0]["id"]) \
                 .execute()
         else:
-            db.table("app_users").insert({
+            await db.table("app_users").insert({
                 "student_id": test_student_id,
                 "current_batch_id": batch_id,
                 "current_semester_id": semester_id,
                 "onboarding_completed": True
             }).execute()
+        invalidate_student_context(student_id=test_student_id)
         
         # Clear old data
-        db.table("ocr_snapshots").delete().eq("student_id", test_student_id).execute()
-        db.table("manual_attendance").delete().eq("student_id", test_student_id).execute()
-        db.table("attendance_summary").delete().eq("student_id", test_student_id).execute()
-        db.table("attendance_predictions").delete().eq("student_id", test_student_id).execute()
+        await db.table("ocr_snapshots").delete().eq("student_id", test_student_id).execute()
+        await db.table("manual_attendance").delete().eq("student_id", test_student_id).execute()
+        await db.table("attendance_summary").delete().eq("student_id", test_student_id).execute()
+        await db.table("attendance_predictions").delete().eq("student_id", test_student_id).execute()
         
         return {
             "success": True,
@@ -997,29 +1257,29 @@ async def test_setup_real_batch_test(
 
 @router.get("/test/all-batches")
 async def test_get_all_batches(
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get all batches with class/department info for testing.
     """
     try:
-        result = db.table("batches") \
+        result = await db.table("batches") \
             .select("id, name, batch_letter, class_id, classes(id, name, class_number, semester_id)") \
             .order("created_at", desc=True) \
             .execute()
         
         # Get all semesters (branch_id, semester_number)
-        semesters_result = db.table("semesters") \
+        semesters_result = await db.table("semesters") \
             .select("id, semester_number, branch_id") \
             .execute()
         
         # Get all branches (which map to departments)
-        branches_result = db.table("branches") \
+        branches_result = await db.table("branches") \
             .select("id, name, department_id") \
             .execute()
         
         # Get all departments
-        depts_result = db.table("departments") \
+        depts_result = await db.table("departments") \
             .select("id, name") \
             .execute()
         
@@ -1067,14 +1327,14 @@ async def test_get_all_batches(
 
 @router.get("/test/timetables")
 async def test_get_available_timetables(
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get all available timetables for testing.
     NO AUTH - for test portal only.
     """
     try:
-        result = db.table("timetable_versions") \
+        result = await db.table("timetable_versions") \
             .select("*, batches(name, classes(name)), timetable_events(count)") \
             .order("created_at", desc=True) \
             .execute()
@@ -1103,27 +1363,27 @@ async def test_get_available_timetables(
 @router.get("/test/academic-calendar/{academic_year_id}")
 async def test_get_academic_calendar(
     academic_year_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get academic calendar data for testing.
     Shows holidays, vacations, exam periods.
     """
     try:
-        holidays = db.table("calendar_events") \
+        holidays = await db.table("calendar_events") \
             .select("*") \
             .eq("academic_year_id", academic_year_id) \
             .eq("is_non_teaching", True) \
             .order("event_date") \
             .execute()
         
-        vacations = db.table("vacation_periods") \
+        vacations = await db.table("vacation_periods") \
             .select("*") \
             .eq("academic_year_id", academic_year_id) \
             .order("start_date") \
             .execute()
         
-        exams = db.table("exam_periods") \
+        exams = await db.table("exam_periods") \
             .select("*") \
             .eq("academic_year_id", academic_year_id) \
             .order("start_date") \
@@ -1144,7 +1404,7 @@ async def test_get_academic_calendar(
 @router.get("/test/student-context/{student_id}")
 async def test_student_context(
     student_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get student context for debugging.
@@ -1152,7 +1412,7 @@ async def test_student_context(
     """
     try:
         # Get app_user context
-        app_user = db.table("app_users") \
+        app_user = await db.table("app_users") \
             .select("*, students(*)") \
             .eq("student_id", student_id) \
             .single() \
@@ -1167,7 +1427,7 @@ async def test_student_context(
         # Get batch info
         batch = None
         if batch_id:
-            batch_result = db.table("batches") \
+            batch_result = await db.table("batches") \
                 .select("*, classes(*)") \
                 .eq("id", batch_id) \
                 .single() \
@@ -1177,7 +1437,7 @@ async def test_student_context(
         # Get subjects
         subjects = []
         if batch_id:
-            subjects_result = db.table("course_offerings") \
+            subjects_result = await db.table("course_offerings") \
                 .select("*, subjects(*)") \
                 .eq("batch_id", batch_id) \
                 .execute()
@@ -1186,14 +1446,14 @@ async def test_student_context(
         # Get timetable events count
         timetable_events_count = 0
         if batch_id:
-            timetable_version = db.table("timetable_versions") \
+            timetable_version = await db.table("timetable_versions") \
                 .select("id") \
                 .eq("batch_id", batch_id) \
                 .eq("status", "published") \
                 .limit(1) \
                 .execute()
             if timetable_version.data:
-                events = db.table("timetable_events") \
+                events = await db.table("timetable_events") \
                     .select("id", count="exact") \
                     .eq("version_id", timetable_version.data[0]["id"]) \
                     .execute()
@@ -1217,7 +1477,7 @@ async def test_student_context(
 @router.get("/test/predictions/{student_id}")
 async def test_get_predictions(
     student_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get simplified predictions for a student.
@@ -1232,7 +1492,7 @@ async def test_get_predictions(
     
     try:
         # Get app_user context
-        app_user = db.table("app_users") \
+        app_user = await db.table("app_users") \
             .select("current_batch_id, current_semester_id") \
             .eq("student_id", student_id) \
             .single() \
@@ -1245,14 +1505,14 @@ async def test_get_predictions(
         semester_id = app_user.data.get("current_semester_id")
         
         # Get attendance summaries
-        summary_result = db.table("attendance_summary") \
+        summary_result = await db.table("attendance_summary") \
             .select("*, subjects(code, name, type)") \
             .eq("student_id", student_id) \
             .eq("batch_id", batch_id) \
             .execute()
         
         # Get semester totals
-        totals_result = db.table("semester_subject_totals") \
+        totals_result = await db.table("semester_subject_totals") \
             .select("subject_id, total_classes_in_semester") \
             .eq("batch_id", batch_id) \
             .eq("semester_id", semester_id) \
@@ -1348,7 +1608,7 @@ async def test_get_predictions(
 async def test_debug_semester_totals(
     batch_id: str,
     semester_id: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Debug endpoint to see exactly how semester totals are calculated.
@@ -1369,7 +1629,7 @@ async def test_debug_semester_totals(
         end_date = pendulum.parse(period["end_date"]).date()
         
         # Step 3: Check academic year lookup
-        year_result = db.table("academic_years") \
+        year_result = await db.table("academic_years") \
             .select("*") \
             .lte("start_date", start_date.isoformat()) \
             .gte("end_date", end_date.isoformat()) \
@@ -1379,7 +1639,7 @@ async def test_debug_semester_totals(
         academic_year = year_result.data[0] if year_result.data else None
         
         # Step 4: Get non-teaching dates (now returns tuple with weekly settings)
-        non_teaching_dates, weekly_settings = await get_non_teaching_dates(db, start_date, end_date, batch_id)
+        non_teaching_dates, weekly_settings, _ = await get_non_teaching_dates(db, start_date, end_date, batch_id)
         
         # Step 5: Get holidays for display
         holidays_list = []
@@ -1387,7 +1647,7 @@ async def test_debug_semester_totals(
         exams_list = []
         
         if academic_year:
-            holidays = db.table("calendar_events") \
+            holidays = await db.table("calendar_events") \
                 .select("event_date, end_date, title, event_type") \
                 .eq("academic_year_id", academic_year["id"]) \
                 .eq("is_non_teaching", True) \
@@ -1395,13 +1655,13 @@ async def test_debug_semester_totals(
                 .execute()
             holidays_list = holidays.data or []
             
-            vacations = db.table("vacation_periods") \
+            vacations = await db.table("vacation_periods") \
                 .select("name, start_date, end_date") \
                 .eq("academic_year_id", academic_year["id"]) \
                 .execute()
             vacations_list = vacations.data or []
             
-            exams = db.table("exam_periods") \
+            exams = await db.table("exam_periods") \
                 .select("name, start_date, end_date") \
                 .eq("academic_year_id", academic_year["id"]) \
                 .execute()
@@ -1415,19 +1675,12 @@ async def test_debug_semester_totals(
             
             # Count teaching days vs non-teaching per weekday
             # DB uses 0=Monday, same as Python weekday()
+            all_days = weekday_counts(start_date, end_date)
+            teaching_days = teaching_days_by_weekday(start_date, end_date, non_teaching_dates)
             weekday_analysis = {}
             for weekday in range(7):
-                teaching = 0
-                non_teaching = 0
-                current = start_date
-                while current <= end_date:
-                    # Python weekday() returns 0=Monday, matches DB convention
-                    if current.weekday() == weekday:
-                        if current in set(non_teaching_dates):
-                            non_teaching += 1
-                        else:
-                            teaching += 1
-                    current = pendulum.instance(datetime.combine(current, datetime.min.time())).add(days=1).date()
+                teaching = teaching_days[weekday]
+                non_teaching = all_days[weekday] - teaching
                 
                 # DB uses 0=Monday, 1=Tuesday, ..., 5=Saturday, 6=Sunday
                 weekday_name = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][weekday]
@@ -1489,7 +1742,7 @@ async def test_create_real_snapshot(
     student_id: str = "11111111-1111-1111-1111-111111111111",
     snapshot_date: str | None = None,  # Default to today
     attendance_percentage: int = 85,  # Default attendance %
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Create a snapshot with realistic data from the real batch's subjects.
@@ -1507,7 +1760,7 @@ async def test_create_real_snapshot(
             snapshot_date = pendulum.now("Asia/Kolkata").format("YYYY-MM-DD")
         
         # Get student's app_user info
-        app_user = db.table("app_users") \
+        app_user = await db.table("app_users") \
             .select("current_batch_id, current_semester_id") \
             .eq("student_id", student_id) \
             .single() \
@@ -1520,7 +1773,7 @@ async def test_create_real_snapshot(
         semester_id = app_user.data["current_semester_id"]
         
         # Get semester totals for this batch
-        totals = db.table("semester_subject_totals") \
+        totals = await db.table("semester_subject_totals") \
             .select("*, subjects(code, name)") \
             .eq("batch_id", batch_id) \
             .eq("semester_id", semester_id) \
@@ -1557,7 +1810,7 @@ async def test_create_real_snapshot(
             entries.append(entry)
         
         # Create snapshot with entries JSONB
-        snapshot = db.table("ocr_snapshots").insert({
+        snapshot = await db.table("ocr_snapshots").insert({
             "student_id": student_id,
             "batch_id": batch_id,
             "semester_id": semester_id,
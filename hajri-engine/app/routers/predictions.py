@@ -7,12 +7,14 @@ SIMPLIFIED PREDICTIONS:
 - must_attend: Minimum classes you MUST attend for 75%
 """
 
-from fastapi import APIRouter, Depends
-from supabase import Client
+from typing import Dict
+from fastapi import APIRouter, Depends, Request
+from supabase import AsyncClient
 import pendulum
 
 from app.core.auth import AuthenticatedUser, get_current_student
 from app.core.database import get_db
+from app.core.response_cache import get_response_cache
 from app.models.schemas import (
     PredictionsResponse, 
     SubjectPrediction,
@@ -20,6 +22,12 @@ from app.models.schemas import (
     SubjectAttendance
 )
 from app.services.attendance import get_student_context
+from app.services.read_models import (
+    get_read_model,
+    is_current,
+    render_dashboard,
+    render_predictions
+)
 from app.services.predictions import (
     compute_simple_prediction,
     compute_percentage,
@@ -30,21 +38,37 @@ from app.services.predictions import (
 router = APIRouter(prefix="/predictions", tags=["Predictions"])
 
 
-@router.get("/dashboard")
+@router.get("/dashboard", response_model=AttendanceDashboardResponse)
 async def get_dashboard(
+    request: Request,
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db)
-) -> AttendanceDashboardResponse:
+    db: AsyncClient = Depends(get_db)
+):
     """
     Get current attendance dashboard - mimics college portal view.
     Shows: Present / Total = Percentage for each subject.
+    
+    Served from the response cache until the next recompute;
+    honours If-None-Match with 304.
     """
-    context = await get_student_context(db, user.student_id)
+    context = user.context or await get_student_context(db, user.student_id)
+    
+    return await get_response_cache().respond(
+        request, "dashboard", user.student_id, context["batch_id"], context["semester_id"],
+        lambda: build_dashboard(db, user.student_id, context)
+    )
+
+
+async def build_dashboard(db: AsyncClient, student_id: str, context: Dict) -> AttendanceDashboardResponse:
+    """Build the dashboard from the read model, else from attendance_summary (uncached)."""
+    document = await get_read_model(db, student_id)
+    if is_current(document, context):
+        return render_dashboard(document)
     
     # Get attendance summaries
-    result = db.table("attendance_summary") \
+    result = await db.table("attendance_summary") \
         .select("*, subjects(code, name, type)") \
-        .eq("student_id", user.student_id) \
+        .eq("student_id", student_id) \
         .eq("batch_id", context["batch_id"]) \
         .execute()
     
@@ -79,7 +103,7 @@ async def get_dashboard(
                 last_updated = ts
     
     # Get semester name
-    semester_result = db.table("semesters") \
+    semester_result = await db.table("semesters") \
         .select("name") \
         .eq("id", context["semester_id"]) \
         .single() \
@@ -96,11 +120,12 @@ async def get_dashboard(
     )
 
 
-@router.get("")
+@router.get("", response_model=PredictionsResponse)
 async def get_predictions(
+    request: Request,
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db)
-) -> PredictionsResponse:
+    db: AsyncClient = Depends(get_db)
+):
     """
     Get attendance predictions - what you can/must do.
     
@@ -108,18 +133,33 @@ async def get_predictions(
     - can_bunk: Total classes you can safely skip across all subjects
     - must_attend: Minimum classes you must attend for 75%
     - classes_to_recover: If below 75%, attend this many consecutively to recover
+    
+    Served from the response cache until the next recompute or semester
+    totals change; honours If-None-Match with 304.
     """
-    context = await get_student_context(db, user.student_id)
+    context = user.context or await get_student_context(db, user.student_id)
+    
+    return await get_response_cache().respond(
+        request, "predictions", user.student_id, context["batch_id"], context["semester_id"],
+        lambda: build_predictions(db, user.student_id, context)
+    )
+
+
+async def build_predictions(db: AsyncClient, student_id: str, context: Dict) -> PredictionsResponse:
+    """Build predictions from the read model, else from attendance_summary and semester totals (uncached)."""
+    document = await get_read_model(db, student_id)
+    if is_current(document, context):
+        return render_predictions(document)
     
     # Get attendance summary with semester totals for remaining classes calc
-    summary_result = db.table("attendance_summary") \
+    summary_result = await db.table("attendance_summary") \
         .select("*, subjects(code, name, type)") \
-        .eq("student_id", user.student_id) \
+        .eq("student_id", student_id) \
         .eq("batch_id", context["batch_id"]) \
         .execute()
     
     # Get semester totals (expected classes per subject)
-    totals_result = db.table("semester_subject_totals") \
+    totals_result = await db.table("semester_subject_totals") \
         .select("subject_id, total_classes_in_semester") \
         .eq("batch_id", context["batch_id"]) \
         .eq("semester_id", context["semester_id"]) \
@@ -171,7 +211,7 @@ async def get_predictions(
             subjects_at_risk += 1
     
     # Get semester info
-    semester_result = db.table("semesters") \
+    semester_result = await db.table("semesters") \
         .select("name, end_date") \
         .eq("id", context["semester_id"]) \
         .single() \
@@ -184,7 +224,7 @@ async def get_predictions(
         semester_end = semester_result.data.get("end_date")
     
     return PredictionsResponse(
-        student_id=user.student_id,
+        student_id=student_id,
         semester=semester_name,
         semester_end=semester_end,
         classes_remaining_in_semester=total_remaining,
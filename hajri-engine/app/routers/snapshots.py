@@ -2,24 +2,30 @@
 Snapshot API endpoints for HAJRI Engine.
 """
 
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
-from supabase import Client
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from supabase import AsyncClient
 
 from app.core.auth import AuthenticatedUser, get_current_student
 from app.core.database import get_db
+from app.core.etag import make_etag, etag_matches, not_modified
 from app.core.exceptions import PolicyViolation
+from app.core.pagination import decode_cursor, InvalidCursorError
 from app.models.schemas import (
     SnapshotConfirmRequest,
     SnapshotConfirmResponse,
+    SnapshotHistoryResponse,
     PolicyViolationResponse
 )
 from app.models.enums import ComputeTrigger
 from app.services.snapshots import (
-    save_snapshot,
-    check_snapshot_decreases,
-    get_latest_snapshot
+    confirm_snapshot_pipeline,
+    get_latest_snapshot,
+    get_latest_snapshot_version,
+    get_snapshot_history
 )
-from app.services.attendance import recompute_for_student, get_student_context
+from app.services.attendance import get_student_context
+from app.services.recompute_queue import get_recompute_queue
 
 
 router = APIRouter(prefix="/snapshots", tags=["Snapshots"])
@@ -35,9 +41,8 @@ router = APIRouter(prefix="/snapshots", tags=["Snapshots"])
 )
 async def confirm_snapshot(
     request: SnapshotConfirmRequest,
-    background_tasks: BackgroundTasks,
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Confirm an OCR snapshot as the new baseline.
@@ -45,50 +50,44 @@ async def confirm_snapshot(
     This:
     1. Saves the snapshot as immutable record
     2. Matches subject codes to database subjects
-    3. Triggers background recomputation
+    3. Queues recomputation on the recompute worker pool, with the
+       saved snapshot and context so the recompute doesn't re-read them
     
     If the new snapshot shows DECREASED totals for any subject,
     and confirm_decreases is False, returns a warning requiring confirmation.
     """
     try:
         # Get student context
-        context = await get_student_context(db, user.student_id)
-        batch_id = context["batch_id"]
-        semester_id = context["semester_id"]
+        context = user.context or await get_student_context(db, user.student_id)
         
-        # Check for decreases
-        if not request.confirm_decreases:
-            decreases = await check_snapshot_decreases(
-                db, user.student_id, batch_id, request.entries
+        result = await confirm_snapshot_pipeline(db, user.student_id, context, request)
+        if result["decreases"]:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "snapshot_decrease_warning",
+                    "message": "Some subjects show decreased totals. Please confirm.",
+                    "subjects": result["decreases"],
+                    "action": "Set confirm_decreases=true to proceed"
+                }
             )
-            if decreases:
-                raise HTTPException(
-                    status_code=400,
-                    detail={
-                        "error": "snapshot_decrease_warning",
-                        "message": "Some subjects show decreased totals. Please confirm.",
-                        "subjects": decreases,
-                        "action": "Set confirm_decreases=true to proceed"
-                    }
-                )
         
-        # Save snapshot
-        snapshot_id, unmatched = await save_snapshot(
-            db, user.student_id, batch_id, semester_id, request
-        )
+        snapshot = result["snapshot"]
+        snapshot_id = snapshot["id"]
+        unmatched = result["unmatched"]
         
         # Prepare warnings
         warnings = []
         if unmatched:
             warnings.append(f"Unmatched subject codes: {', '.join(unmatched)}")
         
-        # Trigger recomputation in background
-        background_tasks.add_task(
-            recompute_for_student,
-            db,
+        # Queue recomputation (coalesced per student)
+        await get_recompute_queue().enqueue(
             user.student_id,
             ComputeTrigger.SNAPSHOT_CONFIRM,
-            snapshot_id
+            snapshot_id,
+            snapshot=snapshot,
+            context=context
         )
         
         return SnapshotConfirmResponse(
@@ -105,16 +104,35 @@ async def confirm_snapshot(
         raise HTTPException(status_code=400, detail=e.to_dict())
 
 
+def _snapshot_etag(snapshot: Optional[Dict]) -> str:
+    if not snapshot:
+        return make_etag("snapshot", None)
+    return make_etag("snapshot", snapshot["id"], snapshot["confirmed_at"])
+
+
 @router.get("/latest")
 async def get_latest(
+    request: Request,
+    response: Response,
     user: AuthenticatedUser = Depends(get_current_student),
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Get the latest confirmed snapshot for the current student.
+    
+    ETag is derived from the snapshot id; a matching If-None-Match
+    gets 304 without loading the entries.
     """
-    context = await get_student_context(db, user.student_id)
+    context = user.context or await get_student_context(db, user.student_id)
+    
+    if request.headers.get("if-none-match"):
+        version = await get_latest_snapshot_version(db, user.student_id, context["batch_id"])
+        etag = _snapshot_etag(version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
     snapshot = await get_latest_snapshot(db, user.student_id, context["batch_id"])
+    response.headers["ETag"] = _snapshot_etag(snapshot)
     
     if not snapshot:
         return {"snapshot": None, "message": "No snapshot found"}
@@ -123,3 +141,35 @@ async def get_latest(
         "snapshot": snapshot,
         "entries_count": len(snapshot.get("entries", []))
     }
+
+
+@router.get(
+    "/history",
+    response_model=SnapshotHistoryResponse,
+    response_model_exclude_none=True
+)
+async def get_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    fields: str = Query("full", pattern="^(full|percentages)$"),
+    user: AuthenticatedUser = Depends(get_current_student),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Past snapshots for the current student, newest first.
+    
+    Pages are keyset-paginated: pass the returned next_cursor as ?cursor=
+    for the next page. fields=percentages returns only each subject's
+    percentage per snapshot (for trend charts) instead of full entries.
+    """
+    try:
+        after = decode_cursor(cursor, ("timestamp", "uuid"))
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    context = user.context or await get_student_context(db, user.student_id)
+    snapshots, next_cursor = await get_snapshot_history(
+        db, user.student_id, context["batch_id"], limit, after, fields
+    )
+    
+    return SnapshotHistoryResponse(snapshots=snapshots, next_cursor=next_cursor)
@@ -3,10 +3,15 @@ Core attendance computation service for HAJRI Engine.
 This is the main recomputation pipeline.
 """
 
-from datetime import datetime, date
-from typing import List, Dict, Optional, Tuple
-from supabase import Client
+from datetime import datetime, date, timedelta
+from typing import AsyncIterator, Iterable, List, Dict, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+from supabase import AsyncClient
+import httpx
 import pendulum
+from postgrest.exceptions import APIError
 
 from app.models.enums import (
     ClassType, AttendanceStatus, PredictionStatus,
@@ -16,12 +21,28 @@ from app.services.predictions import (
     compute_prediction, compute_percentage, determine_status, compute_recovery_classes
 )
 from app.services.snapshots import get_latest_snapshot, match_ocr_code_to_subject
-from app.core.exceptions import NoSnapshotError, NoActiveContextError
+from app.core.exceptions import (
+    NoSnapshotError, NoActiveContextError, SnapshotLockViolation, InvalidDateError
+)
+from app.core.response_cache import get_response_cache
+from app.core.database import is_missing_function
+from app.core.pagination import encode_cursor, keyset_filter
+from app.services.semester_totals import (
+    load_totals_index, remaining_from_index, project_totals_index
+)
+from app.services.read_models import (
+    build_read_model, refresh_read_model, get_read_model,
+    save_read_models, drop_read_model,
+    load_semester_info
+)
 from app.config import get_settings
 
 
+logger = logging.getLogger("hajri-engine.attendance")
+
+
 async def get_student_context(
-    db: Client,
+    db: AsyncClient,
     student_id: str
 ) -> Dict:
     """
@@ -33,7 +54,7 @@ async def get_student_context(
     Raises:
         NoActiveContextError if no context set.
     """
-    result = db.table("app_users") \
+    result = await db.table("app_users") \
         .select("*, students(*)") \
         .eq("student_id", student_id) \
         .single() \
@@ -54,8 +75,30 @@ async def get_student_context(
     }
 
 
+async def get_summary_version(
+    db: AsyncClient,
+    student_id: str,
+    batch_id: str
+) -> Optional[str]:
+    """
+    Latest last_recomputed_at across a student's summary rows.
+    Every recompute (full or incremental) moves it forward.
+    """
+    result = await db.table("attendance_summary") \
+        .select("last_recomputed_at") \
+        .eq("student_id", student_id) \
+        .eq("batch_id", batch_id) \
+        .order("last_recomputed_at", desc=True) \
+        .limit(1) \
+        .execute()
+    
+    if result.data:
+        return result.data[0]["last_recomputed_at"]
+    return None
+
+
 async def get_subjects_for_batch(
-    db: Client,
+    db: AsyncClient,
     batch_id: str,
     semester_id: str
 ) -> List[Dict]:
@@ -63,7 +106,7 @@ async def get_subjects_for_batch(
     Get all subjects that should be tracked for a batch.
     Based on course_offerings linked to this batch.
     """
-    result = db.table("course_offerings") \
+    result = await db.table("course_offerings") \
         .select("*, subjects(*)") \
         .eq("batch_id", batch_id) \
         .execute()
@@ -81,7 +124,7 @@ async def get_subjects_for_batch(
 
 
 async def aggregate_manual_entries(
-    db: Client,
+    db: AsyncClient,
     student_id: str,
     snapshot_id: str,
     snapshot_time: datetime,
@@ -97,36 +140,71 @@ async def aggregate_manual_entries(
     Returns:
         Dict with present, absent, total counts.
     """
-    # Get manual entries after snapshot date for this subject
     # Note: We don't filter by snapshot_id because manual entries should
     # persist across snapshot updates. We filter by date instead.
-    result = db.table("manual_attendance") \
-        .select("*") \
-        .eq("student_id", student_id) \
-        .eq("subject_id", subject_id) \
-        .gt("event_date", snapshot_time.date().isoformat()) \
+    counts = await load_manual_counts(db, student_id, snapshot_time)
+    return counts.get(subject_id, {"present": 0, "absent": 0, "total": 0})
+
+
+async def get_semester_end_date(
+    db: AsyncClient,
+    semester_id: Optional[str] = None
+) -> Optional[date]:
+    """
+    Get the end date of a semester.
+    Falls back to the newest teaching period when the semester has none.
+    
+    Returns:
+        End date or None if neither source has one.
+    """
+    # First try: Get from semester table if semester_id provided
+    if semester_id:
+        semester_result = await db.table("semesters") \
+            .select("end_date") \
+            .eq("id", semester_id) \
+            .limit(1) \
+            .execute()
+        
+        if semester_result.data and semester_result.data[0].get("end_date"):
+            return pendulum.parse(semester_result.data[0]["end_date"]).date()
+    
+    # Second try: Get from teaching_periods (newest one)
+    period_result = await db.table("teaching_periods") \
+        .select("end_date") \
+        .order("end_date", desc=True) \
+        .limit(1) \
         .execute()
     
-    present = 0
-    absent = 0
+    if period_result.data and period_result.data[0].get("end_date"):
+        return pendulum.parse(period_result.data[0]["end_date"]).date()
     
-    for entry in result.data or []:
-        status = entry.get("status")
-        if status == AttendanceStatus.PRESENT.value:
-            present += 1
-        elif status == AttendanceStatus.ABSENT.value:
-            absent += 1
-        # CANCELLED doesn't count toward total
+    return None
+
+
+def estimate_remaining_classes(
+    weekly_slots: int,
+    end_date: Optional[date],
+    today: date
+) -> int:
+    """
+    Estimate remaining classes as weekly slots x whole weeks left.
+    Assumes 8 weeks remaining when the semester end is unknown.
+    """
+    if weekly_slots == 0:
+        return 0
     
-    return {
-        "present": present,
-        "absent": absent,
-        "total": present + absent
-    }
+    # Fallback: assume 8 weeks remaining
+    if not end_date:
+        end_date = today + timedelta(weeks=8)
+    
+    # Count weeks remaining
+    remaining_weeks = max(0, (end_date - today).days // 7)
+    
+    return weekly_slots * remaining_weeks
 
 
 async def get_remaining_classes(
-    db: Client,
+    db: AsyncClient,
     batch_id: str,
     subject_id: str,
     from_date: date,
@@ -134,15 +212,36 @@ async def get_remaining_classes(
 ) -> int:
     """
     Calculate remaining expected classes for a subject.
-    Uses timetable + semester dates.
+    
+    Uses the calendar-aware cumulative counts stored with the semester
+    totals, or projects them from the timetable and teaching calendar when
+    the subject's totals haven't been calculated yet; falls back to a
+    weekly-slot estimate when neither is possible.
     
     Returns:
         Number of remaining teaching slots.
     """
     settings = get_settings()
+    today = pendulum.now(settings.default_timezone).date()
+    
+    if semester_id:
+        index = await load_totals_index(db, batch_id, semester_id)
+        entry = index.get(subject_id)
+        if not (entry or {}).get("cumulative"):
+            try:
+                projected = await project_totals_index(db, batch_id, semester_id, [subject_id])
+                entry = projected.get(subject_id, entry)
+            except (APIError, httpx.HTTPError):
+                logger.warning(
+                    f"Could not project remaining classes for subject {subject_id}, "
+                    "using the weekly-slot estimate", exc_info=True
+                )
+        remaining = remaining_from_index(entry, today)
+        if remaining is not None:
+            return remaining
     
     # Get timetable events for this subject
-    result = db.table("timetable_events") \
+    result = await db.table("timetable_events") \
         .select("*, course_offerings!inner(subject_id, batch_id)") \
         .eq("course_offerings.subject_id", subject_id) \
         .eq("course_offerings.batch_id", batch_id) \
@@ -153,61 +252,437 @@ async def get_remaining_classes(
     if weekly_slots == 0:
         return 0
     
-    today = pendulum.now(settings.default_timezone).date()
+    end_date = await get_semester_end_date(db, semester_id)
     
-    # Try to get semester end date
-    end_date = None
+    return estimate_remaining_classes(weekly_slots, end_date, today)
+
+
+# =============================================================================
+# SET-BASED LOADERS
+# One query per table for the whole student, instead of one per subject.
+# =============================================================================
+
+def count_manual_entries(rows: List[Dict]) -> Dict[str, Dict[str, int]]:
+    """
+    Count PRESENT/ABSENT manual entries per subject.
+    CANCELLED entries don't count toward the total.
     
-    # First try: Get from semester table if semester_id provided
-    if semester_id:
-        semester_result = db.table("semesters") \
-            .select("end_date") \
-            .eq("id", semester_id) \
-            .limit(1) \
-            .execute()
-        
-        if semester_result.data and semester_result.data[0].get("end_date"):
-            end_date = pendulum.parse(semester_result.data[0]["end_date"]).date()
+    Rows are either manual_attendance rows or the grouped rows of
+    aggregate_manual_attendance, whose `entries` column holds the count.
     
-    # Second try: Get from teaching_periods (newest one)
-    if not end_date:
-        period_result = db.table("teaching_periods") \
-            .select("end_date") \
-            .order("end_date", desc=True) \
-            .limit(1) \
-            .execute()
+    Returns:
+        Dict keyed by subject_id with present, absent, total counts.
+    """
+    counts: Dict[str, Dict[str, int]] = {}
+    
+    for entry in rows:
+        subject_counts = counts.setdefault(
+            entry["subject_id"], {"present": 0, "absent": 0, "total": 0}
+        )
+        status = entry.get("status")
+        entries = entry.get("entries", 1)
+        if status == AttendanceStatus.PRESENT.value:
+            subject_counts["present"] += entries
+            subject_counts["total"] += entries
+        elif status == AttendanceStatus.ABSENT.value:
+            subject_counts["absent"] += entries
+            subject_counts["total"] += entries
+    
+    return counts
+
+
+async def load_manual_counts(
+    db: AsyncClient,
+    student_id: str,
+    snapshot_time: datetime,
+    subject_ids: Optional[Iterable[str]] = None
+) -> Dict[str, Dict[str, int]]:
+    """
+    Aggregate manual entries AFTER the snapshot date for every subject at once,
+    or only for subject_ids when given.
+    
+    Counting is done in Postgres by aggregate_manual_attendance, which
+    returns one row per subject/class_type/status. Falls back to
+    selecting the entries when the function isn't installed.
+    """
+    after = snapshot_time.date().isoformat()
+    subject_ids = list(subject_ids) if subject_ids is not None else None
+    
+    try:
+        grouped = db.rpc(
+            "aggregate_manual_attendance",
+            {"p_student_id": student_id, "p_after": after}
+        )
+        if subject_ids is not None:
+            grouped = grouped.in_("subject_id", subject_ids)
+        grouped = await grouped.execute()
+        return count_manual_entries(grouped.data or [])
+    except Exception as e:
+        if not is_missing_function(e):
+            raise
+        logger.warning("aggregate_manual_attendance not installed, counting rows")
+    
+    query = db.table("manual_attendance") \
+        .select("subject_id, status") \
+        .eq("student_id", student_id) \
+        .gt("event_date", after)
+    if subject_ids is not None:
+        query = query.in_("subject_id", subject_ids)
+    result = await query.execute()
+    
+    return count_manual_entries(result.data or [])
+
+
+async def load_previous_summaries(
+    db: AsyncClient,
+    student_id: str
+) -> Dict[str, Dict]:
+    """
+    Get existing summary baselines for a student, keyed by subject_id.
+    Used for subjects missing from the latest snapshot.
+    """
+    result = await db.table("attendance_summary") \
+        .select("subject_id, snapshot_present, snapshot_total") \
+        .eq("student_id", student_id) \
+        .execute()
+    
+    previous = {}
+    for row in result.data or []:
+        previous.setdefault(row["subject_id"], row)
+    
+    return previous
+
+
+async def load_weekly_slot_counts(
+    db: AsyncClient,
+    batch_id: str
+) -> Dict[str, int]:
+    """
+    Count timetable slots per week for every subject of a batch in one query.
+    
+    Returns:
+        Dict keyed by subject_id with weekly slot count.
+    """
+    result = await db.table("timetable_events") \
+        .select("id, course_offerings!inner(subject_id, batch_id)") \
+        .eq("course_offerings.batch_id", batch_id) \
+        .execute()
+    
+    slots: Dict[str, int] = {}
+    for event in result.data or []:
+        subject_id = (event.get("course_offerings") or {}).get("subject_id")
+        if subject_id:
+            slots[subject_id] = slots.get(subject_id, 0) + 1
+    
+    return slots
+
+
+def snapshot_entries_by_key(snapshot_entries: List[Dict]) -> Dict[str, Dict]:
+    """
+    Build lookup from snapshot entries keyed by code + class_type.
+    Supports both "course_code" (OCR format) and "subject_code" (test format).
+    """
+    snapshot_by_code = {}
+    for entry in snapshot_entries:
+        code = entry.get("course_code") or entry.get("subject_code")
+        class_type = entry.get("class_type", "LECTURE")
+        if code:
+            # Key by code+class_type to handle both lecture and lab
+            key = f"{code}_{class_type}"
+            snapshot_by_code[key] = entry
+    return snapshot_by_code
+
+
+def build_student_rows(
+    student_id: str,
+    batch_id: str,
+    semester_id: str,
+    snapshot: Dict,
+    subjects: List[Dict],
+    manual_counts: Dict[str, Dict[str, int]],
+    previous_summaries: Dict[str, Dict],
+    weekly_slots: Dict[str, int],
+    semester_end: Optional[date],
+    today: date,
+    required_pct: float,
+    computed_at: str,
+    remaining_index: Optional[Dict[str, Dict]] = None
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Compute attendance_summary and attendance_predictions rows in memory.
+    Pure function - all inputs are preloaded.
+    
+    Remaining classes come from remaining_index (see load_totals_index)
+    when the subject has cumulative counts, else from the weekly-slot
+    estimate.
+    
+    Returns:
+        Tuple of (summary_rows, prediction_rows), one of each per subject.
+    """
+    snapshot_id = snapshot["id"]
+    snapshot_time = pendulum.parse(snapshot["confirmed_at"])
+    snapshot_by_code = snapshot_entries_by_key(snapshot.get("entries", []))
+    
+    summary_rows = []
+    prediction_rows = []
+    
+    for subject in subjects:
+        subject_id = subject["id"]
+        subject_code = subject["code"]
+        class_type = subject.get("type", "LECTURE")
+        
+        # Find snapshot entry for this subject using code + class_type key
+        snap_entry = snapshot_by_code.get(f"{subject_code}_{class_type}")
+        
+        if snap_entry:
+            snap_present = snap_entry.get("present", 0)
+            snap_total = snap_entry.get("total", 0)
+        else:
+            # Subject not in snapshot - fall back to the previous summary
+            prev = previous_summaries.get(subject_id) or {}
+            snap_present = prev.get("snapshot_present", 0)
+            snap_total = prev.get("snapshot_total", 0)
+        
+        manual = manual_counts.get(subject_id, {"present": 0, "absent": 0, "total": 0})
+        
+        current_present = snap_present + manual["present"]
+        current_total = snap_total + manual["total"]
+        current_pct = compute_percentage(current_present, current_total)
+        
+        remaining = remaining_from_index((remaining_index or {}).get(subject_id), today)
+        if remaining is None:
+            remaining = estimate_remaining_classes(
+                weekly_slots.get(subject_id, 0), semester_end, today
+            )
+        must_attend, can_bunk, status = compute_prediction(
+            current_present, current_total, remaining, required_pct
+        )
+        
+        summary_rows.append({
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "batch_id": batch_id,
+            "semester_id": semester_id,
+            "class_type": class_type,
+            "snapshot_id": snapshot_id,
+            "snapshot_at": snapshot_time.isoformat(),
+            "snapshot_present": snap_present,
+            "snapshot_total": snap_total,
+            "manual_present": manual["present"],
+            "manual_absent": manual["absent"],
+            "manual_total": manual["total"],
+            "current_present": current_present,
+            "current_total": current_total,
+            "current_percentage": current_pct,
+            "last_recomputed_at": computed_at
+        })
         
-        if period_result.data and period_result.data[0].get("end_date"):
-            end_date = pendulum.parse(period_result.data[0]["end_date"]).date()
+        prediction_rows.append({
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "batch_id": batch_id,
+            "current_present": current_present,
+            "current_total": current_total,
+            "current_percentage": current_pct,
+            "required_percentage": required_pct,
+            "remaining_classes": remaining,
+            "must_attend": must_attend,
+            "can_bunk": can_bunk,
+            "status": getattr(status, "value", status),
+            "prediction_computed_at": computed_at
+        })
     
-    # Fallback: assume 8 weeks remaining
-    if not end_date:
-        end_date = today.add(weeks=8)
+    return summary_rows, prediction_rows
+
+
+async def load_batch_data(
+    db: AsyncClient,
+    batch_id: str,
+    semester_id: str
+) -> Dict:
+    """
+    Load the batch-level inputs every student of a batch shares.
     
-    # Count weeks remaining
-    remaining_weeks = max(0, (end_date - today).days // 7)
+    Subjects with no precomputed cumulative counts get them projected
+    from the timetable and the teaching calendar index; the weekly-slot
+    estimate inputs are only read if that isn't possible either.
     
-    return weekly_slots * remaining_weeks
+    Returns:
+        Dict with batch_id, semester_id, subjects, remaining_index,
+        weekly_slots, semester_end, and the semester row / expected
+        totals for the read model.
+    """
+    subjects = await get_subjects_for_batch(db, batch_id, semester_id)
+    totals_index = await load_totals_index(db, batch_id, semester_id)
+    # Expected totals are what's stored, same as the joined read path
+    expected_totals = {s: entry["total"] for s, entry in totals_index.items()}
+    
+    def missing() -> List[str]:
+        return [
+            s["id"] for s in subjects
+            if not (totals_index.get(s["id"]) or {}).get("cumulative")
+        ]
+    
+    if missing():
+        try:
+            totals_index.update(
+                await project_totals_index(db, batch_id, semester_id, missing())
+            )
+        except (APIError, httpx.HTTPError):
+            logger.warning(
+                f"Could not project totals for batch {batch_id}, "
+                "using the weekly-slot estimate", exc_info=True
+            )
+    needs_estimate = bool(missing())
+    
+    return {
+        "batch_id": batch_id,
+        "semester_id": semester_id,
+        "subjects": subjects,
+        "remaining_index": totals_index,
+        "weekly_slots": await load_weekly_slot_counts(db, batch_id) if needs_estimate else {},
+        "semester_end": await get_semester_end_date(db, semester_id) if needs_estimate else None,
+        "semester": await load_semester_info(db, semester_id),
+        "expected_totals": expected_totals
+    }
+
+
+async def resolve_batch_data(
+    db: AsyncClient,
+    context: Dict,
+    batch_data: Optional[Dict] = None
+) -> Dict:
+    """Reuse batch_data if it matches the context's batch/semester, else load it."""
+    if (
+        batch_data is None
+        or batch_data["batch_id"] != context["batch_id"]
+        or batch_data["semester_id"] != context["semester_id"]
+    ):
+        batch_data = await load_batch_data(db, context["batch_id"], context["semester_id"])
+    return batch_data
+
+
+async def compute_student_rows(
+    db: AsyncClient,
+    student_id: str,
+    context: Optional[Dict] = None,
+    batch_data: Optional[Dict] = None,
+    snapshot: Optional[Dict] = None,
+    previous_summaries: Optional[Dict[str, Dict]] = None
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Compute a student's summary and prediction rows without writing them.
+    
+    Loads context (if not given), latest snapshot (if not given or for
+    another batch), batch data (if not given or for another
+    batch/semester), manual counts and previous summaries (if not
+    given) - one query each - then builds every subject in memory.
+    
+    Returns:
+        Tuple of (summary_rows, prediction_rows)
+    """
+    if context is None:
+        context = await get_student_context(db, student_id)
+    batch_id = context["batch_id"]
+    semester_id = context["semester_id"]
+    
+    if snapshot is None or snapshot.get("batch_id") != batch_id:
+        snapshot = await get_latest_snapshot(db, student_id, batch_id)
+    if not snapshot:
+        raise NoSnapshotError(student_id)
+    
+    snapshot_time = pendulum.parse(snapshot["confirmed_at"])
+    
+    batch_data = await resolve_batch_data(db, context, batch_data)
+    manual_counts = await load_manual_counts(db, student_id, snapshot_time)
+    if previous_summaries is None:
+        previous_summaries = await load_previous_summaries(db, student_id)
+    
+    settings = get_settings()
+    
+    return build_student_rows(
+        student_id=student_id,
+        batch_id=batch_id,
+        semester_id=semester_id,
+        snapshot=snapshot,
+        subjects=batch_data["subjects"],
+        manual_counts=manual_counts,
+        previous_summaries=previous_summaries,
+        weekly_slots=batch_data["weekly_slots"],
+        semester_end=batch_data["semester_end"],
+        today=pendulum.now(settings.default_timezone).date(),
+        required_pct=settings.default_required_percentage,
+        computed_at=pendulum.now("UTC").isoformat(),
+        remaining_index=batch_data.get("remaining_index")
+    )
+
+
+async def log_computation(
+    db: AsyncClient,
+    student_id: str,
+    trigger: ComputeTrigger,
+    trigger_id: Optional[str],
+    trigger_ids: Optional[List[str]],
+    start_time: datetime,
+    subjects_updated: int = 0,
+    error: Optional[Exception] = None
+) -> None:
+    """Write one engine_computation_log row for a finished recompute."""
+    end_time = pendulum.now("UTC")
+    duration_ms = int((end_time - start_time).total_seconds() * 1000)
+    
+    row = {
+        "student_id": student_id,
+        "trigger_type": trigger.value,
+        "trigger_id": trigger_id,
+        "trigger_ids": trigger_ids or ([trigger_id] if trigger_id else []),
+        "status": (ComputeStatus.FAILED if error else ComputeStatus.SUCCESS).value,
+        "subjects_updated": subjects_updated,
+        "started_at": start_time.isoformat(),
+        "completed_at": end_time.isoformat(),
+        "duration_ms": duration_ms
+    }
+    if error is not None:
+        row["error_message"] = str(error)
+        row["error_details"] = {"type": type(error).__name__}
+    
+    await db.table("engine_computation_log").insert(row).execute()
 
 
 async def recompute_for_student(
-    db: Client,
+    db: AsyncClient,
     student_id: str,
     trigger: ComputeTrigger,
-    trigger_id: Optional[str] = None
+    trigger_id: Optional[str] = None,
+    context: Optional[Dict] = None,
+    batch_data: Optional[Dict] = None,
+    trigger_ids: Optional[List[str]] = None,
+    snapshot: Optional[Dict] = None
 ) -> Tuple[int, ComputeStatus]:
     """
     Full recomputation pipeline for a student.
     
+    Set-based: every table is read once for the whole student,
+    all subjects are computed in memory, and results are written
+    with one bulk upsert per table.
+    
     Steps:
     1. Validate context
     2. Get latest snapshot
-    3. For each subject:
-       a. Get snapshot baseline
-       b. Aggregate manual entries
-       c. Compute current totals
-       d. Compute predictions
-       e. Persist to summary/prediction tables
+    3. Load subjects, manual entries, previous summaries,
+       timetable slots and semester end (one query each)
+    4. Compute summaries and predictions for every subject
+    5. Bulk upsert summary/prediction tables
+    6. Write the student's read model document
+    
+    Callers that already know the student's context, or that recompute
+    a whole batch, can pass context / batch_data to skip those reads;
+    a snapshot confirm passes the snapshot it just stored. Every
+    prediction row is rewritten, changed or not: remaining classes and
+    can_bunk depend on today's date.
+    batch_data and snapshot are ignored if they belong to a different
+    batch/semester.
+    trigger_ids lists every trigger coalesced into this run (for the log).
     
     Returns:
         Tuple of (subjects_updated, status)
@@ -215,159 +690,619 @@ async def recompute_for_student(
     start_time = pendulum.now("UTC")
     
     try:
-        # Step 1: Get context
-        context = await get_student_context(db, student_id)
-        batch_id = context["batch_id"]
-        semester_id = context["semester_id"]
+        # Steps 1-4: Load once and compute all subjects in memory
+        if context is None:
+            context = await get_student_context(db, student_id)
+        batch_data = await resolve_batch_data(db, context, batch_data)
+        previous_summaries = await load_previous_summaries(db, student_id)
+        summary_rows, prediction_rows = await compute_student_rows(
+            db, student_id, context=context, batch_data=batch_data,
+            snapshot=snapshot, previous_summaries=previous_summaries
+        )
         
-        # Step 2: Get latest snapshot
-        snapshot = await get_latest_snapshot(db, student_id, batch_id)
-        if not snapshot:
-            raise NoSnapshotError(student_id)
-        
-        snapshot_id = snapshot["id"]
-        snapshot_time = pendulum.parse(snapshot["confirmed_at"])
-        snapshot_entries = snapshot.get("entries", [])
-        
-        # Build lookup from snapshot entries by subject code
-        # Support both "course_code" (OCR format) and "subject_code" (test format)
-        snapshot_by_code = {}
-        for entry in snapshot_entries:
-            code = entry.get("course_code") or entry.get("subject_code")
-            class_type = entry.get("class_type", "LECTURE")
-            if code:
-                # Key by code+class_type to handle both lecture and lab
-                key = f"{code}_{class_type}"
-                snapshot_by_code[key] = entry
-        
-        # Step 3: Get subjects for this batch
-        subjects = await get_subjects_for_batch(db, batch_id, semester_id)
+        # Step 5: One bulk upsert per table
+        if summary_rows:
+            await db.table("attendance_summary") \
+                .upsert(summary_rows, on_conflict="student_id,subject_id,class_type") \
+                .execute()
+            await db.table("attendance_predictions") \
+                .upsert(prediction_rows, on_conflict="student_id,subject_id") \
+                .execute()
+            
+            # Step 6: Denormalized document for the read endpoints
+            await save_read_models(db, [build_read_model(
+                student_id,
+                context["batch_id"],
+                context["semester_id"],
+                summary_rows,
+                batch_data["subjects"],
+                batch_data["expected_totals"],
+                batch_data["semester"],
+                pendulum.now("UTC").isoformat()
+            )])
+            await get_response_cache().invalidate_student(student_id)
         
-        settings = get_settings()
-        required_pct = settings.default_required_percentage
+        subjects_updated = len(summary_rows)
         
-        subjects_updated = 0
+        await log_computation(
+            db, student_id, trigger, trigger_id, trigger_ids,
+            start_time, subjects_updated
+        )
         
-        for subject in subjects:
-            subject_id = subject["id"]
-            subject_code = subject["code"]
-            class_type = subject.get("type", "LECTURE")
-            
-            # Find snapshot entry for this subject using code + class_type key
-            key = f"{subject_code}_{class_type}"
-            snap_entry = snapshot_by_code.get(key)
-            
-            if snap_entry:
-                snap_present = snap_entry.get("present", 0)
-                snap_total = snap_entry.get("total", 0)
-            else:
-                # Subject not in snapshot - check if there's a previous summary
-                prev_summary = db.table("attendance_summary") \
-                    .select("snapshot_present, snapshot_total") \
-                    .eq("student_id", student_id) \
-                    .eq("subject_id", subject_id) \
-                    .limit(1) \
-                    .execute()
-                
-                if prev_summary.data:
-                    snap_present = prev_summary.data[0].get("snapshot_present", 0)
-                    snap_total = prev_summary.data[0].get("snapshot_total", 0)
-                else:
-                    snap_present = 0
-                    snap_total = 0
-            
-            # Step 4: Aggregate manual entries
-            manual = await aggregate_manual_entries(
-                db, student_id, snapshot_id, snapshot_time, subject_id
+        return subjects_updated, ComputeStatus.SUCCESS
+    
+    except Exception as e:
+        await log_computation(
+            db, student_id, trigger, trigger_id, trigger_ids,
+            start_time, error=e
+        )
+        raise
+
+
+# =============================================================================
+# MANUAL ENTRY VALIDATION
+# =============================================================================
+
+def manual_entry_key(subject_id: str, event_date, class_type) -> Tuple[str, str, str]:
+    """The (subject_id, event_date, class_type) a student has at most one entry for."""
+    # str() of a date is its ISO form, so rows and requests give the same key
+    return (subject_id, str(event_date), getattr(class_type, "value", class_type))
+
+
+def validate_manual_entries(
+    entries: List,
+    snapshot_date: date,
+    non_teaching_dates: Iterable[date]
+) -> List[Dict]:
+    """
+    Check every entry of a bulk request against the snapshot lock and
+    the teaching calendar in one pass. Pure function.
+    
+    Returns:
+        One violation per rejected entry: its index plus the
+        PolicyViolation dict. Empty if every entry is valid.
+    """
+    non_teaching = set(non_teaching_dates)
+    violations = []
+    
+    for index, entry in enumerate(entries):
+        if entry.event_date <= snapshot_date:
+            error = SnapshotLockViolation(str(entry.event_date), str(snapshot_date))
+        elif entry.event_date in non_teaching:
+            error = InvalidDateError(
+                str(entry.event_date), "Not a teaching day (holiday or weekly off)"
             )
-            
-            # Step 5: Compute current totals
-            current_present = snap_present + manual["present"]
-            current_total = snap_total + manual["total"]
-            current_pct = compute_percentage(current_present, current_total)
-            
-            # Step 6: Compute predictions
-            remaining = await get_remaining_classes(
-                db, batch_id, subject_id, snapshot_time.date(), semester_id
+        else:
+            continue
+        violations.append({"index": index, **error.to_dict()})
+    
+    return violations
+
+
+def manual_entry_row(
+    student_id: str,
+    snapshot_id: str,
+    subject_id: str,
+    event_date,
+    class_type,
+    status,
+    period_slot: Optional[int] = None
+) -> Dict:
+    """A manual_attendance row for upsert_manual_entries."""
+    return {
+        "student_id": student_id,
+        "subject_id": subject_id,
+        "snapshot_id": snapshot_id,
+        "event_date": str(event_date),
+        "class_type": getattr(class_type, "value", class_type),
+        "status": getattr(status, "value", status),
+        "period_slot": period_slot
+    }
+
+
+async def upsert_manual_entries(db: AsyncClient, rows: List[Dict]) -> List[Dict]:
+    """
+    Insert or update manual_attendance rows in one round trip.
+    
+    Rows (see manual_entry_row) are keyed on student, subject, date and
+    class type. Uses the upsert_manual_attendance function, which also
+    returns each entry's previous status; without it, previous statuses
+    are read first and the rows written with a plain upsert.
+    
+    Returns:
+        One dict per row: id, subject_id, event_date, class_type,
+        status and previous_status (None if the entry is new).
+    """
+    try:
+        result = await db.rpc("upsert_manual_attendance", {"p_rows": rows}).execute()
+        return result.data or []
+    except Exception as e:
+        if not is_missing_function(e):
+            raise
+        logger.warning("upsert_manual_attendance not installed, using read-then-upsert")
+    
+    existing = await db.table("manual_attendance") \
+        .select("student_id, subject_id, event_date, class_type, status") \
+        .in_("student_id", list({r["student_id"] for r in rows})) \
+        .in_("subject_id", list({r["subject_id"] for r in rows})) \
+        .in_("event_date", list({r["event_date"] for r in rows})) \
+        .execute()
+    previous = {
+        (r["student_id"],) + manual_entry_key(r["subject_id"], r["event_date"], r["class_type"]): r["status"]
+        for r in existing.data or []
+    }
+    
+    result = await db.table("manual_attendance") \
+        .upsert(rows, on_conflict="student_id,subject_id,event_date,class_type") \
+        .execute()
+    
+    return [
+        {
+            "id": r["id"],
+            "subject_id": r["subject_id"],
+            "event_date": r["event_date"],
+            "class_type": r["class_type"],
+            "status": r["status"],
+            "previous_status": previous.get(
+                (r["student_id"],) + manual_entry_key(r["subject_id"], r["event_date"], r["class_type"])
             )
-            
-            must_attend, can_bunk, status = compute_prediction(
-                current_present, current_total, remaining, required_pct
+        }
+        for r in result.data or []
+    ]
+
+
+# =============================================================================
+# INCREMENTAL RECOMPUTE
+# =============================================================================
+
+def manual_entry_delta(
+    subject_id: str,
+    event_date: date,
+    old_status: Optional[AttendanceStatus],
+    new_status: Optional[AttendanceStatus]
+) -> Dict:
+    """
+    Describe one manual entry change for the incremental path.
+    Insert: old_status is None. Delete: new_status is None.
+    """
+    return {
+        "subject_id": subject_id,
+        "event_date": event_date.isoformat(),
+        "old_status": getattr(old_status, "value", old_status),
+        "new_status": getattr(new_status, "value", new_status)
+    }
+
+
+def apply_manual_counts(summary: Dict, counts: Dict[str, Dict[str, int]], computed_at: str) -> Dict:
+    """
+    Set one stored attendance_summary row's manual counts from
+    load_manual_counts and re-derive its current figures.
+    
+    The counts are absolute, not added to what is stored, so applying
+    them after a full recompute already counted the same entries
+    changes nothing. Pure function.
+    
+    Returns:
+        The updated summary row (the input is not modified).
+    """
+    row = dict(summary)
+    manual = counts.get(row["subject_id"], {"present": 0, "absent": 0, "total": 0})
+    
+    row["manual_present"] = manual["present"]
+    row["manual_absent"] = manual["absent"]
+    row["manual_total"] = manual["total"]
+    row["current_present"] = row["snapshot_present"] + row["manual_present"]
+    row["current_total"] = row["snapshot_total"] + row["manual_total"]
+    row["current_percentage"] = compute_percentage(row["current_present"], row["current_total"])
+    row["last_recomputed_at"] = computed_at
+    
+    return row
+
+
+def derive_prediction(summary: Dict, prediction: Dict, computed_at: str) -> Dict:
+    """
+    Re-derive a stored prediction row from an updated summary row.
+    Keeps the stored remaining_classes and required_percentage.
+    
+    Returns:
+        The updated prediction row.
+    """
+    row = dict(prediction)
+    must_attend, can_bunk, status = compute_prediction(
+        summary["current_present"],
+        summary["current_total"],
+        row["remaining_classes"],
+        float(row["required_percentage"])
+    )
+    
+    row.update({
+        "current_present": summary["current_present"],
+        "current_total": summary["current_total"],
+        "current_percentage": summary["current_percentage"],
+        "must_attend": must_attend,
+        "can_bunk": can_bunk,
+        "status": getattr(status, "value", status),
+        "prediction_computed_at": computed_at
+    })
+    return row
+
+
+SUMMARY_DELTA_COLUMNS = (
+    "student_id", "subject_id", "class_type",
+    "manual_present", "manual_absent", "manual_total",
+    "current_present", "current_total", "current_percentage",
+    "last_recomputed_at"
+)
+
+PREDICTION_DELTA_COLUMNS = (
+    "student_id", "subject_id",
+    "current_present", "current_total", "current_percentage",
+    "must_attend", "can_bunk", "status", "prediction_computed_at"
+)
+
+
+async def recompute_incremental(
+    db: AsyncClient,
+    student_id: str,
+    deltas: List[Dict],
+    trigger_id: Optional[str] = None,
+    trigger_ids: Optional[List[str]] = None
+) -> Tuple[int, ComputeStatus]:
+    """
+    Recompute only the subjects touched by manual entry deltas.
+    
+    Reads the stored summary and prediction rows for the touched
+    subjects, re-counts their manual entries after the snapshot date,
+    re-derives the prediction and upserts just those rows, then patches
+    the same subjects in the read model document. The deltas only say
+    which subjects to touch: counts are re-read, never adjusted in
+    place, so a delta that a full recompute (in flight, forced or a
+    repair) has already counted is not counted twice. Falls back to recompute_for_student when a
+    subject has no stored rows yet (nothing to adjust).
+    
+    Returns:
+        Tuple of (subjects_updated, status)
+    """
+    start_time = pendulum.now("UTC")
+    subject_ids = list(dict.fromkeys(d["subject_id"] for d in deltas))
+    
+    try:
+        summaries = await db.table("attendance_summary") \
+            .select("*") \
+            .eq("student_id", student_id) \
+            .in_("subject_id", subject_ids) \
+            .execute()
+        predictions = await db.table("attendance_predictions") \
+            .select("*") \
+            .eq("student_id", student_id) \
+            .in_("subject_id", subject_ids) \
+            .execute()
+    except Exception as e:
+        await log_computation(
+            db, student_id, ComputeTrigger.MANUAL_ENTRY, trigger_id, trigger_ids,
+            start_time, error=e
+        )
+        raise
+    
+    predictions_by_subject = {row["subject_id"]: row for row in predictions.data or []}
+    summarised = {row["subject_id"] for row in summaries.data or []}
+    
+    if any(s not in summarised or s not in predictions_by_subject for s in subject_ids):
+        return await recompute_for_student(
+            db, student_id, ComputeTrigger.MANUAL_ENTRY, trigger_id,
+            trigger_ids=trigger_ids
+        )
+    
+    try:
+        # Rows share the student's snapshot; group in case one lags behind
+        counts_by_snapshot = {}
+        for snapshot_at in {row["snapshot_at"] for row in summaries.data}:
+            counts_by_snapshot[snapshot_at] = await load_manual_counts(
+                db, student_id, pendulum.parse(snapshot_at), subject_ids
             )
-            
-            # Step 7: Upsert summary
-            db.table("attendance_summary").upsert({
-                "student_id": student_id,
-                "subject_id": subject_id,
-                "batch_id": batch_id,
-                "semester_id": semester_id,
-                "class_type": class_type,
-                "snapshot_id": snapshot_id,
-                "snapshot_at": snapshot_time.isoformat(),
-                "snapshot_present": snap_present,
-                "snapshot_total": snap_total,
-                "manual_present": manual["present"],
-                "manual_absent": manual["absent"],
-                "manual_total": manual["total"],
-                "current_present": current_present,
-                "current_total": current_total,
-                "current_percentage": current_pct,
-                "last_recomputed_at": pendulum.now("UTC").isoformat()
-            }, on_conflict="student_id,subject_id,class_type").execute()
-            
-            # Step 8: Upsert prediction
-            recovery = compute_recovery_classes(current_present, current_total, required_pct)
-            
-            db.table("attendance_predictions").upsert({
-                "student_id": student_id,
-                "subject_id": subject_id,
-                "batch_id": batch_id,
-                "current_present": current_present,
-                "current_total": current_total,
-                "current_percentage": current_pct,
-                "required_percentage": required_pct,
-                "remaining_classes": remaining,
-                "must_attend": must_attend,
-                "can_bunk": can_bunk,
-                "status": status.value,
-                "prediction_computed_at": pendulum.now("UTC").isoformat()
-            }, on_conflict="student_id,subject_id").execute()
-            
-            subjects_updated += 1
         
-        # Log computation
-        end_time = pendulum.now("UTC")
-        duration_ms = int((end_time - start_time).total_seconds() * 1000)
+        computed_at = pendulum.now("UTC").isoformat()
+        updated_rows = []
+        summary_rows = []
+        prediction_rows = {}
         
-        db.table("engine_computation_log").insert({
-            "student_id": student_id,
-            "trigger_type": trigger.value,
-            "trigger_id": trigger_id,
-            "status": ComputeStatus.SUCCESS.value,
-            "subjects_updated": subjects_updated,
-            "started_at": start_time.isoformat(),
-            "completed_at": end_time.isoformat(),
-            "duration_ms": duration_ms
-        }).execute()
+        for summary in summaries.data:
+            updated = apply_manual_counts(
+                summary, counts_by_snapshot[summary["snapshot_at"]], computed_at
+            )
+            updated_rows.append(updated)
+            summary_rows.append({k: updated[k] for k in SUMMARY_DELTA_COLUMNS})
+            prediction = derive_prediction(
+                updated, predictions_by_subject[summary["subject_id"]], computed_at
+            )
+            prediction_rows[summary["subject_id"]] = {
+                k: prediction[k] for k in PREDICTION_DELTA_COLUMNS
+            }
         
-        return subjects_updated, ComputeStatus.SUCCESS
+        await db.table("attendance_summary") \
+            .upsert(summary_rows, on_conflict="student_id,subject_id,class_type") \
+            .execute()
+        await db.table("attendance_predictions") \
+            .upsert(list(prediction_rows.values()), on_conflict="student_id,subject_id") \
+            .execute()
         
-    except Exception as e:
-        # Log failure
-        end_time = pendulum.now("UTC")
-        duration_ms = int((end_time - start_time).total_seconds() * 1000)
+        document = await get_read_model(db, student_id)
+        if document is not None:
+            document = refresh_read_model(document, updated_rows, computed_at)
+            if document is None:
+                await drop_read_model(db, student_id)
+            else:
+                await save_read_models(db, [document])
+        await get_response_cache().invalidate_student(student_id)
         
-        db.table("engine_computation_log").insert({
-            "student_id": student_id,
-            "trigger_type": trigger.value,
-            "trigger_id": trigger_id,
-            "status": ComputeStatus.FAILED.value,
-            "subjects_updated": 0,
-            "started_at": start_time.isoformat(),
-            "completed_at": end_time.isoformat(),
-            "duration_ms": duration_ms,
-            "error_message": str(e),
-            "error_details": {"type": type(e).__name__}
-        }).execute()
+        subjects_updated = len(prediction_rows)
+        
+        await log_computation(
+            db, student_id, ComputeTrigger.MANUAL_ENTRY, trigger_id, trigger_ids,
+            start_time, subjects_updated
+        )
         
+        return subjects_updated, ComputeStatus.SUCCESS
+    
+    except Exception as e:
+        await log_computation(
+            db, student_id, ComputeTrigger.MANUAL_ENTRY, trigger_id, trigger_ids,
+            start_time, error=e
+        )
         raise
+
+
+# =============================================================================
+# MANUAL ENTRY LISTING
+# =============================================================================
+
+MANUAL_EXPORT_PAGE = 1000
+
+
+async def list_manual_entries(
+    db: AsyncClient,
+    student_id: str,
+    limit: int = 100,
+    after: Optional[List] = None,
+    subject_id: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    include_subject: bool = True
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of a student's manual entries, newest first.
+    
+    Keyset-paginated on (event_date, id); after is the decoded cursor of
+    the previous page. include_subject=False skips the subjects join for
+    clients that already have the subject catalogue.
+    
+    Returns:
+        Tuple of (entries, next page cursor or None on the last page).
+    """
+    query = db.table("manual_attendance") \
+        .select("*, subjects(code, name)" if include_subject else "*") \
+        .eq("student_id", student_id)
+    
+    if subject_id:
+        query = query.eq("subject_id", subject_id)
+    if from_date:
+        query = query.gte("event_date", from_date.isoformat())
+    if to_date:
+        query = query.lte("event_date", to_date.isoformat())
+    if after:
+        query = query.or_(keyset_filter(("event_date", "id"), after))
+    
+    # One extra row tells whether there is a next page
+    result = await query \
+        .order("event_date", desc=True) \
+        .order("id", desc=True) \
+        .limit(limit + 1) \
+        .execute()
+    
+    rows = result.data or []
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(page[-1]["event_date"], page[-1]["id"])
+    
+    return page, next_cursor
+
+
+async def iter_manual_entries(
+    db: AsyncClient,
+    student_id: str,
+    after: Optional[List] = None,
+    page_size: int = MANUAL_EXPORT_PAGE,
+    **filters
+) -> AsyncIterator[Dict]:
+    """
+    Every manual entry after the cursor, newest first, read page by page
+    (see list_manual_entries) so an export never holds the whole set.
+    """
+    while True:
+        page, next_cursor = await list_manual_entries(
+            db, student_id, page_size, after, **filters
+        )
+        for row in page:
+            yield row
+        if next_cursor is None:
+            return
+        after = [page[-1]["event_date"], page[-1]["id"]]
+
+
+# =============================================================================
+# CONSISTENCY CHECK
+# =============================================================================
+
+SUMMARY_CHECK_FIELDS = (
+    "snapshot_present", "snapshot_total",
+    "manual_present", "manual_absent", "manual_total",
+    "current_present", "current_total"
+)
+
+# remaining_classes is re-estimated from "today" by a full recompute, so
+# must_attend/can_bunk legitimately drift day to day - only counts are checked
+PREDICTION_CHECK_FIELDS = ("current_present", "current_total")
+
+
+def diff_rows(
+    table: str,
+    expected: List[Dict],
+    stored: List[Dict],
+    fields: Tuple[str, ...]
+) -> List[Dict]:
+    """
+    Compare expected rows with stored rows, matched by subject_id.
+    
+    Returns:
+        One mismatch dict per differing field or missing row.
+    """
+    stored_by_subject = {row["subject_id"]: row for row in stored}
+    mismatches = []
+    
+    for row in expected:
+        subject_id = row["subject_id"]
+        current = stored_by_subject.get(subject_id)
+        if current is None:
+            mismatches.append({
+                "table": table,
+                "subject_id": subject_id,
+                "field": None,
+                "stored": None,
+                "expected": "row"
+            })
+            continue
+        for field_name in fields:
+            if current.get(field_name) != row[field_name]:
+                mismatches.append({
+                    "table": table,
+                    "subject_id": subject_id,
+                    "field": field_name,
+                    "stored": current.get(field_name),
+                    "expected": row[field_name]
+                })
+    
+    return mismatches
+
+
+async def check_consistency(db: AsyncClient, student_id: str) -> Dict:
+    """
+    Compare a student's stored rows with a full in-memory recompute.
+    
+    Nothing is written. Any mismatch means the incremental path (or a
+    missed trigger) left the stored rows out of date.
+    
+    Returns:
+        Dict with consistent flag, subjects_checked and mismatches.
+    """
+    expected_summaries, expected_predictions = await compute_student_rows(db, student_id)
+    
+    stored_summaries = await db.table("attendance_summary") \
+        .select("subject_id, " + ", ".join(SUMMARY_CHECK_FIELDS)) \
+        .eq("student_id", student_id) \
+        .execute()
+    stored_predictions = await db.table("attendance_predictions") \
+        .select("subject_id, " + ", ".join(PREDICTION_CHECK_FIELDS)) \
+        .eq("student_id", student_id) \
+        .execute()
+    
+    mismatches = diff_rows(
+        "attendance_summary", expected_summaries,
+        stored_summaries.data or [], SUMMARY_CHECK_FIELDS
+    ) + diff_rows(
+        "attendance_predictions", expected_predictions,
+        stored_predictions.data or [], PREDICTION_CHECK_FIELDS
+    )
+    
+    return {
+        "student_id": student_id,
+        "consistent": not mismatches,
+        "subjects_checked": len(expected_summaries),
+        "mismatches": mismatches
+    }
+
+
+async def recompute_batch(
+    db: AsyncClient,
+    batch_id: Optional[str] = None,
+    semester_id: Optional[str] = None,
+    trigger: ComputeTrigger = ComputeTrigger.FORCE_RECOMPUTE,
+    concurrency: Optional[int] = None
+) -> Dict:
+    """
+    Recompute every student whose current context is in a batch and/or semester.
+    
+    Students are grouped by (batch, semester) so subjects, timetable and
+    semester dates are loaded once per group, then recomputed with at most
+    `concurrency` students in flight. A failing student never stops the run.
+    
+    Returns:
+        Dict with students_processed, students_failed, subjects_updated
+        and a per-student results list (status, timing, error).
+    """
+    settings = get_settings()
+    concurrency = concurrency or settings.batch_recompute_concurrency
+    
+    query = db.table("app_users") \
+        .select("student_id, current_batch_id, current_semester_id, preferences")
+    if batch_id:
+        query = query.eq("current_batch_id", batch_id)
+    if semester_id:
+        query = query.eq("current_semester_id", semester_id)
+    users = await query.execute()
+    
+    contexts = [
+        {
+            "student_id": u["student_id"],
+            "batch_id": u["current_batch_id"],
+            "semester_id": u["current_semester_id"],
+            "preferences": u.get("preferences") or {}
+        }
+        for u in users.data or []
+        if u.get("student_id") and u.get("current_batch_id") and u.get("current_semester_id")
+    ]
+    
+    # Batch-level data, loaded once per (batch, semester) group
+    shared: Dict[Tuple[str, str], Dict] = {}
+    for ctx in contexts:
+        key = (ctx["batch_id"], ctx["semester_id"])
+        if key not in shared:
+            shared[key] = await load_batch_data(db, *key)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run_one(ctx: Dict) -> Dict:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                subjects_updated, status = await recompute_for_student(
+                    db,
+                    ctx["student_id"],
+                    trigger,
+                    context=ctx,
+                    batch_data=shared[(ctx["batch_id"], ctx["semester_id"])]
+                )
+                error = None
+            except Exception as e:
+                subjects_updated, status = 0, ComputeStatus.FAILED
+                error = str(e)
+            
+            return {
+                "student_id": ctx["student_id"],
+                "batch_id": ctx["batch_id"],
+                "status": status.value,
+                "subjects_updated": subjects_updated,
+                "duration_ms": int((time.perf_counter() - started) * 1000),
+                "error": error
+            }
+    
+    results = await asyncio.gather(*[run_one(ctx) for ctx in contexts])
+    failed = [r for r in results if r["status"] == ComputeStatus.FAILED.value]
+    
+    return {
+        "students_processed": len(results) - len(failed),
+        "students_failed": len(failed),
+        "subjects_updated": sum(r["subjects_updated"] for r in results),
+        "groups": len(shared),
+        "results": results
+    }
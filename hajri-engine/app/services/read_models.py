@@ -0,0 +1,458 @@
+"""
+Per-student read model for HAJRI Engine.
+
+The recompute pipeline writes one denormalized document per student
+(student_read_models): every subject with its code/name, counts,
+percentage, can_bunk and must_attend, plus the semester name and end.
+/predictions, /predictions/dashboard and /attendance/summary render it
+after a single primary-key read instead of joining attendance_summary
+with subjects, semester_subject_totals and semesters.
+
+The document is a cache of attendance_summary. Readers fall back to the
+joined queries when it is missing or belongs to another batch/semester.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from supabase import AsyncClient
+import pendulum
+
+from app.models.schemas import (
+    AttendanceDashboardResponse,
+    AttendanceSummaryResponse,
+    PredictionsResponse,
+    SubjectAttendance,
+    SubjectPrediction,
+    SubjectSummary
+)
+from app.services.predictions import (
+    compute_percentage,
+    compute_simple_prediction,
+    determine_simple_status,
+    determine_status
+)
+
+
+# Bump when the document shape changes; older documents are ignored
+READ_MODEL_VERSION = 1
+
+# Summary columns copied into each subject of the document
+SUBJECT_COUNT_FIELDS = (
+    "snapshot_present", "snapshot_total",
+    "manual_present", "manual_absent",
+    "current_present", "current_total",
+    "snapshot_at", "last_recomputed_at"
+)
+
+# Students per attendance_summary read, and app_users rows per page, when rebuilding
+STUDENTS_PER_READ = 200
+USERS_PER_READ = 1000
+
+
+# =============================================================================
+# BUILD (pure)
+# =============================================================================
+
+def _subject_entry(row: Dict, subject: Dict, expected_total: int) -> Dict:
+    """One subject of the document from its attendance_summary row."""
+    entry = {
+        "subject_id": row["subject_id"],
+        "subject_code": subject.get("code", ""),
+        "subject_name": subject.get("name", ""),
+        "class_type": row["class_type"],
+        "expected_total": expected_total
+    }
+    return _refresh_entry(entry, row)
+
+
+def _refresh_entry(entry: Dict, row: Dict) -> Dict:
+    """Copy counts from a summary row and re-derive the prediction."""
+    entry = dict(entry)
+    entry.update({k: row.get(k) for k in SUBJECT_COUNT_FIELDS})
+    entry["current_percentage"] = float(row.get("current_percentage") or 0)
+    
+    present = entry["current_present"]
+    total = entry["current_total"]
+    remaining = max(0, entry["expected_total"] - total)
+    pred = compute_simple_prediction(present, total, remaining)
+    
+    entry.update({
+        "classes_remaining": remaining,
+        "semester_total": pred["semester_total"],
+        "can_bunk": pred["can_bunk"],
+        "must_attend": pred["must_attend"],
+        "classes_to_recover": pred["classes_to_recover"],
+        "prediction_status": pred["status"]
+    })
+    return entry
+
+
+def _finish(document: Dict, computed_at: str) -> Dict:
+    """Fill in the document-level fields derived from its subjects."""
+    subjects = document["subjects"]
+    document["computed_at"] = computed_at
+    document["last_recomputed_at"] = max(
+        (s["last_recomputed_at"] for s in subjects if s.get("last_recomputed_at")),
+        default=None
+    )
+    document["snapshot_at"] = next(
+        (s["snapshot_at"] for s in subjects if s.get("snapshot_at")), None
+    )
+    return document
+
+
+def build_read_model(
+    student_id: str,
+    batch_id: str,
+    semester_id: str,
+    summary_rows: List[Dict],
+    subjects: List[Dict],
+    expected_totals: Dict[str, int],
+    semester: Optional[Dict],
+    computed_at: str
+) -> Dict:
+    """
+    Build a student's read document from their attendance_summary rows.
+    
+    subjects are the batch's subject rows (id, code, name), expected_totals
+    maps subject_id -> total_classes_in_semester and semester is the
+    semesters row (name, semester_number, end_date). Pure function.
+    
+    Returns:
+        The document stored in student_read_models.document.
+    """
+    subjects_by_id = {s["id"]: s for s in subjects}
+    semester = semester or {}
+    
+    document = {
+        "version": READ_MODEL_VERSION,
+        "student_id": student_id,
+        "batch_id": batch_id,
+        "semester_id": semester_id,
+        "semester": {
+            "name": semester.get("name"),
+            "semester_number": semester.get("semester_number"),
+            "end_date": semester.get("end_date")
+        },
+        "subjects": [
+            _subject_entry(
+                row,
+                subjects_by_id.get(row["subject_id"], {}),
+                expected_totals.get(row["subject_id"], 0)
+            )
+            for row in summary_rows
+        ]
+    }
+    return _finish(document, computed_at)
+
+
+def refresh_read_model(document: Dict, summary_rows: List[Dict], computed_at: str) -> Optional[Dict]:
+    """
+    Apply updated attendance_summary rows to an existing document.
+    Used by the incremental recompute, which only touches a few subjects.
+    
+    Returns:
+        The updated document, or None if a row's subject is not in it
+        (the document is stale and should be dropped).
+    """
+    entries = {
+        (s["subject_id"], s["class_type"]): i
+        for i, s in enumerate(document["subjects"])
+    }
+    document = dict(document, subjects=list(document["subjects"]))
+    
+    for row in summary_rows:
+        index = entries.get((row["subject_id"], row["class_type"]))
+        if index is None:
+            return None
+        document["subjects"][index] = _refresh_entry(document["subjects"][index], row)
+    
+    return _finish(document, computed_at)
+
+
+def is_current(document: Optional[Dict], context: Dict) -> bool:
+    """True if the document can answer reads for the student's current context."""
+    return bool(
+        document
+        and document.get("version") == READ_MODEL_VERSION
+        and document.get("batch_id") == context["batch_id"]
+        and document.get("semester_id") == context["semester_id"]
+    )
+
+
+# =============================================================================
+# RENDER (pure)
+# =============================================================================
+
+def render_dashboard(document: Dict) -> AttendanceDashboardResponse:
+    """The /predictions/dashboard response from a read document."""
+    subjects = []
+    overall_present = 0
+    overall_total = 0
+    
+    for s in document["subjects"]:
+        pct = compute_percentage(s["current_present"], s["current_total"])
+        subjects.append(SubjectAttendance(
+            subject_id=s["subject_id"],
+            subject_code=s["subject_code"],
+            subject_name=s["subject_name"],
+            class_type=s["class_type"],
+            present=s["current_present"],
+            total=s["current_total"],
+            percentage=pct,
+            status=determine_simple_status(pct)
+        ))
+        overall_present += s["current_present"]
+        overall_total += s["current_total"]
+    
+    last_updated = document.get("last_recomputed_at")
+    
+    return AttendanceDashboardResponse(
+        semester=document["semester"].get("name") or "Current",
+        last_updated=pendulum.parse(last_updated) if last_updated else pendulum.now("UTC"),
+        overall_present=overall_present,
+        overall_total=overall_total,
+        overall_percentage=compute_percentage(overall_present, overall_total),
+        subjects=subjects
+    )
+
+
+def render_predictions(document: Dict) -> PredictionsResponse:
+    """The /predictions response from a read document."""
+    subjects = []
+    
+    for s in document["subjects"]:
+        subjects.append(SubjectPrediction(
+            subject_id=s["subject_id"],
+            subject_code=s["subject_code"],
+            subject_name=s["subject_name"],
+            class_type=s["class_type"],
+            present=s["current_present"],
+            total=s["current_total"],
+            percentage=compute_percentage(s["current_present"], s["current_total"]),
+            can_bunk=s["can_bunk"],
+            must_attend=s["must_attend"],
+            classes_remaining=s["classes_remaining"],
+            semester_total=s["semester_total"],
+            classes_to_recover=s["classes_to_recover"],
+            status=s["prediction_status"]
+        ))
+    
+    return PredictionsResponse(
+        student_id=document["student_id"],
+        semester=document["semester"].get("name") or "Current",
+        semester_end=document["semester"].get("end_date"),
+        classes_remaining_in_semester=sum(s.classes_remaining for s in subjects),
+        total_can_bunk=sum(s.can_bunk for s in subjects),
+        total_must_attend=sum(s.must_attend for s in subjects),
+        subjects_at_risk=sum(1 for s in subjects if s.percentage < 75),
+        subjects=subjects,
+        computed_at=pendulum.now("UTC")
+    )
+
+
+def render_summary(document: Dict) -> AttendanceSummaryResponse:
+    """The /attendance/summary response from a read document."""
+    subjects = [
+        SubjectSummary(
+            subject_id=s["subject_id"],
+            subject_code=s["subject_code"],
+            subject_name=s["subject_name"],
+            class_type=s["class_type"],
+            snapshot_present=s["snapshot_present"],
+            snapshot_total=s["snapshot_total"],
+            manual_present=s["manual_present"],
+            manual_absent=s["manual_absent"],
+            current_present=s["current_present"],
+            current_total=s["current_total"],
+            current_percentage=s["current_percentage"],
+            status=determine_status(s["current_percentage"]),
+            last_updated=s["last_recomputed_at"]
+        )
+        for s in document["subjects"]
+    ]
+    overall_present = sum(s.current_present for s in subjects)
+    overall_total = sum(s.current_total for s in subjects)
+    number = document["semester"].get("semester_number")
+    
+    return AttendanceSummaryResponse(
+        student_id=document["student_id"],
+        batch_id=document["batch_id"],
+        semester_name=f"Semester {number}" if number is not None else "",
+        snapshot_at=document.get("snapshot_at"),
+        subjects=subjects,
+        overall_present=overall_present,
+        overall_total=overall_total,
+        overall_percentage=compute_percentage(overall_present, overall_total),
+        computed_at=pendulum.now("UTC")
+    )
+
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+async def load_semester_info(db: AsyncClient, semester_id: str) -> Optional[Dict]:
+    """The semesters row fields the read document carries."""
+    result = await db.table("semesters") \
+        .select("name, semester_number, end_date") \
+        .eq("id", semester_id) \
+        .limit(1) \
+        .execute()
+    return result.data[0] if result.data else None
+
+
+async def load_expected_totals(db: AsyncClient, batch_id: str, semester_id: str) -> Dict[str, int]:
+    """subject_id -> total_classes_in_semester for a batch/semester."""
+    result = await db.table("semester_subject_totals") \
+        .select("subject_id, total_classes_in_semester") \
+        .eq("batch_id", batch_id) \
+        .eq("semester_id", semester_id) \
+        .execute()
+    return {r["subject_id"]: r["total_classes_in_semester"] for r in result.data or []}
+
+
+async def get_read_model(db: AsyncClient, student_id: str) -> Optional[Dict]:
+    """
+    Get a student's read document (one primary-key read).
+    
+    Returns:
+        The document, or None if the student has none.
+    """
+    result = await db.table("student_read_models") \
+        .select("document") \
+        .eq("student_id", student_id) \
+        .limit(1) \
+        .execute()
+    return result.data[0]["document"] if result.data else None
+
+
+def _storage_row(document: Dict) -> Dict:
+    return {
+        "student_id": document["student_id"],
+        "batch_id": document["batch_id"],
+        "semester_id": document["semester_id"],
+        "document": document,
+        "computed_at": document["computed_at"]
+    }
+
+
+async def save_read_models(db: AsyncClient, documents: List[Dict], chunk_size: int = 500) -> int:
+    """
+    Upsert read documents, chunk_size rows per request.
+    
+    Returns:
+        Number of documents written.
+    """
+    rows = [_storage_row(d) for d in documents]
+    for start in range(0, len(rows), chunk_size):
+        await db.table("student_read_models") \
+            .upsert(rows[start:start + chunk_size], on_conflict="student_id") \
+            .execute()
+    return len(rows)
+
+
+async def drop_read_model(db: AsyncClient, student_id: str) -> None:
+    """Delete a stale document; reads fall back until the next recompute."""
+    await db.table("student_read_models") \
+        .delete() \
+        .eq("student_id", student_id) \
+        .execute()
+
+
+async def drop_batch_read_models(db: AsyncClient, batch_id: str, semester_id: Optional[str] = None) -> None:
+    """
+    Delete the documents of a batch (e.g. after its semester totals change).
+    Run rebuild_read_models to restore them without a recompute.
+    """
+    query = db.table("student_read_models") \
+        .delete() \
+        .eq("batch_id", batch_id)
+    if semester_id:
+        query = query.eq("semester_id", semester_id)
+    await query.execute()
+
+
+# =============================================================================
+# REBUILD
+# =============================================================================
+
+async def rebuild_read_models(
+    db: AsyncClient,
+    batch_id: Optional[str] = None,
+    semester_id: Optional[str] = None
+) -> Dict:
+    """
+    Rebuild read documents for existing students from stored rows.
+    
+    Nothing is recomputed: app_users is read USERS_PER_READ rows at a
+    time, and for each (batch, semester) of the students' current
+    contexts, semester totals and the semester row are read once and
+    that semester's attendance_summary (joined with subjects) is read for
+    up to STUDENTS_PER_READ students per query; documents are built in
+    memory and written with chunked upserts.
+    
+    Returns:
+        Dict with students_rebuilt, students_skipped (no summary rows) and groups.
+    """
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    offset = 0
+    while True:
+        query = db.table("app_users") \
+            .select("student_id, current_batch_id, current_semester_id")
+        if batch_id:
+            query = query.eq("current_batch_id", batch_id)
+        if semester_id:
+            query = query.eq("current_semester_id", semester_id)
+        # Paged so PostgREST's max-rows cap can't cut the list short
+        page = await query \
+            .order("id") \
+            .range(offset, offset + USERS_PER_READ - 1) \
+            .execute()
+        users = page.data or []
+        
+        for u in users:
+            if u.get("student_id") and u.get("current_batch_id") and u.get("current_semester_id"):
+                key = (u["current_batch_id"], u["current_semester_id"])
+                groups.setdefault(key, []).append(u["student_id"])
+        
+        offset += USERS_PER_READ
+        if len(users) < USERS_PER_READ:
+            break
+    
+    computed_at = pendulum.now("UTC").isoformat()
+    rebuilt = 0
+    skipped = 0
+    
+    for (group_batch, group_semester), student_ids in groups.items():
+        expected_totals = await load_expected_totals(db, group_batch, group_semester)
+        semester = await load_semester_info(db, group_semester)
+        
+        rows_by_student: Dict[str, List[Dict]] = {}
+        subjects: Dict[str, Dict] = {}
+        for start in range(0, len(student_ids), STUDENTS_PER_READ):
+            summaries = await db.table("attendance_summary") \
+                .select("*, subjects(code, name)") \
+                .eq("batch_id", group_batch) \
+                .eq("semester_id", group_semester) \
+                .in_("student_id", student_ids[start:start + STUDENTS_PER_READ]) \
+                .execute()
+            for row in summaries.data or []:
+                subjects[row["subject_id"]] = dict(row.pop("subjects", None) or {}, id=row["subject_id"])
+                rows_by_student.setdefault(row["student_id"], []).append(row)
+        
+        documents = [
+            build_read_model(
+                student_id, group_batch, group_semester, rows_by_student[student_id],
+                list(subjects.values()), expected_totals, semester, computed_at
+            )
+            for student_id in student_ids
+            if student_id in rows_by_student
+        ]
+        rebuilt += await save_read_models(db, documents)
+        skipped += len(student_ids) - len(documents)
+    
+    return {
+        "students_rebuilt": rebuilt,
+        "students_skipped": skipped,
+        "groups": len(groups)
+    }
@@ -0,0 +1,392 @@
+"""
+Recompute job queue for HAJRI Engine.
+
+Recompute triggers (snapshot confirm, manual entry add/delete) are
+queued here instead of running as FastAPI BackgroundTasks:
+- Pending jobs are coalesced per student: N triggers -> one recompute
+- A short debounce window holds a new job so a burst of triggers
+  (e.g. marking 6 lectures in a row) lands in the same recompute
+- Jobs run on a bounded pool of worker tasks, never in the request
+- A student is never recomputed by two workers at once
+- Manual entry triggers carry their delta, so a job made only of
+  manual entries takes the incremental path; any other trigger
+  (snapshot confirm, force, calendar) makes it a full recompute
+- A snapshot confirm hands over the stored snapshot and context, so
+  its full recompute doesn't read them again
+- Optional SQLite persistence so pending jobs survive a restart
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from app.config import get_settings
+from app.models.enums import ComputeTrigger
+from app.services.attendance import recompute_for_student, recompute_incremental
+
+
+logger = logging.getLogger("hajri-engine.queue")
+
+# When coalescing, the strongest trigger wins (snapshot > calendar > force > manual)
+TRIGGER_PRIORITY = {
+    ComputeTrigger.MANUAL_ENTRY: 0,
+    ComputeTrigger.FORCE_RECOMPUTE: 1,
+    ComputeTrigger.CALENDAR_UPDATE: 2,
+    ComputeTrigger.SNAPSHOT_CONFIRM: 3,
+}
+
+
+@dataclass
+class RecomputeJob:
+    """A pending recompute for one student, possibly from several triggers."""
+    student_id: str
+    trigger: ComputeTrigger
+    trigger_ids: List[str] = field(default_factory=list)
+    enqueued_at: float = field(default_factory=time.time)
+    deltas: List[Dict] = field(default_factory=list)
+    full: bool = True
+    # In-memory baseline from a snapshot confirm (not persisted)
+    snapshot: Optional[Dict] = None
+    context: Optional[Dict] = None
+    
+    def merge(
+        self,
+        trigger: ComputeTrigger,
+        trigger_id: Optional[str],
+        deltas: Optional[List[Dict]] = None,
+        snapshot: Optional[Dict] = None,
+        context: Optional[Dict] = None
+    ) -> None:
+        """Fold another trigger (and its deltas, if incremental) into this pending job."""
+        if snapshot is not None:
+            # The newest confirmed snapshot is the baseline
+            self.snapshot = snapshot
+            self.context = context
+        if TRIGGER_PRIORITY[trigger] > TRIGGER_PRIORITY[self.trigger]:
+            self.trigger = trigger
+        if trigger_id and trigger_id not in self.trigger_ids:
+            self.trigger_ids.append(trigger_id)
+        if deltas is None:
+            # A full recompute already covers every delta
+            self.full = True
+            self.deltas = []
+        elif not self.full:
+            self.deltas.extend(deltas)
+
+
+class SQLiteJobStore:
+    """
+    Persists pending jobs to a local SQLite file.
+    A job row exists from enqueue until its recompute finishes.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recompute_jobs ("
+                " student_id TEXT PRIMARY KEY,"
+                " trigger TEXT NOT NULL,"
+                " trigger_ids TEXT NOT NULL,"
+                " enqueued_at REAL NOT NULL,"
+                " deltas TEXT NOT NULL DEFAULT '[]',"
+                " full INTEGER NOT NULL DEFAULT 1)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(recompute_jobs)")}
+            # Files written before incremental jobs existed
+            if "deltas" not in columns:
+                conn.execute("ALTER TABLE recompute_jobs ADD COLUMN deltas TEXT NOT NULL DEFAULT '[]'")
+                conn.execute("ALTER TABLE recompute_jobs ADD COLUMN full INTEGER NOT NULL DEFAULT 1")
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+    
+    def save(self, job: RecomputeJob) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recompute_jobs VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    job.student_id,
+                    job.trigger.value,
+                    json.dumps(job.trigger_ids),
+                    job.enqueued_at,
+                    json.dumps(job.deltas),
+                    int(job.full)
+                )
+            )
+    
+    def delete(self, student_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM recompute_jobs WHERE student_id = ?", (student_id,))
+    
+    def load_all(self) -> List[RecomputeJob]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT student_id, trigger, trigger_ids, enqueued_at, deltas, full"
+                " FROM recompute_jobs ORDER BY enqueued_at"
+            ).fetchall()
+        return [
+            RecomputeJob(
+                student_id=row[0],
+                trigger=ComputeTrigger(row[1]),
+                trigger_ids=json.loads(row[2]),
+                enqueued_at=row[3],
+                deltas=json.loads(row[4]),
+                full=bool(row[5])
+            )
+            for row in rows
+        ]
+
+
+class RecomputeQueue:
+    """
+    In-process queue of per-student recompute jobs.
+    
+    enqueue() is cheap and safe to call from request handlers; the
+    recompute itself runs later on one of `workers` background tasks.
+    """
+    
+    def __init__(
+        self,
+        workers: int = 4,
+        debounce_seconds: float = 0.0,
+        store: Optional[SQLiteJobStore] = None,
+        recompute_fn: Callable[..., Awaitable] = recompute_for_student,
+        incremental_fn: Callable[..., Awaitable] = recompute_incremental
+    ):
+        self.workers = workers
+        self.debounce_seconds = debounce_seconds
+        self.store = store
+        self.recompute_fn = recompute_fn
+        self.incremental_fn = incremental_fn
+        self.db = None
+        
+        self._pending: "OrderedDict[str, RecomputeJob]" = OrderedDict()
+        self._running: Set[str] = set()
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        
+        self.stats_counters: Dict[str, float] = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "processed": 0,
+            "incremental": 0,
+            "failed": 0,
+            "total_lag_ms": 0,
+            "max_lag_ms": 0,
+        }
+    
+    # -------------------------------------------------------------------------
+    # Producer side
+    # -------------------------------------------------------------------------
+    
+    async def enqueue(
+        self,
+        student_id: str,
+        trigger: ComputeTrigger,
+        trigger_id: Optional[str] = None,
+        delta: Optional[Dict] = None,
+        deltas: Optional[List[Dict]] = None,
+        snapshot: Optional[Dict] = None,
+        context: Optional[Dict] = None
+    ) -> bool:
+        """
+        Queue a recompute for a student.
+        
+        Pass the manual entry delta (see manual_entry_delta), or a list
+        of them for a bulk write, to allow the incremental path; without
+        one the job is a full recompute. A snapshot confirm passes the
+        stored snapshot and the student's context for the recompute to use.
+        
+        Returns:
+            True if merged into an already pending job, False if new.
+        """
+        if delta is not None:
+            deltas = [delta]
+        
+        self.stats_counters["enqueued"] += 1
+        job = self._pending.get(student_id)
+        coalesced = job is not None
+        
+        if job:
+            job.merge(trigger, trigger_id, deltas, snapshot, context)
+            self.stats_counters["coalesced"] += 1
+        else:
+            job = RecomputeJob(
+                student_id=student_id,
+                trigger=trigger,
+                trigger_ids=[trigger_id] if trigger_id else [],
+                deltas=list(deltas) if deltas is not None else [],
+                full=deltas is None,
+                snapshot=snapshot,
+                context=context
+            )
+            self._pending[student_id] = job
+            self._schedule(student_id)
+        
+        if self.store:
+            await asyncio.to_thread(self.store.save, job)
+        
+        return coalesced
+    
+    def _schedule(self, student_id: str) -> None:
+        """Release a new job to the workers once its debounce window closes."""
+        if self.debounce_seconds <= 0:
+            self._release(student_id)
+            return
+        
+        loop = asyncio.get_running_loop()
+        self._timers[student_id] = loop.call_later(
+            self.debounce_seconds, self._release, student_id
+        )
+    
+    def _release(self, student_id: str) -> None:
+        self._timers.pop(student_id, None)
+        # A running student is re-queued when its current run finishes
+        if student_id in self._pending and student_id not in self._running:
+            self._ready.put_nowait(student_id)
+    
+    # -------------------------------------------------------------------------
+    # Worker side
+    # -------------------------------------------------------------------------
+    
+    async def start(self, db) -> None:
+        """Restore persisted jobs and start the worker tasks."""
+        self.db = db
+        
+        if self.store:
+            for job in await asyncio.to_thread(self.store.load_all):
+                if job.student_id not in self._pending:
+                    self._pending[job.student_id] = job
+                    self._ready.put_nowait(job.student_id)
+            if self._pending:
+                logger.info(f"Restored {len(self._pending)} pending recompute jobs")
+        
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"recompute-worker-{i}")
+            for i in range(self.workers)
+        ]
+    
+    async def stop(self) -> None:
+        """Stop workers. Pending persisted jobs are kept for the next start."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def join(self) -> None:
+        """Wait until every queued job, including debounced ones, has been processed."""
+        while True:
+            await self._ready.join()
+            if not self._timers:
+                return
+            await asyncio.sleep(self.debounce_seconds / 2)
+    
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            student_id = await self._ready.get()
+            try:
+                await self._run(student_id)
+            finally:
+                self._ready.task_done()
+    
+    async def _run(self, student_id: str) -> None:
+        job = self._pending.pop(student_id, None)
+        if job is None:
+            return
+        
+        self._running.add(student_id)
+        lag_ms = int((time.time() - job.enqueued_at) * 1000)
+        self.stats_counters["total_lag_ms"] += lag_ms
+        self.stats_counters["max_lag_ms"] = max(self.stats_counters["max_lag_ms"], lag_ms)
+        
+        last_trigger_id = job.trigger_ids[-1] if job.trigger_ids else None
+        
+        try:
+            if job.full:
+                baseline = {"snapshot": job.snapshot, "context": job.context} if job.snapshot else {}
+                await self.recompute_fn(
+                    self.db,
+                    student_id,
+                    job.trigger,
+                    last_trigger_id,
+                    trigger_ids=job.trigger_ids,
+                    **baseline
+                )
+            else:
+                await self.incremental_fn(
+                    self.db,
+                    student_id,
+                    job.deltas,
+                    last_trigger_id,
+                    trigger_ids=job.trigger_ids
+                )
+                self.stats_counters["incremental"] += 1
+            self.stats_counters["processed"] += 1
+        except Exception:
+            # The recompute function already logged the failure to engine_computation_log
+            self.stats_counters["failed"] += 1
+            logger.exception(f"Recompute failed for student {student_id}")
+        finally:
+            self._running.discard(student_id)
+            if student_id in self._pending:
+                # New triggers arrived while running - run again once released
+                if student_id not in self._timers:
+                    self._ready.put_nowait(student_id)
+            elif self.store:
+                await asyncio.to_thread(self.store.delete, student_id)
+    
+    # -------------------------------------------------------------------------
+    # Metrics
+    # -------------------------------------------------------------------------
+    
+    def stats(self) -> Dict:
+        """Queue depth, lag and throughput counters."""
+        now = time.time()
+        oldest = min((j.enqueued_at for j in self._pending.values()), default=None)
+        finished = self.stats_counters["processed"] + self.stats_counters["failed"]
+        
+        return {
+            "depth": len(self._pending),
+            "running": len(self._running),
+            "workers": len(self._tasks),
+            "debouncing": len(self._timers),
+            "debounce_seconds": self.debounce_seconds,
+            "oldest_pending_lag_ms": int((now - oldest) * 1000) if oldest else 0,
+            "avg_lag_ms": int(self.stats_counters["total_lag_ms"] / finished) if finished else 0,
+            "max_lag_ms": int(self.stats_counters["max_lag_ms"]),
+            "enqueued": int(self.stats_counters["enqueued"]),
+            "coalesced": int(self.stats_counters["coalesced"]),
+            "processed": int(self.stats_counters["processed"]),
+            "incremental": int(self.stats_counters["incremental"]),
+            "failed": int(self.stats_counters["failed"]),
+            "persistent": self.store is not None,
+        }
+
+
+_queue: Optional[RecomputeQueue] = None
+
+
+def get_recompute_queue() -> RecomputeQueue:
+    """Get the process-wide recompute queue, configured from settings."""
+    global _queue
+    
+    if _queue is None:
+        settings = get_settings()
+        store = SQLiteJobStore(settings.recompute_queue_path) if settings.recompute_queue_path else None
+        _queue = RecomputeQueue(
+            workers=settings.recompute_workers,
+            debounce_seconds=settings.recompute_debounce_seconds,
+            store=store
+        )
+    
+    return _queue
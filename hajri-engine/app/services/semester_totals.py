@@ -10,16 +10,21 @@ This uses:
 This can be run by admin whenever timetable or calendar changes.
 """
 
-from datetime import date, datetime
-from typing import Dict, List, Optional, Tuple
-from supabase import Client
+from datetime import date, timedelta
+import asyncio
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from supabase import AsyncClient
 import pendulum
 
 from app.config import get_settings
+from app.core.cache import TTLCache
+from app.core.response_cache import get_response_cache
+from app.services.read_models import drop_batch_read_models
 
 
 async def count_weekly_slots_per_subject(
-    db: Client,
+    db: AsyncClient,
     batch_id: str
 ) -> Dict[str, Dict]:
     """
@@ -37,7 +42,7 @@ async def count_weekly_slots_per_subject(
         }
     """
     # Get published timetable for this batch
-    version_result = db.table("timetable_versions") \
+    version_result = await db.table("timetable_versions") \
         .select("id") \
         .eq("batch_id", batch_id) \
         .eq("status", "published") \
@@ -51,7 +56,7 @@ async def count_weekly_slots_per_subject(
     version_id = version_result.data[0]["id"]
     
     # Get all events for this version
-    events_result = db.table("timetable_events") \
+    events_result = await db.table("timetable_events") \
         .select("*, course_offerings(*, subjects(*))") \
         .eq("version_id", version_id) \
         .execute()
@@ -88,7 +93,7 @@ async def count_weekly_slots_per_subject(
 
 
 async def get_teaching_period_for_semester(
-    db: Client,
+    db: AsyncClient,
     semester_id: str
 ) -> Optional[Dict]:
     """
@@ -98,7 +103,7 @@ async def get_teaching_period_for_semester(
         Dict with start_date, end_date, or None if not found.
     """
     # First try to get from semester table directly
-    semester_result = db.table("semesters") \
+    semester_result = await db.table("semesters") \
         .select("start_date, end_date") \
         .eq("id", semester_id) \
         .single() \
@@ -111,7 +116,7 @@ async def get_teaching_period_for_semester(
         }
     
     # Fallback: Get current teaching period
-    period_result = db.table("teaching_periods") \
+    period_result = await db.table("teaching_periods") \
         .select("start_date, end_date") \
         .order("start_date", desc=True) \
         .limit(1) \
@@ -124,7 +129,7 @@ async def get_teaching_period_for_semester(
 
 
 async def get_weekly_off_settings(
-    db: Client,
+    db: AsyncClient,
     academic_year_id: Optional[str],
     batch_id: Optional[str] = None
 ) -> Dict:
@@ -150,7 +155,7 @@ async def get_weekly_off_settings(
     
     # Get weekly off days from table
     try:
-        result = db.table("weekly_off_days") \
+        result = await db.table("weekly_off_days") \
             .select("day_of_week, is_off, saturday_pattern") \
             .eq("academic_year_id", academic_year_id) \
             .execute()
@@ -187,6 +192,153 @@ async def get_weekly_off_settings(
     return settings
 
 
+# =============================================================================
+# CALENDAR ENGINE
+# =============================================================================
+# Teaching days are counted per weekday with arithmetic instead of walking
+# the semester day by day per subject: a range of N days holds N // 7 of
+# every weekday, plus one more for the first N % 7 weekdays from the start.
+# Subtracting the non-teaching dates gives teaching days per weekday, and a
+# subject's total is its day_slots dotted with those counts.
+
+ONE_DAY = timedelta(days=1)
+ONE_WEEK = timedelta(weeks=1)
+
+
+def date_range(start_date: date, end_date: date) -> Iterator[date]:
+    """Yield every date from start_date to end_date inclusive."""
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += ONE_DAY
+
+
+def dates_on_weekday(start_date: date, end_date: date, weekday: int) -> List[date]:
+    """Every date with the given weekday (Mon=0 .. Sun=6) in the range."""
+    current = start_date + timedelta(days=(weekday - start_date.weekday()) % 7)
+    dates = []
+    while current <= end_date:
+        dates.append(current)
+        current += ONE_WEEK
+    return dates
+
+
+def weekday_counts(start_date: date, end_date: date) -> List[int]:
+    """
+    Count each weekday in [start_date, end_date] without iterating days.
+    
+    Returns:
+        List of 7 counts indexed by weekday (Mon=0 .. Sun=6).
+    """
+    days = (end_date - start_date).days + 1
+    if days <= 0:
+        return [0] * 7
+    
+    full_weeks, extra = divmod(days, 7)
+    counts = [full_weeks] * 7
+    first = start_date.weekday()
+    for offset in range(extra):
+        counts[(first + offset) % 7] += 1
+    
+    return counts
+
+
+def teaching_days_by_weekday(
+    start_date: date,
+    end_date: date,
+    non_teaching_dates: Iterable[date]
+) -> List[int]:
+    """
+    Teaching days per weekday: all days minus the (unique) non-teaching dates.
+    
+    Returns:
+        List of 7 counts indexed by weekday (Mon=0 .. Sun=6).
+    """
+    counts = weekday_counts(start_date, end_date)
+    for day in set(non_teaching_dates):
+        if start_date <= day <= end_date:
+            counts[day.weekday()] -= 1
+    return counts
+
+
+def count_subject_classes(
+    day_slots: Dict[int, int],
+    teaching_days: List[int]
+) -> Tuple[int, Dict[int, int]]:
+    """
+    Total classes for a subject: its slots per weekday dotted with
+    teaching days per weekday.
+    
+    Returns:
+        Tuple of (total_classes, teaching days for each weekday the subject meets)
+    """
+    days_by_week = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0}
+    total_classes = 0
+    
+    # DB timetable_events.day_of_week: Mon=0 .. Sun=6, same as Python weekday()
+    for weekday, slots in day_slots.items():
+        if weekday in days_by_week:
+            days_by_week[weekday] = teaching_days[weekday]
+            total_classes += slots * teaching_days[weekday]
+    
+    return total_classes, days_by_week
+
+
+# Remaining classes: a subject's cumulative class count for every date of
+# the semester (cumulative[i] = classes held from start_date through
+# start_date + i). It is stored with the semester totals, so "classes left
+# after date D" is total - cumulative[D - start] and always agrees with
+# total_classes_in_semester, holidays included.
+
+def teaching_weekdays(
+    start_date: date,
+    end_date: date,
+    non_teaching_dates: Iterable[date]
+) -> List[Optional[int]]:
+    """
+    Weekday of every date in the range, None for non-teaching dates.
+    Computed once per batch and shared by all its subjects.
+    """
+    non_teaching = set(non_teaching_dates)
+    return [
+        None if day in non_teaching else day.weekday()
+        for day in date_range(start_date, end_date)
+    ]
+
+
+def cumulative_classes(
+    day_slots: Dict[int, int],
+    weekdays: List[Optional[int]]
+) -> List[int]:
+    """
+    Running class count per date for a subject.
+    The last value equals count_subject_classes' total.
+    """
+    running = 0
+    cumulative = []
+    for weekday in weekdays:
+        if weekday is not None:
+            running += day_slots.get(weekday, 0)
+        cumulative.append(running)
+    return cumulative
+
+
+def remaining_classes_after(
+    cumulative: List[int],
+    start_date: date,
+    on_date: date
+) -> int:
+    """Classes scheduled after on_date - an O(1) lookup in the cumulative counts."""
+    if not cumulative:
+        return 0
+    index = (on_date - start_date).days
+    if index < 0:
+        return cumulative[-1]
+    if index >= len(cumulative):
+        return 0
+    return cumulative[-1] - cumulative[index]
+
+
 def is_saturday_off(check_date: date, pattern: str) -> bool:
     """
     Check if a specific Saturday is off based on the pattern.
@@ -207,22 +359,8 @@ def is_saturday_off(check_date: date, pattern: str) -> bool:
     elif pattern == 'none':
         return False
     else:
-        # Find which Saturday of the month this is
-        first_of_month = check_date.replace(day=1)
-        # Find first Saturday of month
-        days_until_saturday = (5 - first_of_month.weekday()) % 7
-        first_saturday = first_of_month + pendulum.duration(days=days_until_saturday)
-        
-        # Calculate which Saturday number (1st, 2nd, 3rd, etc.)
-        # Handle both date and pendulum.Date objects
-        if hasattr(first_saturday, 'date'):
-            first_saturday = first_saturday.date()
-        if hasattr(check_date, 'date') and callable(getattr(check_date, 'date')):
-            check_date_val = check_date.date() if not isinstance(check_date, date) else check_date
-        else:
-            check_date_val = check_date
-        days_diff = (check_date_val - first_saturday).days
-        saturday_num = (days_diff // 7) + 1
+        # Days 1-7 of a month hold its 1st Saturday, 8-14 the 2nd, and so on
+        saturday_num = (check_date.day - 1) // 7 + 1
         
         if pattern == '1st_3rd':
             return saturday_num in (1, 3)
@@ -236,169 +374,469 @@ def is_saturday_off(check_date: date, pattern: str) -> bool:
             return True  # Default: off
 
 
-async def get_non_teaching_dates(
-    db: Client,
+async def load_academic_years(db: AsyncClient) -> List[Dict]:
+    """
+    Load every academic year's date range (a handful of rows).
+    
+    Returns:
+        List of dicts with id, start_date and end_date (dates).
+    """
+    result = await db.table("academic_years") \
+        .select("id, start_date, end_date") \
+        .execute()
+    
+    return [
+        {
+            "id": row["id"],
+            "start_date": pendulum.parse(row["start_date"]).date(),
+            "end_date": pendulum.parse(row["end_date"]).date()
+        }
+        for row in result.data or []
+        if row.get("start_date") and row.get("end_date")
+    ]
+
+
+async def load_calendar_data(
+    db: AsyncClient,
+    academic_year_id: Optional[str],
     start_date: date,
     end_date: date,
     batch_id: Optional[str] = None
-) -> Tuple[List[date], Dict, Dict]:
+) -> Dict:
     """
-    Get all non-teaching dates in a range.
-    Uses weekly_off_settings, calendar_events, vacation_periods, exam_periods.
+    Load the academic calendar rows that decide non-teaching dates.
     
     Returns:
-        Tuple of (list of non-teaching dates, weekly_off_settings, breakdown_details)
-        breakdown_details contains categorized non-teaching days with names
+        Dict with academic_year_id, weekly_settings, holidays,
+        vacations and exams (raw rows).
     """
-    non_teaching = set()
-    breakdown = {
-        "sundays": [],
-        "saturdays": [],
+    calendar = {
+        "academic_year_id": academic_year_id,
+        "weekly_settings": None,
         "holidays": [],
         "vacations": [],
-        "exams": [],
-        "other_weekly_offs": []
+        "exams": []
     }
     
-    # Get academic year
-    year_result = db.table("academic_years") \
-        .select("id") \
-        .lte("start_date", start_date.isoformat()) \
-        .gte("end_date", end_date.isoformat()) \
-        .limit(1) \
-        .execute()
-    
-    academic_year_id = None
-    if year_result.data:
-        academic_year_id = year_result.data[0]["id"]
-    
     # Get weekly off settings (from DB or defaults)
-    weekly_settings = await get_weekly_off_settings(db, academic_year_id, batch_id)
-    
-    # Build weekly off days map from settings
-    weekly_off_days = {
-        6: weekly_settings.get("sunday_off", True),     # Python weekday 6 = Sunday
-        0: weekly_settings.get("monday_off", False),    # Python weekday 0 = Monday
-        1: weekly_settings.get("tuesday_off", False),
-        2: weekly_settings.get("wednesday_off", False),
-        3: weekly_settings.get("thursday_off", False),
-        4: weekly_settings.get("friday_off", False),
-    }
-    saturday_pattern = weekly_settings.get("saturday_pattern", "all")
-    
-    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    
-    # Iterate through all dates and apply weekly off logic
-    current = start_date
-    while current <= end_date:
-        py_weekday = current.weekday()  # Monday=0, ..., Saturday=5, Sunday=6
-        
-        # Sunday
-        if py_weekday == 6 and weekly_off_days.get(6, True):
-            non_teaching.add(current)
-            breakdown["sundays"].append(current.isoformat())
-        # Saturday using pattern
-        elif py_weekday == 5:
-            if is_saturday_off(current, saturday_pattern):
-                non_teaching.add(current)
-                breakdown["saturdays"].append(current.isoformat())
-        # Other weekdays
-        elif weekly_off_days.get(py_weekday, False):
-            non_teaching.add(current)
-            breakdown["other_weekly_offs"].append({
-                "date": current.isoformat(),
-                "day": day_names[py_weekday]
-            })
-        
-        current = pendulum.instance(datetime.combine(current, datetime.min.time())).add(days=1).date()
+    calendar["weekly_settings"] = await get_weekly_off_settings(db, academic_year_id, batch_id)
     
     if academic_year_id:
         # Get holidays with names (column is 'title' not 'name')
-        holidays = db.table("calendar_events") \
+        holidays = await db.table("calendar_events") \
             .select("event_date, end_date, title, event_type") \
             .eq("academic_year_id", academic_year_id) \
             .eq("is_non_teaching", True) \
             .gte("event_date", start_date.isoformat()) \
             .lte("event_date", end_date.isoformat()) \
             .execute()
-        
-        for h in holidays.data or []:
-            h_start = pendulum.parse(h["event_date"]).date()
-            h_end = pendulum.parse(h.get("end_date") or h["event_date"]).date()
-            holiday_name = h.get("title", "Holiday")
-            
-            # Add to breakdown (once per event, not per day)
-            breakdown["holidays"].append({
-                "name": holiday_name,
-                "start_date": h_start.isoformat(),
-                "end_date": h_end.isoformat() if h_end != h_start else None,
-                "type": h.get("event_type", "holiday")
-            })
-            
-            current = h_start
-            while current <= h_end and current <= end_date:
-                non_teaching.add(current)
-                current = pendulum.instance(datetime.combine(current, datetime.min.time())).add(days=1).date()
+        calendar["holidays"] = holidays.data or []
         
         # Get vacation periods with names
-        vacations = db.table("vacation_periods") \
+        vacations = await db.table("vacation_periods") \
             .select("start_date, end_date, name") \
             .eq("academic_year_id", academic_year_id) \
             .execute()
-        
-        for v in vacations.data or []:
-            v_start = max(pendulum.parse(v["start_date"]).date(), start_date)
-            v_end = min(pendulum.parse(v["end_date"]).date(), end_date)
-            
-            if v_start <= v_end:  # Only include if overlaps with semester
-                breakdown["vacations"].append({
-                    "name": v.get("name", "Vacation"),
-                    "start_date": v_start.isoformat(),
-                    "end_date": v_end.isoformat(),
-                    "days": (v_end - v_start).days + 1
-                })
-                
-                current = v_start
-                while current <= v_end:
-                    non_teaching.add(current)
-                    current = pendulum.instance(datetime.combine(current, datetime.min.time())).add(days=1).date()
+        calendar["vacations"] = vacations.data or []
         
         # Get exam periods with names
-        exams = db.table("exam_periods") \
+        exams = await db.table("exam_periods") \
             .select("start_date, end_date, name, exam_type") \
             .eq("academic_year_id", academic_year_id) \
             .execute()
+        calendar["exams"] = exams.data or []
+    
+    return calendar
+
+
+def compute_non_teaching_dates(
+    start_date: date,
+    end_date: date,
+    calendar: Dict
+) -> Tuple[List[date], Dict]:
+    """
+    Compute non-teaching dates from loaded calendar data.
+    Pure function - see load_calendar_data.
+    
+    Returns:
+        Tuple of (sorted non-teaching dates, breakdown_details)
+    """
+    non_teaching = set()
+    breakdown = {
+        "sundays": [],
+        "saturdays": [],
+        "holidays": [],
+        "vacations": [],
+        "exams": [],
+        "other_weekly_offs": []
+    }
+    
+    weekly_settings = calendar["weekly_settings"]
+    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    weekday_keys = ["monday_off", "tuesday_off", "wednesday_off", "thursday_off", "friday_off"]
+    
+    # Weekly offs: jump straight to each matching weekday
+    if weekly_settings.get("sunday_off", True):
+        sundays = dates_on_weekday(start_date, end_date, 6)
+        non_teaching.update(sundays)
+        breakdown["sundays"] = [d.isoformat() for d in sundays]
+    
+    saturday_pattern = weekly_settings.get("saturday_pattern", "all")
+    saturdays = [
+        d for d in dates_on_weekday(start_date, end_date, 5)
+        if is_saturday_off(d, saturday_pattern)
+    ]
+    non_teaching.update(saturdays)
+    breakdown["saturdays"] = [d.isoformat() for d in saturdays]
+    
+    other_offs = []
+    for py_weekday, key in enumerate(weekday_keys):
+        if weekly_settings.get(key, False):
+            other_offs.extend(dates_on_weekday(start_date, end_date, py_weekday))
+    non_teaching.update(other_offs)
+    breakdown["other_weekly_offs"] = [
+        {"date": d.isoformat(), "day": day_names[d.weekday()]}
+        for d in sorted(other_offs)
+    ]
+    
+    for h in calendar["holidays"]:
+        h_start = pendulum.parse(h["event_date"]).date()
+        h_end = pendulum.parse(h.get("end_date") or h["event_date"]).date()
         
-        for e in exams.data or []:
-            e_start = max(pendulum.parse(e["start_date"]).date(), start_date)
-            e_end = min(pendulum.parse(e["end_date"]).date(), end_date)
-            
-            if e_start <= e_end:  # Only include if overlaps with semester
-                breakdown["exams"].append({
-                    "name": e.get("name", "Exams"),
-                    "type": e.get("exam_type", "exam"),
-                    "start_date": e_start.isoformat(),
-                    "end_date": e_end.isoformat(),
-                    "days": (e_end - e_start).days + 1
-                })
-                
-                current = e_start
-                while current <= e_end:
-                    non_teaching.add(current)
-                    current = pendulum.instance(datetime.combine(current, datetime.min.time())).add(days=1).date()
+        # Add to breakdown (once per event, not per day)
+        breakdown["holidays"].append({
+            "name": h.get("title", "Holiday"),
+            "start_date": h_start.isoformat(),
+            "end_date": h_end.isoformat() if h_end != h_start else None,
+            "type": h.get("event_type", "holiday")
+        })
+        
+        non_teaching.update(date_range(h_start, min(h_end, end_date)))
+    
+    for v in calendar["vacations"]:
+        v_start = max(pendulum.parse(v["start_date"]).date(), start_date)
+        v_end = min(pendulum.parse(v["end_date"]).date(), end_date)
+        
+        if v_start <= v_end:  # Only include if overlaps with semester
+            breakdown["vacations"].append({
+                "name": v.get("name", "Vacation"),
+                "start_date": v_start.isoformat(),
+                "end_date": v_end.isoformat(),
+                "days": (v_end - v_start).days + 1
+            })
+            non_teaching.update(date_range(v_start, v_end))
+    
+    for e in calendar["exams"]:
+        e_start = max(pendulum.parse(e["start_date"]).date(), start_date)
+        e_end = min(pendulum.parse(e["end_date"]).date(), end_date)
+        
+        if e_start <= e_end:  # Only include if overlaps with semester
+            breakdown["exams"].append({
+                "name": e.get("name", "Exams"),
+                "type": e.get("exam_type", "exam"),
+                "start_date": e_start.isoformat(),
+                "end_date": e_end.isoformat(),
+                "days": (e_end - e_start).days + 1
+            })
+            non_teaching.update(date_range(e_start, e_end))
+    
+    return sorted(non_teaching), breakdown
+
+
+async def get_non_teaching_dates(
+    db: AsyncClient,
+    start_date: date,
+    end_date: date,
+    batch_id: Optional[str] = None
+) -> Tuple[List[date], Dict, Dict]:
+    """
+    Get all non-teaching dates in a range.
+    Uses weekly_off_settings, calendar_events, vacation_periods, exam_periods,
+    read through the process-wide teaching calendar index.
     
-    return sorted(list(non_teaching)), weekly_settings, breakdown
+    Returns:
+        Tuple of (list of non-teaching dates, weekly_off_settings, breakdown_details)
+        breakdown_details contains categorized non-teaching days with names
+    """
+    return await get_teaching_calendar_index().non_teaching_dates(db, start_date, end_date)
+
+
+# =============================================================================
+# TEACHING CALENDAR INDEX
+# =============================================================================
+# Non-teaching dates only depend on the academic year (weekly offs,
+# holidays, vacations, exams), so each year's calendar is loaded and
+# computed once and kept in memory: "is D a teaching day" is a set lookup,
+# and any date range inside the year is sliced from it without a query.
+# Calendar edits are made outside the engine; they are picked up when the
+# TTL expires, when a semester totals run refreshes the index, or via
+# POST /engine/admin/teaching-calendar/invalidate.
+
+class TeachingCalendar:
+    """Every non-teaching date of one academic year."""
+    
+    def __init__(self, academic_year_id: str, start_date: date, end_date: date, calendar: Dict):
+        self.academic_year_id = academic_year_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.calendar = calendar  # raw rows, see load_calendar_data
+        non_teaching, _ = compute_non_teaching_dates(start_date, end_date, calendar)
+        self.non_teaching = frozenset(non_teaching)
+        self._ranges: Dict[Tuple[date, date], Tuple[List[date], Dict, Dict]] = {}
+    
+    def covers(self, start_date: date, end_date: date) -> bool:
+        return self.start_date <= start_date and end_date <= self.end_date
+    
+    def is_teaching_day(self, day: date) -> bool:
+        return day not in self.non_teaching
+    
+    def for_range(self, start_date: date, end_date: date) -> Tuple[List[date], Dict, Dict]:
+        """
+        get_non_teaching_dates for a range inside the year, from memory.
+        
+        Returns:
+            Tuple of (sorted non-teaching dates, weekly_off_settings, breakdown_details)
+        """
+        key = (start_date, end_date)
+        if key not in self._ranges:
+            # Same holidays as a load_calendar_data call for just this range
+            calendar = dict(self.calendar, holidays=[
+                h for h in self.calendar["holidays"]
+                if start_date <= pendulum.parse(h["event_date"]).date() <= end_date
+            ])
+            non_teaching, breakdown = compute_non_teaching_dates(start_date, end_date, calendar)
+            self._ranges[key] = (non_teaching, calendar["weekly_settings"], breakdown)
+        return self._ranges[key]
+
+
+class TeachingCalendarIndex:
+    """
+    Teaching calendars keyed by academic year, shared by manual-entry
+    validation, remaining-class projection and semester totals.
+    
+    A per-run index can publish what it loads to the shared one
+    (publish_to), replacing stale years there without clearing it.
+    """
+    
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        publish_to: Optional["TeachingCalendarIndex"] = None
+    ):
+        self.academic_years = TTLCache(ttl_seconds)
+        self.calendars = TTLCache(ttl_seconds)
+        self.publish_to = publish_to
+    
+    async def get(
+        self,
+        db: AsyncClient,
+        start_date: date,
+        end_date: Optional[date] = None
+    ) -> Optional[TeachingCalendar]:
+        """
+        The calendar of the academic year containing the whole range.
+        
+        Returns:
+            TeachingCalendar, or None if no academic year covers the range.
+        """
+        end_date = end_date or start_date
+        
+        async def load_years() -> List[Dict]:
+            years = await load_academic_years(db)
+            if self.publish_to is not None:
+                self.publish_to.academic_years.set("all", years)
+            return years
+        
+        years = await self.academic_years.get_or_load("all", load_years)
+        year = next(
+            (y for y in years if y["start_date"] <= start_date and end_date <= y["end_date"]),
+            None
+        )
+        if year is None:
+            return None
+        
+        async def load() -> TeachingCalendar:
+            calendar = await load_calendar_data(db, year["id"], year["start_date"], year["end_date"])
+            teaching = TeachingCalendar(year["id"], year["start_date"], year["end_date"], calendar)
+            if self.publish_to is not None:
+                self.publish_to.calendars.set(year["id"], teaching)
+            return teaching
+        
+        return await self.calendars.get_or_load(year["id"], load)
+    
+    async def non_teaching_dates(
+        self,
+        db: AsyncClient,
+        start_date: date,
+        end_date: date
+    ) -> Tuple[List[date], Dict, Dict]:
+        """Cached get_non_teaching_dates."""
+        calendar = await self.get(db, start_date, end_date)
+        if calendar is not None:
+            return calendar.for_range(start_date, end_date)
+        
+        # No academic year: default weekly offs only (no queries)
+        defaults = await load_calendar_data(db, None, start_date, end_date)
+        non_teaching, breakdown = compute_non_teaching_dates(start_date, end_date, defaults)
+        return non_teaching, defaults["weekly_settings"], breakdown
+    
+    async def is_teaching_day(self, db: AsyncClient, day: date) -> bool:
+        calendar = await self.get(db, day)
+        if calendar is not None:
+            return calendar.is_teaching_day(day)
+        non_teaching, _, _ = await self.non_teaching_dates(db, day, day)
+        return day not in non_teaching
+    
+    async def non_teaching_days(self, db: AsyncClient, days: Iterable[date]) -> Set[date]:
+        """
+        The days that aren't teaching days, each checked against its own
+        academic year's calendar, so dates on both sides of a year
+        boundary get holidays and exams checked too.
+        """
+        return {day for day in set(days) if not await self.is_teaching_day(db, day)}
+    
+    def invalidate(self, academic_year_id: Optional[str] = None) -> None:
+        """Drop one year's calendar, or every calendar with no id."""
+        self.academic_years.clear()
+        if academic_year_id is None:
+            self.calendars.clear()
+        else:
+            self.calendars.invalidate(academic_year_id)
+    
+    def clear(self) -> None:
+        self.invalidate()
+    
+    def stats(self) -> Dict:
+        return {
+            "academic_years": self.academic_years.stats(),
+            "calendars": self.calendars.stats()
+        }
+
+
+_teaching_calendars: Optional[TeachingCalendarIndex] = None
+
+
+def get_teaching_calendar_index() -> TeachingCalendarIndex:
+    """Process-wide teaching calendar index, timed from settings."""
+    global _teaching_calendars
+    
+    if _teaching_calendars is None:
+        _teaching_calendars = TeachingCalendarIndex(
+            ttl_seconds=get_settings().teaching_calendar_ttl_seconds
+        )
+    return _teaching_calendars
+
+
+def invalidate_teaching_calendars(academic_year_id: Optional[str] = None) -> None:
+    """Drop cached calendars after calendar rows change outside the engine."""
+    get_teaching_calendar_index().invalidate(academic_year_id)
+
+
+async def is_teaching_day(db: AsyncClient, day: date) -> bool:
+    """Whether classes are held on day - no query once its year is indexed."""
+    return await get_teaching_calendar_index().is_teaching_day(db, day)
+
+
+async def non_teaching_days(db: AsyncClient, days: Iterable[date]) -> Set[date]:
+    """The non-teaching days among days - one calendar load per academic year."""
+    return await get_teaching_calendar_index().non_teaching_days(db, days)
+
+
+class CalendarCache:
+    """
+    Calendar lookups shared by every batch of a semester totals run.
+    
+    Teaching periods are loaded once per semester; non-teaching dates come
+    from a teaching calendar index, computed once per academic year. Without
+    a TTL the cache lives for one run; with one it can be kept process-wide.
+    """
+    
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        index: Optional[TeachingCalendarIndex] = None
+    ):
+        self.periods = TTLCache(ttl_seconds)
+        self.index = index or TeachingCalendarIndex(ttl_seconds)
+    
+    async def get_teaching_period(self, db: AsyncClient, semester_id: str) -> Optional[Dict]:
+        return await self.periods.get_or_load(
+            semester_id,
+            lambda: get_teaching_period_for_semester(db, semester_id)
+        )
+    
+    async def get_non_teaching_dates(
+        self,
+        db: AsyncClient,
+        start_date: date,
+        end_date: date,
+        batch_id: Optional[str] = None
+    ) -> Tuple[List[date], Dict, Dict]:
+        """Cached get_non_teaching_dates."""
+        return await self.index.non_teaching_dates(db, start_date, end_date)
+    
+    def clear(self) -> None:
+        self.periods.clear()
+        self.index.clear()
+    
+    def stats(self) -> Dict:
+        parts = {
+            "teaching_periods": self.periods.stats(),
+            **self.index.stats()
+        }
+        return {
+            "hits": sum(p["hits"] for p in parts.values()),
+            "misses": sum(p["misses"] for p in parts.values()),
+            **parts
+        }
+
+
+_calendar_cache: Optional[CalendarCache] = None
+
+
+def new_run_calendar_cache() -> CalendarCache:
+    """
+    A cache for one run: fresh teaching periods and its own calendar
+    index, publishing the years it loads to the process-wide index.
+    Its stats count only this run's lookups.
+    """
+    return CalendarCache(index=TeachingCalendarIndex(publish_to=get_teaching_calendar_index()))
+
+
+def get_calendar_cache() -> CalendarCache:
+    """
+    Cache for a semester totals run.
+    
+    Unless calendar_cache_ttl_seconds is set, every run gets its own
+    teaching periods and calendar index, read fresh (totals are
+    recalculated after calendar changes), and publishes the years it
+    loads to the process-wide index. Other runs and manual-entry
+    validation keep their cached years meanwhile. With a TTL, one cache
+    on the process-wide index is shared by every run until entries expire.
+    """
+    global _calendar_cache
+    
+    ttl = get_settings().calendar_cache_ttl_seconds
+    if not ttl:
+        return new_run_calendar_cache()
+    
+    if _calendar_cache is None:
+        _calendar_cache = CalendarCache(ttl_seconds=ttl, index=get_teaching_calendar_index())
+    return _calendar_cache
 
 
 async def calculate_semester_totals(
-    db: Client,
+    db: AsyncClient,
     batch_id: str,
-    semester_id: str
+    semester_id: str,
+    calendar_cache: Optional[CalendarCache] = None
 ) -> Dict[str, Dict]:
     """
     Calculate total lectures/labs for each subject in the entire semester.
     
     This is the PRE-PROCESS 1 that admin should run.
+    Pass one calendar_cache to every batch of a bulk run to share the
+    semester period and non-teaching date lookups.
     
     Returns:
         Dict keyed by subject_id with values:
@@ -411,6 +849,8 @@ async def calculate_semester_totals(
             'total_weeks': int,
             'non_teaching_days': int,
             'total_classes_in_semester': int,
+            'cumulative_start': str,
+            'cumulative_classes': [int, ...],  # running total per date
             'calculation_details': {...}
         }
     """
@@ -420,8 +860,11 @@ async def calculate_semester_totals(
     if not weekly_slots:
         return {}
     
+    if calendar_cache is None:
+        calendar_cache = CalendarCache()
+    
     # Step 2: Get semester dates
-    period = await get_teaching_period_for_semester(db, semester_id)
+    period = await calendar_cache.get_teaching_period(db, semester_id)
     
     if not period:
         # Fallback defaults
@@ -435,32 +878,18 @@ async def calculate_semester_totals(
     end_date = pendulum.parse(period["end_date"]).date()
     
     # Step 3: Get non-teaching dates (now includes weekly off settings and breakdown)
-    non_teaching_dates, weekly_settings, non_teaching_breakdown = await get_non_teaching_dates(db, start_date, end_date, batch_id)
-    non_teaching_set = set(non_teaching_dates)
+    non_teaching_dates, weekly_settings, non_teaching_breakdown = await calendar_cache.get_non_teaching_dates(db, start_date, end_date, batch_id)
     
-    # Step 4: For each subject, count actual teaching slots
+    # Step 4: Teaching days per weekday (and per date), once for the whole batch
+    teaching_days = teaching_days_by_weekday(start_date, end_date, non_teaching_dates)
+    weekdays = teaching_weekdays(start_date, end_date, non_teaching_dates)
+    
+    # Step 5: Each subject's total is a dot product over the 7 weekdays
     results = {}
     
     for subject_id, slots_info in weekly_slots.items():
         day_slots = slots_info["day_slots"]  # {day_of_week: count}
-        
-        total_classes = 0
-        days_by_week = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0}  # Actual teaching days per weekday
-        
-        # Iterate through all dates in semester
-        current = start_date
-        while current <= end_date:
-            if current not in non_teaching_set:
-                # Python weekday(): Mon=0, Tue=1, ..., Sat=5, Sun=6
-                # DB timetable_events.day_of_week: Mon=0, Tue=1, ..., Sat=5, Sun=6 (same!)
-                py_weekday = current.weekday()
-                
-                # Check if this subject has classes on this day
-                if py_weekday in day_slots:
-                    total_classes += day_slots[py_weekday]
-                    days_by_week[py_weekday] += 1
-            
-            current = pendulum.instance(datetime.combine(current, datetime.min.time())).add(days=1).date()
+        total_classes, days_by_week = count_subject_classes(day_slots, teaching_days)
         
         total_days = (end_date - start_date).days + 1
         total_weeks = total_days // 7
@@ -477,6 +906,8 @@ async def calculate_semester_totals(
             "total_days": total_days,
             "non_teaching_days": len(non_teaching_dates),
             "total_classes_in_semester": total_classes,
+            "cumulative_start": start_date.isoformat(),
+            "cumulative_classes": cumulative_classes(day_slots, weekdays),
             "calculation_details": {
                 "semester_start": start_date.isoformat(),
                 "semester_end": end_date.isoformat(),
@@ -499,41 +930,234 @@ async def calculate_semester_totals(
     return results
 
 
+def semester_total_rows(
+    batch_id: str,
+    semester_id: str,
+    totals: Dict[str, Dict],
+    calculated_at: str
+) -> List[Dict]:
+    """Build semester_subject_totals rows for one batch's calculated totals."""
+    # Note: teaching_weeks is stored in calculation_details JSONB, not a separate column
+    return [
+        {
+            "batch_id": batch_id,
+            "semester_id": semester_id,
+            "subject_id": subject_id,
+            "class_type": data["class_type"],
+            "slots_per_week": data["slots_per_week"],
+            "total_classes_in_semester": data["total_classes_in_semester"],
+            "cumulative_start": data.get("cumulative_start"),
+            "cumulative_classes": data.get("cumulative_classes"),
+            "calculation_details": data["calculation_details"],
+            "calculated_at": calculated_at
+        }
+        for subject_id, data in totals.items()
+    ]
+
+
+async def upsert_semester_total_rows(
+    db: AsyncClient,
+    rows: List[Dict],
+    chunk_size: Optional[int] = None
+) -> List[Dict]:
+    """
+    Upsert semester_subject_totals rows for any number of batches,
+    chunk_size rows per request.
+    
+    If a chunk is rejected, its rows are retried one by one so a single
+    bad row doesn't fail the rest.
+    
+    Returns:
+        One outcome per row, in order: batch_id, semester_id, subject_id,
+        status ("upserted" or "failed"), id and error.
+    """
+    chunk_size = chunk_size or get_settings().semester_totals_upsert_chunk
+    outcomes = []
+    
+    async def upsert(chunk: List[Dict]) -> Dict[Tuple, str]:
+        result = await db.table("semester_subject_totals") \
+            .upsert(chunk, on_conflict="batch_id,semester_id,subject_id") \
+            .execute()
+        return {
+            (r.get("batch_id"), r.get("semester_id"), r.get("subject_id")): r.get("id")
+            for r in result.data or []
+        }
+    
+    def outcome(row: Dict, ids: Dict[Tuple, str], error: Optional[str] = None) -> Dict:
+        key = (row["batch_id"], row["semester_id"], row["subject_id"])
+        return {
+            "batch_id": row["batch_id"],
+            "semester_id": row["semester_id"],
+            "subject_id": row["subject_id"],
+            "status": "failed" if error else "upserted",
+            "id": ids.get(key),
+            "error": error
+        }
+    
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        try:
+            ids = await upsert(chunk)
+            outcomes.extend(outcome(row, ids) for row in chunk)
+        except Exception:
+            for row in chunk:
+                try:
+                    outcomes.append(outcome(row, await upsert([row])))
+                except Exception as e:
+                    outcomes.append(outcome(row, {}, str(e)))
+    
+    # Cached predictions and read models depend on these totals
+    upserted = {(o["batch_id"], o["semester_id"]) for o in outcomes if o["status"] == "upserted"}
+    for batch_id, semester_id in upserted:
+        await drop_batch_read_models(db, batch_id, semester_id)
+    for batch_id in {batch_id for batch_id, _ in upserted}:
+        await get_response_cache().invalidate_batch(batch_id)
+    
+    return outcomes
+
+
+async def calculate_semester_totals_many(
+    db: AsyncClient,
+    targets: List[Tuple[str, str]],
+    concurrency: Optional[int] = None,
+    calendar_cache: Optional[CalendarCache] = None
+) -> List[Dict]:
+    """
+    Calculate semester totals for many (batch_id, semester_id) pairs at once.
+    
+    Batches run concurrently, at most `concurrency` in flight, and share
+    one calendar cache. Nothing is persisted - see upsert_semester_total_rows.
+    
+    Returns:
+        One dict per target, in order: batch_id, semester_id, totals
+        (None on failure), error and duration_ms.
+    """
+    concurrency = concurrency or get_settings().semester_totals_concurrency
+    calendar_cache = calendar_cache or CalendarCache()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run(batch_id: str, semester_id: str) -> Dict:
+        async with semaphore:
+            started = time.perf_counter()
+            outcome = {
+                "batch_id": batch_id,
+                "semester_id": semester_id,
+                "totals": None,
+                "error": None
+            }
+            try:
+                outcome["totals"] = await calculate_semester_totals(
+                    db, batch_id, semester_id, calendar_cache
+                )
+            except Exception as e:
+                outcome["error"] = str(e)
+            outcome["duration_ms"] = int((time.perf_counter() - started) * 1000)
+            return outcome
+    
+    return await asyncio.gather(*[run(b, s) for b, s in targets])
+
+
 async def persist_semester_totals(
-    db: Client,
+    db: AsyncClient,
     batch_id: str,
     semester_id: str,
     totals: Dict[str, Dict]
-) -> int:
+) -> List[Dict]:
     """
     Save calculated semester totals to database.
-    Creates/updates semester_subject_totals table.
+    Creates/updates semester_subject_totals rows with one multi-row
+    upsert (chunked for large payloads).
     
     Returns:
-        Number of records upserted.
+        Per-row outcomes, see upsert_semester_total_rows.
     """
-    count = 0
+    rows = semester_total_rows(batch_id, semester_id, totals, pendulum.now("UTC").isoformat())
+    return await upsert_semester_total_rows(db, rows)
+
+
+async def load_totals_index(
+    db: AsyncClient,
+    batch_id: str,
+    semester_id: str
+) -> Dict[str, Dict]:
+    """
+    Load every subject's precomputed totals for a batch/semester in one query.
     
-    for subject_id, data in totals.items():
-        # Note: teaching_weeks is stored in calculation_details JSONB, not a separate column
-        db.table("semester_subject_totals").upsert({
-            "batch_id": batch_id,
-            "semester_id": semester_id,
-            "subject_id": subject_id,
-            "class_type": data["class_type"],
-            "slots_per_week": data["slots_per_week"],
-            "total_classes_in_semester": data["total_classes_in_semester"],
-            "calculation_details": data["calculation_details"],
-            "calculated_at": pendulum.now("UTC").isoformat()
-        }, on_conflict="batch_id,semester_id,subject_id").execute()
-        
-        count += 1
+    Returns:
+        Dict keyed by subject_id with total, start (date or None) and
+        cumulative (list, empty for rows calculated before it existed).
+    """
+    result = await db.table("semester_subject_totals") \
+        .select("subject_id, total_classes_in_semester, cumulative_start, cumulative_classes") \
+        .eq("batch_id", batch_id) \
+        .eq("semester_id", semester_id) \
+        .execute()
+    
+    index = {}
+    for row in result.data or []:
+        has_cumulative = bool(row.get("cumulative_start") and row.get("cumulative_classes"))
+        index[row["subject_id"]] = {
+            "total": row["total_classes_in_semester"],
+            "start": pendulum.parse(row["cumulative_start"]).date() if has_cumulative else None,
+            "cumulative": row["cumulative_classes"] if has_cumulative else []
+        }
+    return index
+
+
+def remaining_from_index(entry: Optional[Dict], on_date: date) -> Optional[int]:
+    """
+    Remaining classes after on_date from a load_totals_index entry.
+    
+    Returns:
+        The count, or None if the subject has no cumulative counts yet.
+    """
+    if not entry or not entry["cumulative"]:
+        return None
+    return remaining_classes_after(entry["cumulative"], entry["start"], on_date)
+
+
+async def project_totals_index(
+    db: AsyncClient,
+    batch_id: str,
+    semester_id: str,
+    subject_ids: Iterable[str]
+) -> Dict[str, Dict]:
+    """
+    Totals index entries for subjects whose semester totals haven't been
+    calculated yet, projected from the published timetable and the
+    teaching calendar index. Nothing is persisted.
     
-    return count
+    Returns:
+        Dict keyed by subject_id, same shape as load_totals_index.
+        Subjects without timetable slots are left out.
+    """
+    weekly_slots = await count_weekly_slots_per_subject(db, batch_id)
+    wanted = {s: weekly_slots[s] for s in subject_ids if s in weekly_slots}
+    if not wanted:
+        return {}
+    
+    period = await get_teaching_period_for_semester(db, semester_id)
+    if not period:
+        return {}
+    
+    start_date = pendulum.parse(period["start_date"]).date()
+    end_date = pendulum.parse(period["end_date"]).date()
+    non_teaching, _, _ = await get_non_teaching_dates(db, start_date, end_date)
+    weekdays = teaching_weekdays(start_date, end_date, non_teaching)
+    
+    index = {}
+    for subject_id, slots_info in wanted.items():
+        cumulative = cumulative_classes(slots_info["day_slots"], weekdays)
+        index[subject_id] = {
+            "total": cumulative[-1] if cumulative else 0,
+            "start": start_date,
+            "cumulative": cumulative
+        }
+    return index
 
 
 async def get_semester_total_for_subject(
-    db: Client,
+    db: AsyncClient,
     batch_id: str,
     semester_id: str,
     subject_id: str
@@ -542,7 +1166,7 @@ async def get_semester_total_for_subject(
     Get precomputed total classes for a subject in a semester.
     Falls back to estimation if not precomputed.
     """
-    result = db.table("semester_subject_totals") \
+    result = await db.table("semester_subject_totals") \
         .select("total_classes_in_semester") \
         .eq("batch_id", batch_id) \
         .eq("semester_id", semester_id) \
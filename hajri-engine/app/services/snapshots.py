@@ -5,15 +5,23 @@ Handles OCR snapshot confirmation and subject matching.
 
 from datetime import datetime
 from typing import List, Dict, Tuple, Optional
-from supabase import Client
+import logging
+from supabase import AsyncClient
 import pendulum
 
+from app.config import get_settings
+from app.core.cache import TTLCache
+from app.core.database import is_missing_column
+from app.core.pagination import encode_cursor, keyset_filter
 from app.models.schemas import OCREntry, SnapshotConfirmRequest
 from app.core.exceptions import SubjectNotFoundError, SnapshotDecreaseWarning
 
 
+logger = logging.getLogger("hajri-engine.snapshots")
+
+
 async def get_latest_snapshot(
-    db: Client,
+    db: AsyncClient,
     student_id: str,
     batch_id: str
 ) -> Optional[Dict]:
@@ -23,7 +31,7 @@ async def get_latest_snapshot(
     Returns:
         Snapshot dict or None if no snapshot exists.
     """
-    result = db.table("ocr_snapshots") \
+    result = await db.table("ocr_snapshots") \
         .select("*") \
         .eq("student_id", student_id) \
         .eq("batch_id", batch_id) \
@@ -36,75 +44,181 @@ async def get_latest_snapshot(
     return None
 
 
-async def match_ocr_code_to_subject(
-    db: Client,
-    ocr_code: str,
-    batch_id: str,
-    semester_id: str
-) -> Optional[str]:
+async def get_latest_snapshot_version(
+    db: AsyncClient,
+    student_id: str,
+    batch_id: str
+) -> Optional[Dict]:
     """
-    Match an OCR-extracted subject code to a subject ID.
+    Get just the id and confirmed_at of the latest snapshot.
+    Cheap check for conditional GETs - skips the entries payload.
+    """
+    result = await db.table("ocr_snapshots") \
+        .select("id, confirmed_at") \
+        .eq("student_id", student_id) \
+        .eq("batch_id", batch_id) \
+        .order("confirmed_at", desc=True) \
+        .limit(1) \
+        .execute()
+    
+    if result.data:
+        return result.data[0]
+    return None
+
+
+# =============================================================================
+# SUBJECT CODE INDEX
+# =============================================================================
+# OCR codes resolve to subjects through explicit subject_code_mappings,
+# then an exact subjects.code match, then a case-insensitive one. All three
+# come from one in-memory index per (batch, semester), loaded with two
+# queries and cached, so matching a snapshot costs no round trips.
+# Mappings and subjects are edited outside the engine: entries expire
+# after subject_code_index_ttl_seconds, snapshot confirmation reloads once
+# when a code doesn't match, and POST /engine/admin/subject-codes/invalidate
+# drops them right away.
+
+_subject_codes: Optional[TTLCache] = None
+
+
+def get_subject_code_cache() -> TTLCache:
+    """Process-wide subject code index cache, timed from settings."""
+    global _subject_codes
+    
+    if _subject_codes is None:
+        settings = get_settings()
+        _subject_codes = TTLCache(
+            ttl_seconds=settings.subject_code_index_ttl_seconds,
+            maxsize=settings.subject_code_index_cache_size
+        )
+    return _subject_codes
+
+
+def normalize_code(code: str) -> str:
+    """Case-folded, trimmed code for the case-insensitive match."""
+    return (code or "").strip().casefold()
+
+
+def build_subject_code_index(mappings: List[Dict], subjects: List[Dict]) -> Dict[str, Dict[str, str]]:
+    """
+    Build the lookup tables match_subject_code uses. Pure function.
+    The first row wins when several share a code.
     
-    First checks subject_code_mappings table, then tries direct match.
+    Returns:
+        Dict with mappings (ocr_code -> subject_id), exact (code -> id)
+        and normalized (folded code -> id).
+    """
+    index = {"mappings": {}, "exact": {}, "normalized": {}}
+    for row in mappings:
+        index["mappings"].setdefault(row["ocr_code"], row["subject_id"])
+    for subject in subjects:
+        code = subject.get("code")
+        if code:
+            index["exact"].setdefault(code, subject["id"])
+            index["normalized"].setdefault(normalize_code(code), subject["id"])
+    return index
+
+
+def match_subject_code(index: Dict[str, Dict[str, str]], ocr_code: str) -> Optional[str]:
+    """
+    Match an OCR-extracted code: explicit mapping, exact code, then
+    case-insensitive code.
     
     Returns:
         Subject ID or None if no match found.
     """
-    # Try explicit mapping first
-    mapping_result = db.table("subject_code_mappings") \
-        .select("subject_id") \
-        .eq("ocr_code", ocr_code) \
+    return (
+        index["mappings"].get(ocr_code)
+        or index["exact"].get(ocr_code)
+        or index["normalized"].get(normalize_code(ocr_code))
+    )
+
+
+async def load_subject_code_index(
+    db: AsyncClient,
+    batch_id: str,
+    semester_id: str
+) -> Dict[str, Dict[str, str]]:
+    """Read a batch/semester's code mappings and subject codes (two queries)."""
+    mapping_result = await db.table("subject_code_mappings") \
+        .select("ocr_code, subject_id") \
         .eq("batch_id", batch_id) \
         .eq("semester_id", semester_id) \
-        .limit(1) \
         .execute()
     
-    if mapping_result.data:
-        return mapping_result.data[0]["subject_id"]
-    
-    # Try direct code match in subjects table
-    subject_result = db.table("subjects") \
-        .select("id") \
-        .eq("code", ocr_code) \
+    subject_result = await db.table("subjects") \
+        .select("id, code") \
         .eq("semester_id", semester_id) \
-        .limit(1) \
         .execute()
     
-    if subject_result.data:
-        return subject_result.data[0]["id"]
-    
-    # Try case-insensitive match
-    subject_result = db.table("subjects") \
-        .select("id") \
-        .ilike("code", ocr_code) \
-        .eq("semester_id", semester_id) \
-        .limit(1) \
-        .execute()
+    return build_subject_code_index(mapping_result.data or [], subject_result.data or [])
+
+
+async def get_subject_code_index(
+    db: AsyncClient,
+    batch_id: str,
+    semester_id: str,
+    refresh: bool = False
+) -> Dict[str, Dict[str, str]]:
+    """The cached subject code index; refresh=True reloads it first."""
+    cache = get_subject_code_cache()
+    key = (batch_id, semester_id)
+    if refresh:
+        cache.invalidate(key)
+    return await cache.get_or_load(key, lambda: load_subject_code_index(db, batch_id, semester_id))
+
+
+def invalidate_subject_code_index(
+    batch_id: Optional[str] = None,
+    semester_id: Optional[str] = None
+) -> None:
+    """
+    Drop one batch/semester's index after mappings or subject codes change.
+    With no ids, the whole cache is cleared.
+    """
+    cache = get_subject_code_cache()
+    if batch_id is None or semester_id is None:
+        cache.clear()
+    else:
+        cache.invalidate((batch_id, semester_id))
+
+
+async def match_ocr_code_to_subject(
+    db: AsyncClient,
+    ocr_code: str,
+    batch_id: str,
+    semester_id: str
+) -> Optional[str]:
+    """
+    Match an OCR-extracted subject code to a subject ID.
     
-    if subject_result.data:
-        return subject_result.data[0]["id"]
+    First checks subject_code_mappings table, then tries direct match
+    (through the cached subject code index).
     
-    return None
+    Returns:
+        Subject ID or None if no match found.
+    """
+    index = await get_subject_code_index(db, batch_id, semester_id)
+    return match_subject_code(index, ocr_code)
 
 
-async def save_snapshot(
-    db: Client,
+async def insert_snapshot(
+    db: AsyncClient,
     student_id: str,
     batch_id: str,
     semester_id: str,
     request: SnapshotConfirmRequest
-) -> Tuple[str, List[str]]:
+) -> Dict:
     """
-    Save a confirmed OCR snapshot to the database.
+    Insert a confirmed OCR snapshot.
     
     Returns:
-        Tuple of (snapshot_id, list of unmatched subject codes)
+        The stored row (returned by the insert, no re-read needed).
     """
     # Convert entries to JSON-serializable format
     entries_json = [entry.model_dump() for entry in request.entries]
     
-    # Insert snapshot
-    result = db.table("ocr_snapshots").insert({
+    result = await db.table("ocr_snapshots").insert({
         "student_id": student_id,
         "batch_id": batch_id,
         "semester_id": semester_id,
@@ -115,56 +229,266 @@ async def save_snapshot(
         "metadata": request.metadata or {}
     }).execute()
     
-    snapshot_id = result.data[0]["id"]
+    return result.data[0]
+
+
+SNAPSHOT_HISTORY_COLUMNS = {
+    "full": "id, confirmed_at, captured_at, source_type, entries",
+    # snapshot_percentages is a computed field (migration 24): Postgres
+    # reduces entries to percentages, so the entries JSON isn't sent
+    "percentages": "id, confirmed_at, percentages:snapshot_percentages"
+}
+
+
+def snapshot_percentages(entries: List[Dict]) -> List[Dict]:
+    """
+    Per-subject code, class type and percentage of a snapshot's entries.
+    Mirrors the snapshot_percentages SQL function, for when it's missing.
+    """
+    percentages = []
+    for entry in entries or []:
+        code = entry.get("course_code") or entry.get("subject_code")
+        if not code:
+            continue
+        percentage = entry.get("percentage")
+        if percentage is None:
+            total = entry.get("total", 0)
+            percentage = round(entry.get("present", 0) / total * 100, 2) if total else 0.0
+        percentages.append({
+            "course_code": code,
+            "class_type": entry.get("class_type"),
+            "percentage": percentage
+        })
+    return percentages
+
+
+async def get_snapshot_history(
+    db: AsyncClient,
+    student_id: str,
+    batch_id: str,
+    limit: int = 20,
+    after: Optional[List] = None,
+    fields: str = "full"
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of a student's snapshots, newest first.
+    
+    Keyset-paginated on (confirmed_at, id) so every page is a range scan
+    on idx_ocr_snapshots_confirmed; after is the decoded cursor of the
+    previous page. fields="percentages" returns per-subject percentages
+    instead of full entries, computed in Postgres by snapshot_percentages;
+    without that function the entries are read and reduced here.
     
-    # Try to match each entry to a subject
-    unmatched = []
-    for entry in request.entries:
-        subject_id = await match_ocr_code_to_subject(
-            db, entry.course_code, batch_id, semester_id
+    Returns:
+        Tuple of (snapshots, next page cursor or None on the last page).
+    """
+    try:
+        rows = await _read_snapshot_page(
+            db, student_id, batch_id, SNAPSHOT_HISTORY_COLUMNS[fields], limit, after
         )
-        if not subject_id:
-            unmatched.append(entry.course_code)
+    except Exception as e:
+        if fields != "percentages" or not is_missing_column(e):
+            raise
+        logger.warning("snapshot_percentages not installed, reading full entries")
+        rows = await _read_snapshot_page(
+            db, student_id, batch_id, "id, confirmed_at, entries", limit, after
+        )
+        rows = [
+            {
+                "id": row["id"],
+                "confirmed_at": row["confirmed_at"],
+                "percentages": snapshot_percentages(row.get("entries"))
+            }
+            for row in rows
+        ]
+    
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last["confirmed_at"], last["id"])
     
-    return snapshot_id, unmatched
+    return page, next_cursor
 
 
-async def check_snapshot_decreases(
-    db: Client,
+async def _read_snapshot_page(
+    db: AsyncClient,
     student_id: str,
     batch_id: str,
+    columns: str,
+    limit: int,
+    after: Optional[List]
+) -> List[Dict]:
+    """Up to limit + 1 snapshots after the cursor - the extra row tells whether there is a next page."""
+    query = db.table("ocr_snapshots") \
+        .select(columns) \
+        .eq("student_id", student_id) \
+        .eq("batch_id", batch_id)
+    if after:
+        query = query.or_(keyset_filter(("confirmed_at", "id"), after))
+    
+    result = await query \
+        .order("confirmed_at", desc=True) \
+        .order("id", desc=True) \
+        .limit(limit + 1) \
+        .execute()
+    return result.data or []
+
+
+async def match_snapshot_codes(
+    db: AsyncClient,
+    batch_id: str,
+    semester_id: str,
+    codes: List[str]
+) -> List[str]:
+    """
+    Match OCR codes against the cached subject code index.
+    
+    Returns:
+        The codes that match no subject.
+    """
+    # Match every entry against the cached index; on a miss, reload it
+    # once in case a mapping or subject was added since it was cached
+    index = await get_subject_code_index(db, batch_id, semester_id)
+    unmatched = [code for code in codes if not match_subject_code(index, code)]
+    if unmatched:
+        index = await get_subject_code_index(db, batch_id, semester_id, refresh=True)
+        unmatched = [code for code in unmatched if not match_subject_code(index, code)]
+    
+    return unmatched
+
+
+# =============================================================================
+# SNAPSHOT DIFFS
+# =============================================================================
+# A new snapshot is diffed against the student's previous one subject by
+# subject (course code + class type), so the decrease check doesn't let a
+# lab and a lecture sharing a code shadow each other.
+
+def snapshot_entry_key(entry: Dict) -> Tuple[str, str]:
+    """(code, class_type) of an entry - OCR "course_code" or test "subject_code"."""
+    code = entry.get("course_code") or entry.get("subject_code")
+    return code, entry.get("class_type") or "LECTURE"
+
+
+def diff_snapshot_entries(
+    previous_entries: Optional[List[Dict]],
+    new_entries: List[Dict]
+) -> List[Dict]:
+    """
+    Per-subject changes between two snapshots' entries. Pure function.
+    With no previous snapshot every subject is "added".
+    
+    Returns:
+        One dict per added, removed or changed subject (unchanged ones
+        are left out), in new-entry order then removed ones:
+        course_code, class_type, change_type, present/total before and
+        after (None where absent), present_delta, total_delta.
+    """
+    before = {snapshot_entry_key(e): e for e in previous_entries or [] if snapshot_entry_key(e)[0]}
+    after = {snapshot_entry_key(e): e for e in new_entries if snapshot_entry_key(e)[0]}
+    
+    changes = []
+    for key in list(after) + [k for k in before if k not in after]:
+        old, new = before.get(key), after.get(key)
+        present_before = old.get("present", 0) if old else None
+        total_before = old.get("total", 0) if old else None
+        present_after = new.get("present", 0) if new else None
+        total_after = new.get("total", 0) if new else None
+        
+        if old is None:
+            change_type = "added"
+        elif new is None:
+            change_type = "removed"
+        elif (present_before, total_before) != (present_after, total_after):
+            change_type = "changed"
+        else:
+            continue
+        
+        changes.append({
+            "course_code": key[0],
+            "class_type": key[1],
+            "change_type": change_type,
+            "present_before": present_before,
+            "total_before": total_before,
+            "present_after": present_after,
+            "total_after": total_after,
+            "present_delta": (present_after or 0) - (present_before or 0),
+            "total_delta": (total_after or 0) - (total_before or 0)
+        })
+    
+    return changes
+
+
+def find_snapshot_decreases(
+    previous: Optional[Dict],
     new_entries: List[OCREntry]
 ) -> List[Dict]:
     """
-    Check if new snapshot shows decreased totals compared to previous.
+    Compare new entries with the previous snapshot. Pure function.
     
     Returns:
         List of subjects with decreased totals.
     """
-    previous = await get_latest_snapshot(db, student_id, batch_id)
     if not previous:
         return []
     
-    previous_entries = previous.get("entries", [])
-    previous_by_code = {e["course_code"]: e for e in previous_entries}
+    changes = diff_snapshot_entries(
+        previous.get("entries", []), [entry.model_dump() for entry in new_entries]
+    )
+    return [
+        {
+            "course_code": change["course_code"],
+            "old_total": change["total_before"],
+            "new_total": change["total_after"],
+            "old_present": change["present_before"],
+            "new_present": change["present_after"]
+        }
+        for change in changes
+        if change["change_type"] == "changed" and change["total_delta"] < 0
+    ]
+
+
+async def confirm_snapshot_pipeline(
+    db: AsyncClient,
+    student_id: str,
+    context: Dict,
+    request: SnapshotConfirmRequest
+) -> Dict:
+    """
+    Snapshot confirmation in a fixed number of round trips:
+    1. Read the previous snapshot
+    2. Check for decreased totals in memory - stop if any (unless
+       decreases are pre-confirmed)
+    3. Insert the new snapshot; the insert returns the stored row
+    4. Match codes against the cached subject code index
+    
+    The returned snapshot is handed to the recompute, so it doesn't read
+    the snapshot back.
+    
+    Returns:
+        Dict with decreases (non-empty means nothing was saved),
+        snapshot (the stored row, or None) and unmatched codes.
+    """
+    batch_id = context["batch_id"]
+    semester_id = context["semester_id"]
+    
+    previous = await get_latest_snapshot(db, student_id, batch_id)
+    if not request.confirm_decreases:
+        decreases = find_snapshot_decreases(previous, request.entries)
+        if decreases:
+            return {"decreases": decreases, "snapshot": None, "unmatched": []}
     
-    decreases = []
-    for entry in new_entries:
-        prev = previous_by_code.get(entry.course_code)
-        if prev and entry.total < prev["total"]:
-            decreases.append({
-                "course_code": entry.course_code,
-                "old_total": prev["total"],
-                "new_total": entry.total,
-                "old_present": prev["present"],
-                "new_present": entry.present
-            })
+    snapshot = await insert_snapshot(db, student_id, batch_id, semester_id, request)
+    unmatched = await match_snapshot_codes(
+        db, batch_id, semester_id, [entry.course_code for entry in request.entries]
+    )
     
-    return decreases
+    return {"decreases": [], "snapshot": snapshot, "unmatched": unmatched}
 
 
 async def invalidate_manual_entries_before_snapshot(
-    db: Client,
+    db: AsyncClient,
     student_id: str,
     snapshot_id: str,
     snapshot_time: datetime
@@ -181,7 +505,7 @@ async def invalidate_manual_entries_before_snapshot(
         Number of entries affected.
     """
     # Get all manual entries for this student that reference older snapshots
-    result = db.table("manual_attendance") \
+    result = await db.table("manual_attendance") \
         .select("id") \
         .eq("student_id", student_id) \
         .neq("snapshot_id", snapshot_id) \
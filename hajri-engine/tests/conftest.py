@@ -0,0 +1,238 @@
+"""
+Shared pytest fixtures for HAJRI Engine.
+
+Pure logic tests need no database. Router and service tests run
+against FakeDB, a stand-in Supabase client that records every query;
+`make_client` mounts routers on it as a signed-in student. Integration
+tests use `local_db`, which talks to a local Supabase stack (`supabase
+start` runs Postgres + PostgREST on localhost:54321). Set
+HAJRI_TEST_SUPABASE_URL and HAJRI_TEST_SUPABASE_KEY to enable them;
+otherwise they are skipped.
+"""
+
+import os
+from typing import Any, Callable, Dict, List, Optional
+import pytest
+
+# Settings require Supabase credentials - give tests harmless defaults
+os.environ.setdefault("SUPABASE_URL", os.environ.get("HAJRI_TEST_SUPABASE_URL", "http://localhost:54321"))
+os.environ.setdefault("SUPABASE_SERVICE_KEY", os.environ.get("HAJRI_TEST_SUPABASE_KEY", "test-service-key"))
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-jwt-secret")
+
+from supabase import acreate_client
+from supabase.lib.client_options import AsyncClientOptions
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.auth import AuthenticatedUser, get_current_student
+from app.core.database import build_http_pool, get_db
+
+
+@pytest.fixture
+async def local_db():
+    """Async client against a local Postgres-backed Supabase stack."""
+    url = os.environ.get("HAJRI_TEST_SUPABASE_URL")
+    key = os.environ.get("HAJRI_TEST_SUPABASE_KEY")
+    if not url or not key:
+        pytest.skip("HAJRI_TEST_SUPABASE_URL/HAJRI_TEST_SUPABASE_KEY not set")
+    
+    client = await acreate_client(
+        url, key, options=AsyncClientOptions(httpx_client=build_http_pool())
+    )
+    yield client
+    await client.postgrest.aclose()
+
+
+# =============================================================================
+# STAND-IN SUPABASE CLIENT
+# =============================================================================
+
+STUDENT_CONTEXT = {"student_id": "s1", "batch_id": "b1", "semester_id": "sem", "preferences": {}}
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """
+    One table or RPC request built against FakeDB.
+    
+    Records what was asked for (action, columns, payload, filters, order,
+    limit) and answers execute() through FakeDB.respond. Only builder
+    methods the engine uses exist, so a misspelled one raises
+    AttributeError instead of being silently ignored.
+    """
+    
+    def __init__(self, db: "FakeDB", name: str, action: str = "select", params: Optional[Dict] = None):
+        self.db = db
+        self.name = name
+        self.action = action
+        self.params = params
+        self.columns = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters: List[tuple] = []
+        self.or_filters: List[str] = []
+        self.orders: List[tuple] = []
+        self.limit_count = None
+        self.row_range = None
+        self.single_row = False
+    
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self.columns = columns
+        return self
+    
+    def insert(self, payload):
+        self.action, self.payload = "insert", payload
+        return self
+    
+    def upsert(self, payload, on_conflict: Optional[str] = None):
+        self.action, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+    
+    def update(self, payload):
+        self.action, self.payload = "update", payload
+        return self
+    
+    def delete(self):
+        self.action = "delete"
+        return self
+    
+    def _filter(self, op: str, column: str, value: Any):
+        self.filters.append((op, column, value))
+        return self
+    
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+    
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+    
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+    
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+    
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+    
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+    
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+    
+    def or_(self, condition: str):
+        self.or_filters.append(condition)
+        return self
+    
+    def order(self, column: str, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+    
+    def limit(self, count: int):
+        self.limit_count = count
+        return self
+    
+    def range(self, start: int, end: int):
+        self.row_range = (start, end)
+        return self
+    
+    def single(self):
+        self.single_row = True
+        return self
+    
+    def maybe_single(self):
+        self.single_row = True
+        return self
+    
+    def filter_value(self, column: str, op: str = "eq") -> Any:
+        """Value the query filters column on (None if it doesn't)."""
+        return next((v for o, c, v in self.filters if c == column and o == op), None)
+    
+    def matches(self, row: Dict) -> bool:
+        """
+        eq / neq / in filters applied to a stored row. Columns the row
+        doesn't have (joins, fixtures that leave them out) aren't checked.
+        """
+        for op, column, value in self.filters:
+            if column not in row:
+                continue
+            if op == "eq" and row[column] != value:
+                return False
+            if op == "neq" and row[column] == value:
+                return False
+            if op == "in" and row[column] not in value:
+                return False
+        return True
+    
+    async def execute(self) -> FakeResult:
+        self.db.queries.append(self)
+        return FakeResult(self.db.respond(self))
+
+
+class FakeDB:
+    """
+    Stand-in AsyncClient for router and service tests.
+    
+    `rows` maps a table or RPC name to its stored rows, or to a function
+    of the FakeQuery that returns the response data (or raises, to fail
+    the request). Every executed query is kept in `queries`, in order.
+    """
+    
+    def __init__(self, rows: Optional[Dict[str, Any]] = None):
+        self.rows = rows if rows is not None else {}
+        self.queries: List[FakeQuery] = []
+    
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+    
+    def rpc(self, name: str, params: Dict) -> FakeQuery:
+        return FakeQuery(self, name, action="rpc", params=params)
+    
+    def respond(self, query: FakeQuery) -> Any:
+        rows = self.rows.get(query.name, [])
+        if callable(rows):
+            return rows(query)
+        
+        rows = [row for row in rows if query.matches(row)]
+        if query.row_range is not None:
+            start, end = query.row_range
+            rows = rows[start:end + 1]
+        if query.limit_count is not None:
+            rows = rows[:query.limit_count]
+        if query.single_row:
+            return rows[0] if rows else None
+        return rows
+    
+    def executed(self, name: Optional[str] = None, action: Optional[str] = None) -> List[FakeQuery]:
+        """Executed queries, optionally only those on one table/RPC or of one action."""
+        return [
+            q for q in self.queries
+            if (name is None or q.name == name) and (action is None or q.action == action)
+        ]
+
+
+@pytest.fixture
+def make_client() -> Callable[..., TestClient]:
+    """TestClient factory: routers mounted on a FakeDB, signed in as a student."""
+    def make(db: FakeDB, *routers, context: Dict = STUDENT_CONTEXT) -> TestClient:
+        app = FastAPI()
+        for router in routers:
+            app.include_router(router)
+        
+        async def user():
+            return AuthenticatedUser(user_id="u1", student_id=context["student_id"], context=context)
+        
+        async def get_fake_db():
+            return db
+        
+        app.dependency_overrides[get_current_student] = user
+        app.dependency_overrides[get_db] = get_fake_db
+        return TestClient(app)
+    
+    return make
@@ -0,0 +1,177 @@
+"""
+Tests for JWT auth and the cached student context.
+The app_users lookup is answered by FakeDB - no database required.
+"""
+
+import time
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+from starlette.requests import Request
+
+from app.config import get_settings
+from app.core import auth
+from app.core.context import invalidate_student_context
+from fastapi import HTTPException
+from tests.conftest import FakeDB
+
+
+APP_USER = {
+    "student_id": "student-1",
+    "current_batch_id": "batch-1",
+    "current_semester_id": "sem-1",
+    "preferences": {},
+}
+
+
+def _app_user(**overrides):
+    return dict(APP_USER, id="user-1", **overrides)
+
+
+def _token(user_id="user-1", expires_in=3600):
+    payload = {"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + expires_in}
+    return jwt.encode(payload, get_settings().supabase_jwt_secret, algorithm="HS256")
+
+
+def _request():
+    return Request({"type": "http", "headers": [], "state": {}})
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDB({"app_users": [_app_user()]})
+    
+    async def get_client():
+        return fake
+    
+    monkeypatch.setattr(auth, "get_async_supabase_client", get_client)
+    invalidate_student_context()
+    auth.flush_token_cache()
+    yield fake
+    invalidate_student_context()
+    auth.flush_token_cache()
+
+
+async def _authenticate(token):
+    request = _request()
+    user = await auth.get_current_user(
+        request, HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    )
+    return user, request
+
+
+class TestStudentContext:
+    """user -> student -> batch/semester resolved once and cached."""
+    
+    async def test_context_attached_to_user_and_request(self, db):
+        user, request = await _authenticate(_token())
+        
+        assert user.student_id == "student-1"
+        assert user.context == {
+            "student_id": "student-1",
+            "batch_id": "batch-1",
+            "semester_id": "sem-1",
+            "preferences": {},
+        }
+        assert request.state.student_context == user.context
+    
+    async def test_cached_across_requests(self, db):
+        await _authenticate(_token())
+        await _authenticate(_token())
+        
+        lookups = db.executed("app_users")
+        assert len(lookups) == 1
+        assert lookups[0].filter_value("id") == "user-1"
+    
+    async def test_invalidated_by_student_id(self, db):
+        await _authenticate(_token())
+        db.rows["app_users"] = [_app_user(current_batch_id="batch-2")]
+        invalidate_student_context(student_id="student-1")
+        
+        user, _ = await _authenticate(_token())
+        
+        assert len(db.executed("app_users")) == 2
+        assert user.context["batch_id"] == "batch-2"
+    
+    async def test_no_active_semester_means_no_context(self, db):
+        db.rows["app_users"] = [_app_user(current_semester_id=None)]
+        user, _ = await _authenticate(_token())
+        
+        assert user.student_id == "student-1"
+        assert user.context is None
+    
+    async def test_onboarding_user_not_locked_out(self, db):
+        db.rows["app_users"] = []
+        user, _ = await _authenticate(_token())
+        assert user.context is None
+        
+        db.rows["app_users"] = [_app_user()]
+        user, _ = await _authenticate(_token())
+        
+        assert user.context["batch_id"] == "batch-1"
+        assert len(db.executed("app_users")) == 2
+    
+    async def test_student_mapping_is_bounded(self, db, monkeypatch):
+        from app.core import context
+        from app.core.cache import TTLCache
+        
+        monkeypatch.setattr(context, "_cache", TTLCache(maxsize=4))
+        db.rows["app_users"] = [
+            dict(APP_USER, id=f"user-{n}", student_id=f"student-{n}") for n in range(10)
+        ]
+        for n in range(10):
+            await _authenticate(_token(user_id=f"user-{n}"))
+        
+        assert len(context.get_context_cache()) == 4
+
+
+class TestTokenCache:
+    """Verified tokens are memoized until exp."""
+    
+    async def test_same_token_decoded_once(self, db, monkeypatch):
+        decodes = []
+        real_decode = auth.jwt.decode
+        
+        def counting_decode(*args, **kwargs):
+            decodes.append(1)
+            return real_decode(*args, **kwargs)
+        
+        monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+        hits_before = auth.token_cache_stats()["hits"]
+        token = _token()
+        for _ in range(3):
+            user, _ = await _authenticate(token)
+        
+        assert len(decodes) == 1
+        assert user.student_id == "student-1"
+        stats = auth.token_cache_stats()
+        assert (stats["hits"] - hits_before, stats["size"]) == (2, 1)
+        assert stats["hit_rate"] > 0
+    
+    async def test_cached_user_gets_fresh_context(self, db):
+        token = _token()
+        await _authenticate(token)
+        db.rows["app_users"] = [_app_user(current_batch_id="batch-2")]
+        invalidate_student_context(student_id="student-1")
+        
+        user, _ = await _authenticate(token)
+        
+        assert user.context["batch_id"] == "batch-2"
+    
+    async def test_entry_expires_with_token(self, db):
+        auth.verify_token(_token(expires_in=1))
+        entry = auth.get_token_cache()._data
+        (_, expires_at), = entry.values()
+        
+        assert expires_at - time.monotonic() <= 1
+    
+    async def test_invalid_token_not_cached(self, db):
+        with pytest.raises(HTTPException):
+            await _authenticate("not-a-jwt")
+        assert auth.token_cache_stats()["size"] == 0
+    
+    async def test_flush(self, db):
+        await _authenticate(_token())
+        
+        assert auth.flush_token_cache() == 1
+        assert auth.token_cache_stats()["size"] == 0
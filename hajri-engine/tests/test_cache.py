@@ -0,0 +1,57 @@
+"""
+Tests for the in-process TTL cache.
+"""
+
+import asyncio
+import pytest
+from app.core.cache import TTLCache
+
+
+class TestTTLCache:
+    """Expiry, size bound and load de-duplication."""
+    
+    def test_hit_and_miss(self):
+        cache = TTLCache()
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+    
+    def test_expiry(self):
+        cache = TTLCache(ttl_seconds=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+    
+    def test_maxsize_evicts_least_recent(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+    
+    async def test_concurrent_loads_share_one_call(self):
+        cache = TTLCache()
+        calls = []
+        
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+        
+        values = await asyncio.gather(*[cache.get_or_load("k", loader) for _ in range(5)])
+        
+        assert values == ["value"] * 5
+        assert len(calls) == 1
+    
+    async def test_failed_load_not_cached(self):
+        cache = TTLCache()
+        
+        async def failing():
+            raise ValueError("boom")
+        
+        with pytest.raises(ValueError):
+            await cache.get_or_load("k", failing)
+        assert len(cache) == 0
@@ -0,0 +1,75 @@
+"""
+Tests for the async, pooled database client.
+Integration tests run only against a local Supabase stack (see conftest).
+"""
+
+import asyncio
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+from app.core import database
+from app.core.database import (
+    get_async_supabase_client,
+    close_async_supabase_client,
+    get_db,
+    is_missing_column,
+    is_missing_function
+)
+
+
+class TestAsyncClient:
+    """Tests for the shared client lifecycle."""
+    
+    async def test_client_is_shared(self):
+        first = await get_async_supabase_client()
+        second = await get_db()
+        
+        assert first is second
+        await close_async_supabase_client()
+    
+    async def test_concurrent_first_use_creates_one_client(self):
+        clients = await asyncio.gather(*[get_async_supabase_client() for _ in range(10)])
+        
+        assert len({id(c) for c in clients}) == 1
+        await close_async_supabase_client()
+    
+    async def test_close_resets_client(self):
+        await get_async_supabase_client()
+        await close_async_supabase_client()
+        
+        assert database._async_client is None
+
+
+class TestIsMissingFunction:
+    """Only a missing SQL function may trigger a client-side fallback."""
+    
+    def test_missing_function(self):
+        assert is_missing_function(APIError({"code": "PGRST202", "message": "not found"}))
+        assert is_missing_function(APIError({"code": "42883", "message": "does not exist"}))
+    
+    def test_other_failures(self):
+        assert not is_missing_function(APIError({"code": "23505", "message": "duplicate key"}))
+        assert not is_missing_function(httpx.ReadTimeout("timed out"))
+        assert not is_missing_function(RuntimeError("function does not exist"))
+    
+    def test_missing_column(self):
+        assert is_missing_column(APIError({"code": "42703", "message": "column does not exist"}))
+        assert not is_missing_column(APIError({"code": "PGRST202", "message": "not found"}))
+
+
+class TestLocalDatabase:
+    """Round trips against a local Postgres-backed Supabase stack."""
+    
+    async def test_select(self, local_db):
+        result = await local_db.table("app_users").select("id").limit(1).execute()
+        
+        assert isinstance(result.data, list)
+    
+    async def test_queries_in_flight_together(self, local_db):
+        queries = [
+            local_db.table("semesters").select("id").limit(1).execute()
+            for _ in range(20)
+        ]
+        results = await asyncio.gather(*queries)
+        
+        assert len(results) == 20
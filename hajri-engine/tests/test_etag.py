@@ -0,0 +1,152 @@
+"""
+Tests for ETag / If-None-Match handling on summary and latest snapshot.
+Routers run against a stand-in Supabase client - no database required.
+"""
+
+import pytest
+from starlette.requests import Request
+
+from app.core.etag import make_etag, etag_matches
+from app.routers import attendance, snapshots
+from tests.conftest import FakeDB
+
+
+def _selects(db):
+    return [(q.name, q.columns) for q in db.queries]
+
+
+SUMMARY_ROW = {
+    "student_id": "s1",
+    "subject_id": "subj-1",
+    "subjects": {"code": "CS101", "name": "Intro", "type": "LECTURE"},
+    "class_type": "LECTURE",
+    "snapshot_present": 30, "snapshot_total": 40,
+    "manual_present": 1, "manual_absent": 0,
+    "current_present": 31, "current_total": 41,
+    "current_percentage": 75.61,
+    "snapshot_at": "2025-01-20T10:00:00+00:00",
+    "last_recomputed_at": "2025-02-01T00:00:00+00:00",
+}
+
+
+@pytest.fixture
+def db():
+    return FakeDB({
+        # Another student's row: dropping the student filter would show it
+        "attendance_summary": [dict(SUMMARY_ROW), dict(SUMMARY_ROW, student_id="s2", subject_id="subj-2")],
+        "semesters": [{"semester_number": 4}],
+        "ocr_snapshots": [{"id": "snap-1", "confirmed_at": "2025-01-20T10:00:00+00:00", "entries": []}],
+    })
+
+
+@pytest.fixture
+def client(db, make_client):
+    return make_client(db, attendance.router, snapshots.router)
+
+
+class TestEtagHelpers:
+    def _request(self, header):
+        return Request({"type": "http", "headers": [(b"if-none-match", header.encode())]})
+    
+    def test_strong_and_weak_match(self):
+        etag = make_etag("a", 1)
+        
+        assert etag_matches(self._request(etag), etag)
+        assert etag_matches(self._request(f'"other", W/{etag}'), etag)
+        assert not etag_matches(self._request('"other"'), etag)
+    
+    def test_etag_changes_with_parts(self):
+        assert make_etag("a", 1) != make_etag("a", 2)
+
+
+class TestSummaryEtag:
+    def test_304_uses_only_version_query(self, client, db):
+        first = client.get("/attendance/summary")
+        etag = first.headers["ETag"]
+        db.queries.clear()
+        
+        second = client.get("/attendance/summary", headers={"If-None-Match": etag})
+        
+        assert first.status_code == 200
+        assert second.status_code == 304
+        assert second.headers["ETag"] == etag
+        assert _selects(db) == [
+            ("student_read_models", "document"),
+            ("attendance_summary", "last_recomputed_at")
+        ]
+    
+    def test_recompute_changes_etag(self, client, db):
+        etag = client.get("/attendance/summary").headers["ETag"]
+        db.rows["attendance_summary"][0]["last_recomputed_at"] = "2025-02-02T00:00:00+00:00"
+        
+        response = client.get("/attendance/summary", headers={"If-None-Match": etag})
+        
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert [r["subject_code"] for r in response.json()["subjects"]] == ["CS101"]
+
+
+class TestSummaryReadModel:
+    """With a read model the summary is one primary-key read, 304 included."""
+    
+    @pytest.fixture
+    def document(self, db):
+        from app.services.read_models import build_read_model
+        
+        document = build_read_model(
+            "s1", "b1", "sem", [dict(SUMMARY_ROW)],
+            [{"id": "subj-1", "code": "CS101", "name": "Intro"}],
+            {"subj-1": 60}, {"semester_number": 4}, "2025-02-01T00:00:00+00:00"
+        )
+        db.rows["student_read_models"] = [{"student_id": "s1", "document": document}]
+        return document
+    
+    def test_single_read(self, client, db, document):
+        response = client.get("/attendance/summary")
+        
+        assert _selects(db) == [("student_read_models", "document")]
+        assert db.queries[0].filter_value("student_id") == "s1"
+        assert response.json()["semester_name"] == "Semester 4"
+        assert response.json()["subjects"][0]["subject_code"] == "CS101"
+    
+    def test_same_etag_as_joined_path(self, client, db, document):
+        etag = client.get("/attendance/summary").headers["ETag"]
+        db.rows["student_read_models"] = []
+        
+        assert client.get("/attendance/summary").headers["ETag"] == etag
+    
+    def test_304(self, client, db, document):
+        etag = client.get("/attendance/summary").headers["ETag"]
+        db.queries.clear()
+        
+        response = client.get("/attendance/summary", headers={"If-None-Match": etag})
+        
+        assert response.status_code == 304
+        assert _selects(db) == [("student_read_models", "document")]
+    
+    def test_other_batch_falls_back(self, client, db, document):
+        document["batch_id"] = "b2"
+        
+        client.get("/attendance/summary")
+        
+        assert ("attendance_summary", "*, subjects(code, name, type)") in _selects(db)
+
+
+class TestLatestSnapshotEtag:
+    def test_304_skips_entries(self, client, db):
+        etag = client.get("/snapshots/latest").headers["ETag"]
+        db.queries.clear()
+        
+        response = client.get("/snapshots/latest", headers={"If-None-Match": etag})
+        
+        assert response.status_code == 304
+        assert _selects(db) == [("ocr_snapshots", "id, confirmed_at")]
+    
+    def test_new_snapshot_changes_etag(self, client, db):
+        etag = client.get("/snapshots/latest").headers["ETag"]
+        db.rows["ocr_snapshots"] = [{"id": "snap-2", "confirmed_at": "2025-02-20T10:00:00+00:00", "entries": []}]
+        
+        response = client.get("/snapshots/latest", headers={"If-None-Match": etag})
+        
+        assert response.status_code == 200
+        assert response.json()["snapshot"]["id"] == "snap-2"
@@ -0,0 +1,218 @@
+"""
+Tests for bulk manual attendance.
+The router runs against FakeDB - no database required.
+"""
+
+import pytest
+from datetime import date
+from postgrest.exceptions import APIError
+
+from app.routers import attendance
+from app.services.attendance import (
+    validate_manual_entries,
+    manual_entry_row,
+    upsert_manual_entries
+)
+from app.models.schemas import ManualAttendanceRequest
+from tests.conftest import FakeDB
+
+
+SNAPSHOT = {"id": "snap-1", "confirmed_at": "2025-01-20T10:00:00+00:00", "entries": []}
+HOLIDAY = date(2025, 1, 26)
+
+
+def _entry(day, status="PRESENT", subject_id="subj-1", class_type="LECTURE"):
+    return {
+        "subject_id": subject_id,
+        "event_date": f"2025-01-{day:02d}",
+        "class_type": class_type,
+        "status": status
+    }
+
+
+def _manual_db(existing=(), rpc_installed=True, rpc_error=None):
+    """
+    FakeDB holding existing manual_attendance rows. The RPC reports each
+    row's previous status; rpc_installed=False makes it fail the way
+    PostgREST does for an unknown function.
+    """
+    existing = list(existing)
+    
+    def rpc(query):
+        if not rpc_installed:
+            raise APIError({"code": "PGRST202", "message": "Could not find the function"})
+        if rpc_error:
+            raise rpc_error
+        previous = {r["event_date"]: r["status"] for r in existing}
+        return [
+            dict(r, id=f"id-{r['event_date']}", previous_status=previous.get(r["event_date"]))
+            for r in query.params["p_rows"]
+        ]
+    
+    def table(query):
+        if query.action == "upsert":
+            return [dict(r, id=f"id-{r['event_date']}") for r in query.payload]
+        return [r for r in existing if query.matches(r)]
+    
+    return FakeDB({"upsert_manual_attendance": rpc, "manual_attendance": table})
+
+
+def _actions(db):
+    return [q.action for q in db.queries]
+
+
+def _written(db):
+    """Rows sent by the last write, through the RPC or the plain upsert."""
+    query = db.queries[-1]
+    return query.params["p_rows"] if query.action == "rpc" else query.payload
+
+
+class _Queue:
+    def __init__(self):
+        self.jobs = []
+    
+    async def enqueue(self, student_id, trigger, trigger_id=None, delta=None, deltas=None):
+        self.jobs.append({"student_id": student_id, "trigger_id": trigger_id, "deltas": deltas or [delta]})
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = _Queue()
+    
+    async def fake_snapshot(db, student_id, batch_id):
+        return SNAPSHOT
+    
+    async def fake_non_teaching(db, days):
+        return {day for day in days if day == HOLIDAY}
+    
+    async def fake_teaching_day(db, day):
+        return day != HOLIDAY
+    
+    monkeypatch.setattr(attendance, "get_latest_snapshot", fake_snapshot)
+    monkeypatch.setattr(attendance, "non_teaching_days", fake_non_teaching)
+    monkeypatch.setattr(attendance, "is_teaching_day", fake_teaching_day)
+    monkeypatch.setattr(attendance, "get_recompute_queue", lambda: queue)
+    return queue
+
+
+@pytest.fixture
+def client(make_client):
+    return lambda db: make_client(db, attendance.router)
+
+
+class TestValidateManualEntries:
+    """One pass over the batch against snapshot lock and calendar."""
+    
+    def test_reports_every_violation(self):
+        entries = [
+            ManualAttendanceRequest(**_entry(day))
+            for day in (20, 21, 26, 27)
+        ]
+        violations = validate_manual_entries(entries, date(2025, 1, 20), [HOLIDAY])
+        
+        assert [(v["index"], v["rule"]) for v in violations] == [
+            (0, "SNAPSHOT_LOCK"),
+            (2, "VALID_TEACHING_DAY"),
+        ]
+
+
+EXISTING = [{
+    "student_id": "s1", "subject_id": "subj-1", "event_date": "2025-01-22",
+    "class_type": "LECTURE", "status": "ABSENT"
+}]
+
+
+class TestBulkManualAttendance:
+    def test_one_upsert_one_recompute(self, queue, client):
+        db = _manual_db(EXISTING)
+        body = {"entries": [_entry(21), _entry(22), _entry(23, "ABSENT")]}
+        
+        response = client(db).post("/attendance/manual/bulk", json=body)
+        
+        assert response.status_code == 200
+        assert _actions(db) == ["rpc"]
+        assert len(_written(db)) == 3
+        assert len(queue.jobs) == 1
+        deltas = queue.jobs[0]["deltas"]
+        assert [d["old_status"] for d in deltas] == [None, "ABSENT", None]
+        assert [e["id"] for e in response.json()["entries"]] == [
+            "id-2025-01-21", "id-2025-01-22", "id-2025-01-23"
+        ]
+    
+    def test_repeated_entry_last_wins(self, queue, client):
+        db = _manual_db()
+        body = {"entries": [_entry(21), _entry(21, "ABSENT")]}
+        
+        response = client(db).post("/attendance/manual/bulk", json=body)
+        
+        assert response.status_code == 200
+        assert [r["status"] for r in _written(db)] == ["ABSENT"]
+    
+    def test_violation_rejects_batch(self, queue, client):
+        db = _manual_db()
+        body = {"entries": [_entry(21), _entry(26), _entry(19)]}
+        
+        response = client(db).post("/attendance/manual/bulk", json=body)
+        detail = response.json()["detail"]
+        
+        assert response.status_code == 400
+        assert detail["rule"] == "BULK_VALIDATION"
+        assert [v["index"] for v in detail["details"]["violations"]] == [1, 2]
+        assert _actions(db) == []
+        assert queue.jobs == []
+
+
+class TestUpsertManualEntries:
+    """One round trip through the RPC, read-then-upsert without it."""
+    
+    ROWS = [
+        manual_entry_row("s1", "snap-1", "subj-1", date(2025, 1, d), "LECTURE", "PRESENT")
+        for d in (21, 22)
+    ]
+    
+    async def test_rpc_returns_previous_status(self):
+        db = _manual_db(EXISTING)
+        
+        written = await upsert_manual_entries(db, self.ROWS)
+        
+        assert _actions(db) == ["rpc"]
+        assert [w["previous_status"] for w in written] == [None, "ABSENT"]
+    
+    async def test_fallback_without_rpc(self):
+        db = _manual_db(EXISTING, rpc_installed=False)
+        
+        written = await upsert_manual_entries(db, self.ROWS)
+        
+        select, upsert = db.executed("manual_attendance")
+        assert _actions(db) == ["rpc", "select", "upsert"]
+        assert select.filter_value("student_id", "in") == ["s1"]
+        assert sorted(select.filter_value("event_date", "in")) == ["2025-01-21", "2025-01-22"]
+        assert upsert.on_conflict == "student_id,subject_id,event_date,class_type"
+        assert [w["previous_status"] for w in written] == [None, "ABSENT"]
+    
+    async def test_rpc_failure_is_not_retried(self):
+        error = APIError({"code": "23503", "message": "violates foreign key constraint"})
+        db = _manual_db(EXISTING, rpc_error=error)
+        
+        with pytest.raises(APIError):
+            await upsert_manual_entries(db, self.ROWS)
+        
+        assert _actions(db) == ["rpc"]
+    
+    def test_single_endpoint_updates_in_place(self, queue, client):
+        db = _manual_db(EXISTING)
+        
+        response = client(db).post("/attendance/manual", json=_entry(22, "PRESENT"))
+        
+        assert response.status_code == 200
+        assert _actions(db) == ["rpc"]
+        assert queue.jobs[0]["deltas"][0]["old_status"] == "ABSENT"
+    
+    def test_single_endpoint_rejects_holiday(self, queue, client):
+        db = _manual_db()
+        
+        response = client(db).post("/attendance/manual", json=_entry(26))
+        
+        assert response.status_code == 400
+        assert response.json()["detail"]["rule"] == "VALID_TEACHING_DAY"
+        assert _actions(db) == []
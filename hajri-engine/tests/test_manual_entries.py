@@ -0,0 +1,125 @@
+"""
+Tests for listing manual attendance entries.
+FakeDB applies the keyset filter the way PostgREST would.
+"""
+
+import json
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor
+from app.routers import attendance
+from app.services.attendance import list_manual_entries, iter_manual_entries
+from tests.conftest import FakeDB
+
+
+def _entry_id(n):
+    return f"00000000-0000-0000-0000-{n:012d}"
+
+
+def _rows(count):
+    # Two entries per day so the id tiebreak matters
+    return [
+        {"id": _entry_id(i), "student_id": "s1", "event_date": f"2025-01-{1 + i // 2:02d}", "status": "PRESENT"}
+        for i in range(count)
+    ]
+
+
+def _keyset(rows):
+    """
+    manual_attendance as PostgREST would serve it: the student's rows,
+    newest first, after the keyset cursor, up to the limit.
+    """
+    def respond(query):
+        matched = sorted(
+            (r for r in rows if query.matches(r)),
+            key=lambda r: (r["event_date"], r["id"]),
+            reverse=True,
+        )
+        for condition in query.or_filters:
+            # keyset_filter output: event_date.lt."d",and(event_date.eq."d",id.lt."i")
+            parts = condition.split('"')
+            after = (parts[1], parts[5])
+            matched = [r for r in matched if (r["event_date"], r["id"]) < after]
+        return matched[:query.limit_count]
+    return respond
+
+
+def _db(rows):
+    return FakeDB({"manual_attendance": _keyset(rows)})
+
+
+@pytest.fixture
+def client(make_client):
+    return lambda db: make_client(db, attendance.router)
+
+
+class TestListManualEntries:
+    @pytest.mark.asyncio
+    async def test_pages_cover_every_row_once(self):
+        db = _db(_rows(7))
+        seen, after = [], None
+        
+        while True:
+            page, cursor = await list_manual_entries(db, "s1", limit=3, after=after)
+            seen.extend(r["id"] for r in page)
+            if cursor is None:
+                break
+            after = decode_cursor(cursor, ("date", "uuid"))
+        
+        assert seen == [_entry_id(i) for i in reversed(range(7))]
+        assert all(q.filter_value("student_id") == "s1" for q in db.queries)
+        assert db.queries[0].orders == [("event_date", True), ("id", True)]
+        assert [len(q.or_filters) for q in db.queries] == [0, 1, 1]
+    
+    @pytest.mark.asyncio
+    async def test_exact_page_has_no_cursor(self):
+        page, cursor = await list_manual_entries(_db(_rows(3)), "s1", limit=3)
+        
+        assert len(page) == 3
+        assert cursor is None
+    
+    @pytest.mark.asyncio
+    async def test_projection_skips_subject_join(self):
+        db = _db(_rows(1))
+        
+        await list_manual_entries(db, "s1", include_subject=False)
+        await list_manual_entries(db, "s1")
+        
+        assert [q.columns for q in db.queries] == ["*", "*, subjects(code, name)"]
+    
+    @pytest.mark.asyncio
+    async def test_iter_reads_every_page(self):
+        rows = [r async for r in iter_manual_entries(_db(_rows(5)), "s1", page_size=2)]
+        
+        assert len(rows) == 5
+
+
+class TestManualEntriesEndpoint:
+    def test_next_cursor_fetches_older_page(self, client):
+        client = client(_db(_rows(5)))
+        
+        first = client.get("/attendance/manual", params={"limit": 3}).json()
+        second = client.get("/attendance/manual", params={"limit": 3, "cursor": first["next_cursor"]}).json()
+        
+        assert [r["id"] for r in first["entries"]] == [_entry_id(4), _entry_id(3), _entry_id(2)]
+        assert [r["id"] for r in second["entries"]] == [_entry_id(1), _entry_id(0)]
+        assert second["next_cursor"] is None
+    
+    def test_invalid_cursor(self, client):
+        response = client(_db([])).get("/attendance/manual", params={"cursor": "not-a-cursor"})
+        
+        assert response.status_code == 400
+    
+    def test_cursor_values_must_be_date_and_uuid(self, client):
+        cursor = encode_cursor("2025-01-03", _entry_id(5) + '")')
+        
+        response = client(_db(_rows(5))).get("/attendance/manual", params={"cursor": cursor})
+        
+        assert response.status_code == 400
+    
+    def test_ndjson_streams_every_entry(self, client):
+        response = client(_db(_rows(4))).get("/attendance/manual", params={"format": "ndjson", "limit": 1})
+        
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["id"] for r in lines] == [_entry_id(i) for i in (3, 2, 1, 0)]
@@ -0,0 +1,58 @@
+"""
+Tests for keyset pagination cursors.
+"""
+
+import pytest
+from app.core.pagination import (
+    encode_cursor,
+    decode_cursor,
+    keyset_filter,
+    InvalidCursorError
+)
+
+
+SNAPSHOT_KEY = ("timestamp", "uuid")
+UUID = "3f2b8c1e-9a4d-4e6f-8b7a-1c2d3e4f5a6b"
+
+
+class TestCursor:
+    def test_round_trip(self):
+        cursor = encode_cursor("2025-01-20T10:00:00.123456+00:00", UUID)
+        
+        assert "=" not in cursor and "+" not in cursor
+        assert decode_cursor(cursor, SNAPSHOT_KEY) == ["2025-01-20T10:00:00.123456+00:00", UUID]
+        assert decode_cursor(encode_cursor("2025-01-20", UUID), ("date", "uuid")) == ["2025-01-20", UUID]
+    
+    def test_first_page(self):
+        assert decode_cursor(None, SNAPSHOT_KEY) is None
+        assert decode_cursor("", SNAPSHOT_KEY) is None
+    
+    def test_rejects_garbage_and_wrong_size(self):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor("not-a-cursor!", SNAPSHOT_KEY)
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(encode_cursor("2025-01-20T10:00:00+00:00"), SNAPSHOT_KEY)
+    
+    @pytest.mark.parametrize("values", [
+        ("2025-01-20T10:00:00+00:00", 'x"),id.gt.(0'),
+        ('2025-01-20",id.gt."0', UUID),
+        ("2025-01-20T10:00:00+00:00", 42),
+        (None, UUID),
+        ("2025-01-20", UUID),
+    ])
+    def test_rejects_values_of_the_wrong_shape(self, values):
+        # Decoded values end up inside a PostgREST or() filter
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(encode_cursor(*values), SNAPSHOT_KEY)
+
+
+class TestKeysetFilter:
+    def test_descending(self):
+        assert keyset_filter(("confirmed_at", "id"), ["t", "i"]) == (
+            'confirmed_at.lt."t",and(confirmed_at.eq."t",id.lt."i")'
+        )
+    
+    def test_ascending(self):
+        assert keyset_filter(("event_date", "id"), ["d", "i"], descending=False).startswith(
+            'event_date.gt."d"'
+        )
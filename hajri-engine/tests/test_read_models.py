@@ -0,0 +1,171 @@
+"""
+Tests for the per-student read model.
+These test building, patching and rendering documents - no database required.
+The rebuild runs against FakeDB.
+"""
+
+from app.services import read_models
+from app.services.read_models import (
+    build_read_model,
+    refresh_read_model,
+    is_current,
+    render_dashboard,
+    render_predictions,
+    render_summary,
+    rebuild_read_models,
+    READ_MODEL_VERSION
+)
+from app.services.predictions import compute_simple_prediction
+from tests.conftest import FakeDB
+
+
+COMPUTED_AT = "2025-02-01T00:00:00+00:00"
+
+SUBJECTS = [
+    {"id": "subj-1", "code": "CS101", "name": "Intro"},
+    {"id": "subj-2", "code": "CS102", "name": "Lab"},
+]
+
+
+def _row(subject_id, class_type, present, total, recomputed_at=COMPUTED_AT):
+    return {
+        "subject_id": subject_id,
+        "class_type": class_type,
+        "snapshot_present": present,
+        "snapshot_total": total,
+        "manual_present": 0,
+        "manual_absent": 0,
+        "current_present": present,
+        "current_total": total,
+        "current_percentage": round(present / total * 100, 2),
+        "snapshot_at": "2025-01-20T10:00:00+00:00",
+        "last_recomputed_at": recomputed_at,
+    }
+
+
+def _document():
+    return build_read_model(
+        "s1", "b1", "sem",
+        [_row("subj-1", "LECTURE", 30, 40), _row("subj-2", "LAB", 5, 10)],
+        SUBJECTS,
+        {"subj-1": 60},
+        {"name": "Sem 4", "semester_number": 4, "end_date": "2025-05-30"},
+        COMPUTED_AT
+    )
+
+
+class TestBuildReadModel:
+    """Tests for building the denormalized document."""
+    
+    def test_subjects_denormalized(self):
+        document = _document()
+        first = document["subjects"][0]
+        
+        assert document["version"] == READ_MODEL_VERSION
+        assert first["subject_code"] == "CS101"
+        assert first["subject_name"] == "Intro"
+        assert document["semester"]["name"] == "Sem 4"
+        assert document["last_recomputed_at"] == COMPUTED_AT
+    
+    def test_prediction_uses_expected_totals(self):
+        first, second = _document()["subjects"]
+        expected = compute_simple_prediction(30, 40, 20)
+        
+        assert first["classes_remaining"] == 20
+        assert first["can_bunk"] == expected["can_bunk"]
+        assert first["must_attend"] == expected["must_attend"]
+        # No semester total: nothing remaining, same as the joined path
+        assert second["classes_remaining"] == 0
+
+
+class TestRefreshReadModel:
+    """Tests for patching a document from incremental recompute rows."""
+    
+    def test_updates_touched_subject_only(self):
+        document = _document()
+        later = "2025-02-02T00:00:00+00:00"
+        row = dict(_row("subj-1", "LECTURE", 30, 40, later), manual_absent=2,
+                   current_total=42, current_percentage=71.43)
+        
+        refreshed = refresh_read_model(document, [row], later)
+        
+        assert refreshed["subjects"][0]["current_total"] == 42
+        assert refreshed["subjects"][0]["classes_remaining"] == 18
+        assert refreshed["subjects"][1] == document["subjects"][1]
+        assert refreshed["last_recomputed_at"] == later
+        assert document["subjects"][0]["current_total"] == 40
+    
+    def test_unknown_subject_is_stale(self):
+        row = _row("subj-9", "LECTURE", 1, 1)
+        
+        assert refresh_read_model(_document(), [row], COMPUTED_AT) is None
+
+
+class TestIsCurrent:
+    def test_matches_context(self):
+        assert is_current(_document(), {"batch_id": "b1", "semester_id": "sem"})
+    
+    def test_other_semester_or_version(self):
+        document = _document()
+        
+        assert not is_current(document, {"batch_id": "b1", "semester_id": "other"})
+        assert not is_current(dict(document, version=0), {"batch_id": "b1", "semester_id": "sem"})
+        assert not is_current(None, {"batch_id": "b1", "semester_id": "sem"})
+
+
+class TestRender:
+    """Each endpoint's response comes from the same document."""
+    
+    def test_dashboard(self):
+        dashboard = render_dashboard(_document())
+        
+        assert dashboard.semester == "Sem 4"
+        assert dashboard.overall_present == 35
+        assert dashboard.overall_total == 50
+    
+    def test_predictions_totals(self):
+        predictions = render_predictions(_document())
+        
+        assert predictions.classes_remaining_in_semester == 20
+        assert predictions.total_can_bunk == sum(s.can_bunk for s in predictions.subjects)
+        assert predictions.subjects_at_risk == 1
+        assert str(predictions.semester_end) == "2025-05-30"
+    
+    def test_summary(self):
+        summary = render_summary(_document())
+        
+        assert summary.semester_name == "Semester 4"
+        assert summary.subjects[1].current_percentage == 50.0
+        assert summary.snapshot_at is not None
+
+
+class TestRebuildReadModels:
+    """Paged app_users read, current-semester summary rows only."""
+    
+    async def test_pages_users_and_skips_other_semesters(self, monkeypatch):
+        monkeypatch.setattr(read_models, "USERS_PER_READ", 2)
+        users = [
+            {"id": f"u{n}", "student_id": f"s{n}", "current_batch_id": "b1", "current_semester_id": "sem"}
+            for n in range(3)
+        ]
+        summaries = [
+            dict(_row("subj-1", "LECTURE", 30, 40), student_id=f"s{n}", batch_id="b1", semester_id="sem")
+            for n in range(3)
+        ]
+        # Left over from the student's previous semester
+        summaries.append(dict(_row("subj-2", "LAB", 1, 2), student_id="s0", batch_id="b1", semester_id="old"))
+        db = FakeDB({
+            "app_users": users,
+            "attendance_summary": summaries,
+            "semesters": [{"id": "sem", "name": "Sem 4", "semester_number": 4, "end_date": "2025-05-30"}],
+        })
+        
+        result = await rebuild_read_models(db)
+        
+        pages = db.executed("app_users")
+        assert [q.row_range for q in pages] == [(0, 1), (2, 3)]
+        assert all(q.orders == [("id", False)] for q in pages)
+        assert result == {"students_rebuilt": 3, "students_skipped": 0, "groups": 1}
+        assert db.executed("attendance_summary")[0].filter_value("semester_id") == "sem"
+        saved = db.executed("student_read_models", "upsert")[0].payload
+        assert all(len(doc["document"]["subjects"]) == 1 for doc in saved)
@@ -0,0 +1,392 @@
+"""
+Tests for the set-based recompute pipeline.
+These test the in-memory computation - no database required.
+"""
+
+import pytest
+from datetime import date
+import pendulum
+from postgrest.exceptions import APIError
+from app.services.attendance import (
+    count_manual_entries,
+    load_manual_counts,
+    estimate_remaining_classes,
+    build_student_rows,
+    apply_manual_counts,
+    derive_prediction,
+    diff_rows,
+    SUMMARY_CHECK_FIELDS
+)
+from tests.conftest import FakeDB
+
+
+SNAPSHOT = {
+    "id": "snap-1",
+    "confirmed_at": "2025-01-20T10:00:00+00:00",
+    "entries": [
+        {"course_code": "CS101", "class_type": "LECTURE", "present": 30, "total": 40},
+        {"subject_code": "CS102", "class_type": "LAB", "present": 8, "total": 10},
+    ]
+}
+
+SUBJECTS = [
+    {"id": "subj-1", "code": "CS101", "type": "LECTURE"},
+    {"id": "subj-2", "code": "CS102", "type": "LAB"},
+    {"id": "subj-3", "code": "CS103", "type": "LECTURE"},
+]
+
+
+def _build(**overrides):
+    kwargs = dict(
+        student_id="student-1",
+        batch_id="batch-1",
+        semester_id="sem-1",
+        snapshot=SNAPSHOT,
+        subjects=SUBJECTS,
+        manual_counts={},
+        previous_summaries={},
+        weekly_slots={},
+        semester_end=date(2025, 3, 3),
+        today=date(2025, 2, 1),
+        required_pct=75.0,
+        computed_at="2025-02-01T00:00:00+00:00"
+    )
+    kwargs.update(overrides)
+    return build_student_rows(**kwargs)
+
+
+class TestCountManualEntries:
+    """Tests for grouping manual entries per subject."""
+    
+    def test_counts_per_subject(self):
+        rows = [
+            {"subject_id": "a", "status": "PRESENT"},
+            {"subject_id": "a", "status": "ABSENT"},
+            {"subject_id": "a", "status": "CANCELLED"},
+            {"subject_id": "b", "status": "PRESENT"},
+        ]
+        counts = count_manual_entries(rows)
+        
+        assert counts["a"] == {"present": 1, "absent": 1, "total": 2}
+        assert counts["b"] == {"present": 1, "absent": 0, "total": 1}
+    
+    def test_empty(self):
+        assert count_manual_entries([]) == {}
+    
+    def test_grouped_rows(self):
+        rows = [
+            {"subject_id": "a", "class_type": "LECTURE", "status": "PRESENT", "entries": 12},
+            {"subject_id": "a", "class_type": "LAB", "status": "ABSENT", "entries": 3},
+            {"subject_id": "a", "class_type": "LECTURE", "status": "CANCELLED", "entries": 2},
+        ]
+        
+        assert count_manual_entries(rows)["a"] == {"present": 12, "absent": 3, "total": 15}
+
+
+GROUPED = [{"subject_id": "a", "class_type": "LECTURE", "status": "PRESENT", "entries": 40}]
+ROWS = [{"student_id": "student-1", "subject_id": "a", "status": "ABSENT"}]
+
+
+def _manual_db(rpc_installed=True, rpc_error=None):
+    """FakeDB answering the aggregation RPC, or failing it to exercise the fallback."""
+    def aggregate(query):
+        if rpc_error:
+            raise rpc_error
+        if not rpc_installed:
+            raise APIError({"code": "PGRST202", "message": "Could not find the function"})
+        return GROUPED
+    
+    return FakeDB({"aggregate_manual_attendance": aggregate, "manual_attendance": ROWS})
+
+
+class TestLoadManualCounts:
+    """One grouped RPC per student, row select only as a fallback."""
+    
+    SNAPSHOT_TIME = pendulum.parse("2025-01-20T10:00:00+00:00")
+    
+    async def test_uses_grouped_rpc(self):
+        db = _manual_db()
+        counts = await load_manual_counts(db, "student-1", self.SNAPSHOT_TIME)
+        
+        assert counts["a"]["present"] == 40
+        assert [(q.name, q.params) for q in db.queries] == [
+            ("aggregate_manual_attendance", {"p_student_id": "student-1", "p_after": "2025-01-20"})
+        ]
+        assert db.queries[0].filters == []
+    
+    async def test_falls_back_to_rows(self):
+        db = _manual_db(rpc_installed=False)
+        counts = await load_manual_counts(db, "student-1", self.SNAPSHOT_TIME)
+        
+        rows = db.queries[-1]
+        assert counts["a"] == {"present": 0, "absent": 1, "total": 1}
+        assert rows.name == "manual_attendance"
+        assert rows.filter_value("student_id") == "student-1"
+        assert rows.filter_value("event_date", "gt") == "2025-01-20"
+    
+    async def test_filters_to_subjects(self):
+        db = _manual_db()
+        await load_manual_counts(db, "student-1", self.SNAPSHOT_TIME, ["a"])
+        
+        assert db.queries[-1].filter_value("subject_id", "in") == ["a"]
+        
+        db = _manual_db(rpc_installed=False)
+        await load_manual_counts(db, "student-1", self.SNAPSHOT_TIME, ["a"])
+        
+        assert db.queries[-1].filter_value("subject_id", "in") == ["a"]
+    
+    async def test_other_rpc_errors_propagate(self):
+        db = _manual_db(rpc_error=APIError({"code": "57014", "message": "statement timeout"}))
+        
+        with pytest.raises(APIError):
+            await load_manual_counts(db, "student-1", self.SNAPSHOT_TIME)
+        
+        assert [q.action for q in db.queries] == ["rpc"]
+
+
+class TestEstimateRemainingClasses:
+    """Tests for the weekly-slot remaining estimate."""
+    
+    def test_whole_weeks(self):
+        # 30 days = 4 whole weeks
+        assert estimate_remaining_classes(3, date(2025, 3, 3), date(2025, 2, 1)) == 12
+    
+    def test_no_slots(self):
+        assert estimate_remaining_classes(0, date(2025, 3, 3), date(2025, 2, 1)) == 0
+    
+    def test_unknown_end_assumes_eight_weeks(self):
+        assert estimate_remaining_classes(2, None, date(2025, 2, 1)) == 16
+    
+    def test_past_end(self):
+        assert estimate_remaining_classes(2, date(2025, 1, 1), date(2025, 2, 1)) == 0
+
+
+class TestBuildStudentRows:
+    """Tests for computing every subject in memory."""
+    
+    def test_one_row_per_subject(self):
+        summaries, predictions = _build()
+        
+        assert [r["subject_id"] for r in summaries] == ["subj-1", "subj-2", "subj-3"]
+        assert [r["subject_id"] for r in predictions] == ["subj-1", "subj-2", "subj-3"]
+    
+    def test_snapshot_plus_manual(self):
+        summaries, _ = _build(
+            manual_counts={"subj-1": {"present": 2, "absent": 1, "total": 3}}
+        )
+        row = summaries[0]
+        
+        assert row["snapshot_present"] == 30
+        assert row["snapshot_total"] == 40
+        assert row["current_present"] == 32
+        assert row["current_total"] == 43
+        assert row["manual_absent"] == 1
+        assert row["snapshot_id"] == "snap-1"
+    
+    def test_subject_code_format_supported(self):
+        summaries, _ = _build()
+        
+        assert summaries[1]["snapshot_present"] == 8
+        assert summaries[1]["class_type"] == "LAB"
+    
+    def test_missing_subject_uses_previous_summary(self):
+        summaries, _ = _build(
+            previous_summaries={"subj-3": {"snapshot_present": 5, "snapshot_total": 6}}
+        )
+        
+        assert summaries[2]["snapshot_present"] == 5
+        assert summaries[2]["current_total"] == 6
+    
+    def test_missing_subject_without_history(self):
+        summaries, _ = _build()
+        
+        assert summaries[2]["current_total"] == 0
+        assert summaries[2]["current_percentage"] == 0.0
+    
+    def test_prediction_uses_weekly_slots(self):
+        _, predictions = _build(weekly_slots={"subj-1": 3})
+        
+        assert predictions[0]["remaining_classes"] == 12
+        assert predictions[1]["remaining_classes"] == 0
+        assert predictions[0]["status"] == "SAFE"
+    
+    def test_prediction_prefers_cumulative_counts(self):
+        # 2 classes a day from Jan 31: 4 held up to Feb 1 (today), 6 after
+        index = {"subj-1": {"total": 10, "start": date(2025, 1, 31), "cumulative": [2, 4, 6, 8, 10]}}
+        _, predictions = _build(weekly_slots={"subj-1": 3, "subj-2": 1}, remaining_index=index)
+        
+        assert predictions[0]["remaining_classes"] == 6
+        # No cumulative counts: weekly-slot estimate
+        assert predictions[1]["remaining_classes"] == 4
+
+
+class TestIncrementalCounts:
+    """Applying re-read manual counts must match a full rebuild, however often."""
+    
+    COMPUTED_AT = "2025-02-02T00:00:00+00:00"
+    
+    def _apply(self, counts, manual_before):
+        summaries, predictions = _build(
+            manual_counts=manual_before, weekly_slots={"subj-1": 3}
+        )
+        summary = apply_manual_counts(summaries[0], counts, self.COMPUTED_AT)
+        prediction = derive_prediction(summary, predictions[0], self.COMPUTED_AT)
+        return summary, prediction
+    
+    def _rebuild(self, manual_after):
+        summaries, predictions = _build(
+            manual_counts=manual_after, weekly_slots={"subj-1": 3}
+        )
+        return summaries[0], predictions[0]
+    
+    def _assert_matches(self, incremental, full):
+        for key in SUMMARY_CHECK_FIELDS + ("current_percentage",):
+            assert incremental[0][key] == full[0][key], key
+        for key in ("current_present", "current_total", "must_attend", "can_bunk", "status"):
+            assert incremental[1][key] == full[1][key], key
+    
+    def test_insert(self):
+        after = {"subj-1": {"present": 0, "absent": 1, "total": 1}}
+        
+        self._assert_matches(self._apply(after, {}), self._rebuild(after))
+    
+    def test_already_counted_by_full_recompute(self):
+        # A full recompute ran after the write: replaying its delta must not double count
+        after = {"subj-1": {"present": 2, "absent": 1, "total": 3}}
+        
+        self._assert_matches(self._apply(after, after), self._rebuild(after))
+    
+    def test_no_entries_left(self):
+        before = {"subj-1": {"present": 2, "absent": 0, "total": 2}}
+        summary, _ = self._apply({}, before)
+        
+        assert summary["manual_total"] == 0
+        assert summary["current_total"] == 40
+    
+    def test_other_subject_ignored(self):
+        summary, _ = self._apply({"subj-2": {"present": 1, "absent": 0, "total": 1}}, {})
+        
+        assert summary["current_present"] == 30
+
+
+class TestDiffRows:
+    """Tests for the consistency checker comparison."""
+    
+    def test_consistent(self):
+        summaries, _ = _build()
+        assert diff_rows("attendance_summary", summaries, summaries, SUMMARY_CHECK_FIELDS) == []
+    
+    def test_reports_field_and_missing_row(self):
+        summaries, _ = _build()
+        stored = [dict(summaries[0], manual_present=3), summaries[1]]
+        mismatches = diff_rows("attendance_summary", summaries, stored, SUMMARY_CHECK_FIELDS)
+        
+        assert {"table": "attendance_summary", "subject_id": "subj-1",
+                "field": "manual_present", "stored": 3, "expected": 0} in mismatches
+        assert mismatches[-1]["subject_id"] == "subj-3"
+        assert mismatches[-1]["field"] is None
+
+
+class TestConsistencyEndpoints:
+    """The check is a safe GET; only the POST repair recomputes."""
+    
+    REPORT = {"student_id": "s1", "consistent": False, "subjects_checked": 2, "mismatches": []}
+    
+    @pytest.fixture
+    def client(self, make_client, monkeypatch):
+        from app.core.auth import AuthenticatedUser, get_current_user
+        from app.routers import engine
+        
+        recomputed = []
+        
+        async def fake_check(db, student_id):
+            return dict(self.REPORT)
+        
+        async def fake_recompute(db, student_id, trigger):
+            recomputed.append(student_id)
+        
+        async def admin():
+            return AuthenticatedUser(user_id="admin", is_admin=True)
+        
+        monkeypatch.setattr(engine, "check_consistency", fake_check)
+        monkeypatch.setattr(engine, "recompute_for_student", fake_recompute)
+        client = make_client(FakeDB(), engine.router)
+        client.app.dependency_overrides[get_current_user] = admin
+        client.recomputed = recomputed
+        return client
+    
+    def test_check_does_not_repair(self, client):
+        response = client.get("/engine/admin/consistency/s1", params={"repair": "true"})
+        
+        assert response.status_code == 200
+        assert response.json()["repaired"] is False
+        assert client.recomputed == []
+    
+    def test_repair_recomputes_inconsistent_student(self, client):
+        response = client.post("/engine/admin/consistency/s1/repair")
+        
+        assert response.json()["repaired"] is True
+        assert client.recomputed == ["s1"]
+    
+    def test_repair_is_not_a_get(self, client):
+        assert client.get("/engine/admin/consistency/s1/repair").status_code == 405
+
+
+class TestRecomputeBatch:
+    """Tests for batch fan-out with shared batch data."""
+    
+    USERS = [
+        {"student_id": "s1", "current_batch_id": "b1", "current_semester_id": "sem"},
+        {"student_id": "s2", "current_batch_id": "b1", "current_semester_id": "sem"},
+        {"student_id": "s3", "current_batch_id": "b2", "current_semester_id": "sem"},
+        {"student_id": None, "current_batch_id": "b1", "current_semester_id": "sem"},
+    ]
+    
+    @pytest.fixture
+    def patched(self, monkeypatch):
+        import asyncio
+        from app.services import attendance
+        from app.models.enums import ComputeStatus
+        
+        calls = {"loads": [], "in_flight": 0, "peak": 0}
+        
+        async def fake_load(db, batch_id, semester_id):
+            calls["loads"].append((batch_id, semester_id))
+            return {"batch_id": batch_id, "semester_id": semester_id}
+        
+        async def fake_recompute(db, student_id, trigger, context=None, batch_data=None):
+            calls["in_flight"] += 1
+            calls["peak"] = max(calls["peak"], calls["in_flight"])
+            await asyncio.sleep(0.01)
+            calls["in_flight"] -= 1
+            assert batch_data["batch_id"] == context["batch_id"]
+            if student_id == "s2":
+                raise ValueError("boom")
+            return 4, ComputeStatus.SUCCESS
+        
+        monkeypatch.setattr(attendance, "load_batch_data", fake_load)
+        monkeypatch.setattr(attendance, "recompute_for_student", fake_recompute)
+        return calls
+    
+    async def test_semester_scope(self, patched):
+        from app.services.attendance import recompute_batch
+        
+        result = await recompute_batch(FakeDB({"app_users": self.USERS}), semester_id="sem", concurrency=1)
+        
+        assert result["students_processed"] == 2
+        assert result["students_failed"] == 1
+        assert result["subjects_updated"] == 8
+        assert result["groups"] == 2
+        assert sorted(patched["loads"]) == [("b1", "sem"), ("b2", "sem")]
+        assert patched["peak"] == 1
+    
+    async def test_batch_scope_reports_failures(self, patched):
+        from app.services.attendance import recompute_batch
+        
+        result = await recompute_batch(FakeDB({"app_users": self.USERS}), batch_id="b1", concurrency=5)
+        failed = [r for r in result["results"] if r["error"]]
+        
+        assert [r["student_id"] for r in result["results"]] == ["s1", "s2"]
+        assert failed[0]["student_id"] == "s2"
+        assert failed[0]["status"] == "FAILED"
+        assert patched["loads"] == [("b1", "sem")]
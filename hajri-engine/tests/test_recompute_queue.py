@@ -0,0 +1,248 @@
+"""
+Tests for the recompute job queue.
+The recompute itself is replaced by a recorder - no database required.
+"""
+
+import asyncio
+import pytest
+from app.models.enums import ComputeTrigger, ComputeStatus
+from app.services.recompute_queue import RecomputeQueue, SQLiteJobStore
+
+
+class Recorder:
+    """Stand-in for recompute_for_student that records its calls."""
+    
+    def __init__(self, delay: float = 0.0, fail_for=()):
+        self.calls = []
+        self.delay = delay
+        self.fail_for = set(fail_for)
+    
+    async def __call__(self, db, student_id, trigger, trigger_id=None, trigger_ids=None, **baseline):
+        self.calls.append((student_id, trigger, trigger_id))
+        self.trigger_ids = trigger_ids
+        self.baseline = baseline
+        await asyncio.sleep(self.delay)
+        if student_id in self.fail_for:
+            raise RuntimeError("boom")
+        return 1, ComputeStatus.SUCCESS
+
+
+class IncrementalRecorder:
+    """Stand-in for recompute_incremental that records the deltas it gets."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    async def __call__(self, db, student_id, deltas, trigger_id=None, trigger_ids=None):
+        self.calls.append((student_id, list(deltas)))
+        return 1, ComputeStatus.SUCCESS
+
+
+def _delta(n):
+    return {"subject_id": "sub", "event_date": f"2025-02-0{n}", "old_status": None, "new_status": "PRESENT"}
+
+
+class TestCoalescing:
+    """Pending triggers for one student collapse into one job."""
+    
+    async def test_burst_runs_once(self):
+        recorder = Recorder()
+        queue = RecomputeQueue(workers=2, recompute_fn=recorder)
+        
+        for i in range(6):
+            await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, f"e{i}")
+        await queue.start(db=None)
+        await queue.join()
+        await queue.stop()
+        
+        assert recorder.calls == [("s1", ComputeTrigger.MANUAL_ENTRY, "e5")]
+        assert queue.stats()["coalesced"] == 5
+    
+    async def test_snapshot_trigger_wins(self):
+        recorder = Recorder()
+        queue = RecomputeQueue(workers=1, recompute_fn=recorder)
+        
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e1")
+        await queue.enqueue("s1", ComputeTrigger.SNAPSHOT_CONFIRM, "snap")
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e2")
+        await queue.start(db=None)
+        await queue.join()
+        await queue.stop()
+        
+        assert recorder.calls[0][1] == ComputeTrigger.SNAPSHOT_CONFIRM
+    
+    async def test_trigger_during_run_reruns(self):
+        recorder = Recorder(delay=0.05)
+        queue = RecomputeQueue(workers=4, recompute_fn=recorder)
+        await queue.start(db=None)
+        
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e1")
+        await asyncio.sleep(0.01)
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e2")
+        await queue.join()
+        await queue.stop()
+        
+        # Never two runs at once for one student, but the late trigger is not lost
+        assert [c[2] for c in recorder.calls] == ["e1", "e2"]
+
+
+class TestIncremental:
+    """Manual entry deltas take the incremental path unless a full trigger joins."""
+    
+    async def test_deltas_run_incrementally(self):
+        full, incremental = Recorder(), IncrementalRecorder()
+        queue = RecomputeQueue(workers=1, recompute_fn=full, incremental_fn=incremental)
+        
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e1", delta=_delta(1))
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e2", delta=_delta(2))
+        await queue.start(db=None)
+        await queue.join()
+        await queue.stop()
+        
+        assert full.calls == []
+        assert incremental.calls == [("s1", [_delta(1), _delta(2)])]
+        assert queue.stats()["incremental"] == 1
+    
+    async def test_bulk_deltas_one_job(self):
+        full, incremental = Recorder(), IncrementalRecorder()
+        queue = RecomputeQueue(workers=1, recompute_fn=full, incremental_fn=incremental)
+        
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "bulk", deltas=[_delta(1), _delta(2)])
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e3", delta=_delta(3))
+        await queue.start(db=None)
+        await queue.join()
+        await queue.stop()
+        
+        assert incremental.calls == [("s1", [_delta(1), _delta(2), _delta(3)])]
+    
+    async def test_snapshot_forces_full(self):
+        full, incremental = Recorder(), IncrementalRecorder()
+        queue = RecomputeQueue(workers=1, recompute_fn=full, incremental_fn=incremental)
+        
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e1", delta=_delta(1))
+        await queue.enqueue("s1", ComputeTrigger.SNAPSHOT_CONFIRM, "snap")
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e2", delta=_delta(2))
+        await queue.start(db=None)
+        await queue.join()
+        await queue.stop()
+        
+        assert incremental.calls == []
+        assert full.calls == [("s1", ComputeTrigger.SNAPSHOT_CONFIRM, "e2")]
+    
+    async def test_snapshot_baseline_handed_over(self):
+        full = Recorder()
+        queue = RecomputeQueue(workers=1, recompute_fn=full)
+        context = {"batch_id": "b1", "semester_id": "sem"}
+        
+        await queue.enqueue("s1", ComputeTrigger.SNAPSHOT_CONFIRM, "snap-1",
+                            snapshot={"id": "snap-1"}, context=context)
+        await queue.enqueue("s1", ComputeTrigger.SNAPSHOT_CONFIRM, "snap-2",
+                            snapshot={"id": "snap-2"}, context=context)
+        await queue.start(db=None)
+        await queue.join()
+        await queue.stop()
+        
+        assert full.baseline == {"snapshot": {"id": "snap-2"}, "context": context}
+
+
+class TestDebounce:
+    """Triggers inside the debounce window share one recompute."""
+    
+    async def test_burst_within_window(self):
+        recorder = Recorder()
+        queue = RecomputeQueue(workers=2, debounce_seconds=0.05, recompute_fn=recorder)
+        await queue.start(db=None)
+        
+        for i in range(6):
+            await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, f"e{i}")
+            await asyncio.sleep(0.002)
+        assert recorder.calls == []
+        
+        await queue.join()
+        await queue.stop()
+        
+        assert len(recorder.calls) == 1
+        assert recorder.trigger_ids == [f"e{i}" for i in range(6)]
+    
+    async def test_separate_windows(self):
+        recorder = Recorder()
+        queue = RecomputeQueue(workers=1, debounce_seconds=0.02, recompute_fn=recorder)
+        await queue.start(db=None)
+        
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e1")
+        await queue.join()
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e2")
+        await queue.join()
+        await queue.stop()
+        
+        assert [c[2] for c in recorder.calls] == ["e1", "e2"]
+    
+    async def test_students_debounced_independently(self):
+        recorder = Recorder()
+        queue = RecomputeQueue(workers=2, debounce_seconds=0.02, recompute_fn=recorder)
+        await queue.start(db=None)
+        
+        await queue.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "a")
+        await queue.enqueue("s2", ComputeTrigger.MANUAL_ENTRY, "b")
+        await queue.join()
+        await queue.stop()
+        
+        assert sorted(c[0] for c in recorder.calls) == ["s1", "s2"]
+
+
+class TestWorkers:
+    """Bounded workers and failure accounting."""
+    
+    async def test_failures_counted(self):
+        recorder = Recorder(fail_for={"s2"})
+        queue = RecomputeQueue(workers=2, recompute_fn=recorder)
+        await queue.start(db=None)
+        
+        for student in ("s1", "s2", "s3"):
+            await queue.enqueue(student, ComputeTrigger.MANUAL_ENTRY)
+        await queue.join()
+        stats = queue.stats()
+        await queue.stop()
+        
+        assert stats["processed"] == 2
+        assert stats["failed"] == 1
+        assert stats["depth"] == 0
+        assert stats["workers"] == 2
+
+
+class TestPersistence:
+    """SQLite-backed jobs survive a restart."""
+    
+    async def test_pending_jobs_restored(self, tmp_path):
+        path = str(tmp_path / "jobs.db")
+        
+        first = RecomputeQueue(workers=1, store=SQLiteJobStore(path), recompute_fn=Recorder())
+        await first.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e1")
+        await first.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e2")
+        # Process dies before any worker ran
+        
+        recorder = Recorder()
+        second = RecomputeQueue(workers=1, store=SQLiteJobStore(path), recompute_fn=recorder)
+        await second.start(db=None)
+        await second.join()
+        await second.stop()
+        
+        assert recorder.calls == [("s1", ComputeTrigger.MANUAL_ENTRY, "e2")]
+        assert SQLiteJobStore(path).load_all() == []
+    
+    async def test_deltas_restored(self, tmp_path):
+        path = str(tmp_path / "jobs.db")
+        
+        first = RecomputeQueue(workers=1, store=SQLiteJobStore(path))
+        await first.enqueue("s1", ComputeTrigger.MANUAL_ENTRY, "e1", delta=_delta(1))
+        
+        incremental = IncrementalRecorder()
+        second = RecomputeQueue(
+            workers=1, store=SQLiteJobStore(path),
+            recompute_fn=Recorder(), incremental_fn=incremental
+        )
+        await second.start(db=None)
+        await second.join()
+        await second.stop()
+        
+        assert incremental.calls == [("s1", [_delta(1)])]
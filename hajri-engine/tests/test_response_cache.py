@@ -0,0 +1,147 @@
+"""
+Tests for the versioned response cache and ETags.
+Redis is replaced by a dict-backed stand-in - no server required.
+"""
+
+import pytest
+from pydantic import BaseModel
+from starlette.requests import Request
+
+from app.core.response_cache import ResponseCache, MemoryBackend, RedisBackend
+
+
+class Body(BaseModel):
+    value: int
+
+
+class FakeRedis:
+    """Async stand-in for the few redis.asyncio.Redis calls the backend makes."""
+    
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+    
+    async def get(self, key):
+        return self.data.get(key)
+    
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+    
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1)
+
+
+class BrokenBackend(MemoryBackend):
+    async def get_version(self, key):
+        raise ConnectionError("cache down")
+
+
+def _request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    backend = MemoryBackend() if request.param == "memory" else RedisBackend(client=FakeRedis())
+    return ResponseCache(backend, ttl_seconds=60)
+
+
+class Builder:
+    def __init__(self):
+        self.calls = 0
+    
+    async def __call__(self):
+        self.calls += 1
+        return Body(value=self.calls)
+
+
+async def _get(cache, build, request=None, batch="b1"):
+    return await cache.respond(request or _request(), "dashboard", "s1", batch, "sem", build)
+
+
+class TestResponseCache:
+    """Read-through caching keyed by recompute version."""
+    
+    async def test_second_read_is_cached(self, cache):
+        build = Builder()
+        first = await _get(cache, build)
+        second = await _get(cache, build)
+        
+        assert build.calls == 1
+        assert first.body == second.body == b'{"value":1}'
+        assert second.headers["X-Cache"] == "HIT"
+        assert first.headers["ETag"] == second.headers["ETag"]
+    
+    async def test_recompute_invalidates_student(self, cache):
+        build = Builder()
+        await _get(cache, build)
+        await cache.invalidate_student("s1")
+        response = await _get(cache, build)
+        
+        assert build.calls == 2
+        assert response.body == b'{"value":2}'
+    
+    async def test_semester_totals_invalidate_batch(self, cache):
+        build = Builder()
+        await _get(cache, build)
+        await cache.invalidate_batch("other")
+        await _get(cache, build)
+        await cache.invalidate_batch("b1")
+        await _get(cache, build)
+        
+        assert build.calls == 2
+    
+    async def test_if_none_match_returns_304(self, cache):
+        build = Builder()
+        etag = (await _get(cache, build)).headers["ETag"]
+        
+        response = await _get(cache, build, _request(etag))
+        
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["ETag"] == etag
+        assert cache.stats()["not_modified"] == 1
+    
+    async def test_stale_etag_gets_new_body(self, cache):
+        build = Builder()
+        etag = (await _get(cache, build)).headers["ETag"]
+        await cache.invalidate_student("s1")
+        
+        response = await _get(cache, build, _request(etag))
+        
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+    
+    async def test_backend_failure_falls_back_to_build(self):
+        cache = ResponseCache(BrokenBackend())
+        build = Builder()
+        
+        response = await _get(cache, build)
+        await cache.invalidate_student("s1")
+        
+        assert response.status_code == 200
+        assert build.calls == 1
+        assert cache.stats()["errors"] == 1
+    
+    async def test_memory_versions_bounded_and_never_reused(self):
+        backend = MemoryBackend(maxsize=2)
+        cache = ResponseCache(backend)
+        build = Builder()
+        await _get(cache, build)
+        
+        # Evict s1's version: it must not fall back to the value its entry has
+        for student in ("s2", "s3", "s4"):
+            await cache.invalidate_student(student)
+        await _get(cache, build)
+        
+        assert len(backend.versions) == 2
+        assert build.calls == 2
+    
+    async def test_redis_entries_expire(self):
+        client = FakeRedis()
+        cache = ResponseCache(RedisBackend(client=client), ttl_seconds=90)
+        await _get(cache, Builder())
+        
+        assert [ttl for key, ttl in client.ttls.items() if key.startswith("hajri:resp:")] == [90]
@@ -0,0 +1,409 @@
+"""
+Tests for the semester totals calendar engine.
+Each result is checked against a plain day-by-day walk - no database required.
+"""
+
+import random
+import pytest
+from datetime import date, timedelta
+from app.services.semester_totals import (
+    weekday_counts,
+    dates_on_weekday,
+    teaching_days_by_weekday,
+    count_subject_classes,
+    compute_non_teaching_dates,
+    is_saturday_off,
+    teaching_weekdays,
+    cumulative_classes,
+    remaining_classes_after
+)
+from tests.conftest import FakeDB
+
+
+def _walk(start, end):
+    current = start
+    while current <= end:
+        yield current
+        current += timedelta(days=1)
+
+
+def _calendar(**overrides):
+    calendar = {
+        "academic_year_id": "ay-1",
+        "weekly_settings": {"sunday_off": True, "saturday_pattern": "2nd_4th"},
+        "holidays": [
+            {"event_date": "2025-01-26", "title": "Republic Day"},
+            {"event_date": "2025-03-13", "end_date": "2025-03-15", "title": "Holi"},
+        ],
+        "vacations": [{"start_date": "2025-04-20", "end_date": "2025-06-10", "name": "Summer"}],
+        "exams": [{"start_date": "2025-03-03", "end_date": "2025-03-08", "name": "Mid Sem"}],
+    }
+    calendar.update(overrides)
+    return calendar
+
+
+class TestWeekdayCounts:
+    """The weekday-count formula matches a day-by-day walk."""
+    
+    def test_random_ranges(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            start = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+            end = start + timedelta(days=rng.randrange(200))
+            expected = [0] * 7
+            for day in _walk(start, end):
+                expected[day.weekday()] += 1
+            assert weekday_counts(start, end) == expected
+    
+    def test_empty_range(self):
+        assert weekday_counts(date(2025, 2, 2), date(2025, 2, 1)) == [0] * 7
+    
+    def test_dates_on_weekday(self):
+        sundays = dates_on_weekday(date(2025, 2, 1), date(2025, 2, 28), 6)
+        assert sundays == [date(2025, 2, 2), date(2025, 2, 9), date(2025, 2, 16), date(2025, 2, 23)]
+
+
+class TestSaturdayPattern:
+    """nth-Saturday arithmetic."""
+    
+    @pytest.mark.parametrize("day, pattern, expected", [
+        (date(2025, 2, 1), "1st_3rd", True),
+        (date(2025, 2, 8), "1st_3rd", False),
+        (date(2025, 2, 8), "2nd_4th", True),
+        (date(2025, 3, 29), "odd", True),
+        (date(2025, 3, 29), "even", False),
+        (date(2025, 2, 3), "all", False),
+    ])
+    def test_patterns(self, day, pattern, expected):
+        assert is_saturday_off(day, pattern) is expected
+
+
+class TestSemesterTotals:
+    """Per-subject totals from weekday counts match a day-by-day walk."""
+    
+    START = date(2025, 1, 6)
+    END = date(2025, 5, 30)
+    
+    def test_non_teaching_dates(self):
+        dates, breakdown = compute_non_teaching_dates(self.START, self.END, _calendar())
+        
+        assert date(2025, 1, 26) in dates
+        assert date(2025, 3, 14) in dates
+        assert date(2025, 2, 8) in dates       # 2nd Saturday
+        assert date(2025, 2, 1) not in dates   # 1st Saturday
+        assert date(2025, 5, 1) in dates       # Summer vacation
+        assert len(dates) == len(set(dates))
+        assert breakdown["vacations"][0]["end_date"] == "2025-05-30"
+    
+    def test_other_weekly_offs_sorted(self):
+        calendar = _calendar(weekly_settings={"sunday_off": True, "monday_off": True, "friday_off": True})
+        _, breakdown = compute_non_teaching_dates(self.START, self.END, calendar)
+        offs = [o["date"] for o in breakdown["other_weekly_offs"]]
+        
+        assert offs == sorted(offs)
+        assert breakdown["other_weekly_offs"][0] == {"date": "2025-01-06", "day": "Monday"}
+    
+    def test_totals_match_day_walk(self):
+        dates, _ = compute_non_teaching_dates(self.START, self.END, _calendar())
+        non_teaching = set(dates)
+        teaching_days = teaching_days_by_weekday(self.START, self.END, dates)
+        day_slots = {0: 2, 2: 1, 5: 1}
+        
+        expected_total = 0
+        expected_days = {w: 0 for w in range(7)}
+        for day in _walk(self.START, self.END):
+            if day not in non_teaching and day.weekday() in day_slots:
+                expected_total += day_slots[day.weekday()]
+                expected_days[day.weekday()] += 1
+        
+        assert count_subject_classes(day_slots, teaching_days) == (expected_total, expected_days)
+
+
+class TestRemainingClasses:
+    """Cumulative counts agree with the semester total and a day walk."""
+    
+    START = date(2025, 1, 6)
+    END = date(2025, 5, 30)
+    DAY_SLOTS = {0: 2, 2: 1, 5: 1}
+    
+    @pytest.fixture
+    def cumulative(self):
+        dates, _ = compute_non_teaching_dates(self.START, self.END, _calendar())
+        return cumulative_classes(self.DAY_SLOTS, teaching_weekdays(self.START, self.END, dates)), set(dates)
+    
+    def test_last_value_is_total(self, cumulative):
+        counts, non_teaching = cumulative
+        teaching_days = teaching_days_by_weekday(self.START, self.END, non_teaching)
+        
+        assert len(counts) == (self.END - self.START).days + 1
+        assert counts[-1] == count_subject_classes(self.DAY_SLOTS, teaching_days)[0]
+    
+    def test_remaining_matches_day_walk(self, cumulative):
+        counts, non_teaching = cumulative
+        for on_date in [date(2025, 1, 26), date(2025, 3, 10), date(2025, 4, 19)]:
+            expected = sum(
+                self.DAY_SLOTS.get(day.weekday(), 0)
+                for day in _walk(on_date + timedelta(days=1), self.END)
+                if day not in non_teaching
+            )
+            assert remaining_classes_after(counts, self.START, on_date) == expected
+    
+    def test_outside_semester(self, cumulative):
+        counts, _ = cumulative
+        
+        assert remaining_classes_after(counts, self.START, date(2025, 1, 1)) == counts[-1]
+        assert remaining_classes_after(counts, self.START, self.END) == 0
+        assert remaining_classes_after([], self.START, self.START) == 0
+
+
+CALENDAR_ROWS = {
+    "academic_years": [{"id": "ay-1", "start_date": "2024-07-01", "end_date": "2025-06-30"}],
+    "weekly_off_days": [{"day_of_week": 0, "is_off": True}],
+    "calendar_events": [{"event_date": "2025-01-26", "title": "Republic Day"}],
+    "vacation_periods": [],
+    "exam_periods": [],
+    "semesters": [{"id": "sem-1", "start_date": "2025-01-06", "end_date": "2025-05-30"}],
+}
+
+
+def _calendar_db(**tables):
+    """FakeDB answering every calendar query; tables replace CALENDAR_ROWS entries."""
+    return FakeDB(dict(CALENDAR_ROWS, **tables))
+
+
+def _reads(db, table):
+    return len(db.executed(table))
+
+
+class TestCalendarCache:
+    """Batches sharing an academic year compute its calendar once."""
+    
+    async def test_calendar_loaded_once(self):
+        import asyncio
+        from app.services.semester_totals import CalendarCache
+        
+        db = _calendar_db()
+        cache = CalendarCache()
+        start, end = date(2025, 1, 6), date(2025, 5, 30)
+        
+        results = await asyncio.gather(*[
+            cache.get_non_teaching_dates(db, start, end, f"batch-{i}") for i in range(5)
+        ])
+        
+        assert all(r == results[0] for r in results)
+        assert _reads(db, "academic_years") == 1
+        assert _reads(db, "calendar_events") == 1
+        assert _reads(db, "weekly_off_days") == 1
+        assert cache.stats()["calendars"] == {"size": 1, "hits": 4, "misses": 1}
+    
+    async def test_teaching_period_cached_per_semester(self):
+        from app.services.semester_totals import CalendarCache
+        
+        db = _calendar_db()
+        cache = CalendarCache()
+        for _ in range(3):
+            period = await cache.get_teaching_period(db, "sem-1")
+        
+        assert period["start_date"] == "2025-01-06"
+        assert _reads(db, "semesters") == 1
+        assert db.executed("semesters")[0].filter_value("id") == "sem-1"
+    
+    async def test_run_refreshes_shared_index_without_clearing(self, monkeypatch):
+        from app.services import semester_totals
+        
+        shared = semester_totals.TeachingCalendarIndex()
+        monkeypatch.setattr(semester_totals, "_teaching_calendars", shared)
+        shared.calendars.set("ay-other", "kept")
+        db = _calendar_db()
+        
+        first = semester_totals.get_calendar_cache()
+        second = semester_totals.get_calendar_cache()
+        await first.get_non_teaching_dates(db, date(2025, 1, 6), date(2025, 5, 30))
+        
+        # Each run reads its own calendar; the shared index gets it, keeps the rest
+        assert first.index is not second.index
+        assert shared.calendars.get("ay-other") == "kept"
+        assert shared.calendars.get("ay-1") is first.index.calendars.get("ay-1")
+        assert await shared.is_teaching_day(db, date(2025, 1, 27))
+        assert _reads(db, "calendar_events") == 1
+
+
+class TestTeachingCalendarIndex:
+    """One calendar per academic year answers every date and range in it."""
+    
+    async def test_year_loaded_once(self):
+        from app.services.semester_totals import TeachingCalendarIndex
+        
+        db = _calendar_db()
+        index = TeachingCalendarIndex()
+        days = [date(2025, 1, 24), date(2025, 1, 25), date(2025, 1, 26), date(2025, 1, 27)]
+        
+        teaching = [await index.is_teaching_day(db, day) for day in days]
+        
+        # Friday, Saturday (all off by default), Republic Day, Monday
+        assert teaching == [True, False, False, True]
+        assert _reads(db, "academic_years") == 1
+        assert _reads(db, "calendar_events") == 1
+    
+    async def test_range_matches_direct_computation(self):
+        from app.services.semester_totals import TeachingCalendarIndex, load_calendar_data
+        
+        db = _calendar_db()
+        start, end = date(2025, 1, 6), date(2025, 5, 30)
+        
+        cached = await TeachingCalendarIndex().non_teaching_dates(db, start, end)
+        calendar = await load_calendar_data(db, "ay-1", start, end)
+        direct = compute_non_teaching_dates(start, end, calendar)
+        
+        assert cached[0] == direct[0]
+        assert cached[2] == direct[1]
+    
+    async def test_no_academic_year_uses_defaults(self):
+        from app.services.semester_totals import TeachingCalendarIndex
+        
+        db = _calendar_db()
+        index = TeachingCalendarIndex()
+        
+        assert await index.is_teaching_day(db, date(2030, 1, 7))
+        assert not await index.is_teaching_day(db, date(2030, 1, 6))
+        assert not db.executed("calendar_events")
+    
+    async def test_invalidate_reloads(self):
+        from app.services.semester_totals import TeachingCalendarIndex
+        
+        db = _calendar_db()
+        index = TeachingCalendarIndex()
+        await index.is_teaching_day(db, date(2025, 1, 27))
+        index.invalidate("ay-1")
+        await index.is_teaching_day(db, date(2025, 1, 27))
+        
+        assert _reads(db, "calendar_events") == 2
+    
+    async def test_days_across_year_boundary(self):
+        from app.services.semester_totals import TeachingCalendarIndex
+        
+        db = _calendar_db(
+            academic_years=[
+                {"id": "ay-1", "start_date": "2024-07-01", "end_date": "2025-06-30"},
+                {"id": "ay-2", "start_date": "2025-07-01", "end_date": "2026-06-30"},
+            ],
+            calendar_events=[
+                {"event_date": "2025-06-16", "title": "Exam day"},
+                {"event_date": "2025-07-15", "title": "Foundation Day"},
+            ],
+        )
+        days = [date(2025, 6, 16), date(2025, 6, 17), date(2025, 7, 15)]
+        
+        off = await TeachingCalendarIndex().non_teaching_days(db, days)
+        
+        # No single year covers the range, but each holiday is still caught
+        assert off == {date(2025, 6, 16), date(2025, 7, 15)}
+        assert _reads(db, "calendar_events") == 2
+
+
+class TestBulkTotals:
+    """Concurrent fan-out and grouped upserts."""
+    
+    async def test_bounded_concurrency_and_failures(self, monkeypatch):
+        import asyncio
+        from app.services import semester_totals
+        
+        state = {"in_flight": 0, "peak": 0}
+        
+        async def fake_calculate(db, batch_id, semester_id, calendar_cache=None):
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            await asyncio.sleep(0.01)
+            state["in_flight"] -= 1
+            if batch_id == "b3":
+                raise RuntimeError("boom")
+            return {"subj": {"class_type": "LECTURE"}}
+        
+        monkeypatch.setattr(semester_totals, "calculate_semester_totals", fake_calculate)
+        targets = [(f"b{i}", "sem") for i in range(6)]
+        
+        outcomes = await semester_totals.calculate_semester_totals_many(None, targets, concurrency=2)
+        
+        assert [o["batch_id"] for o in outcomes] == [b for b, _ in targets]
+        assert state["peak"] == 2
+        assert outcomes[3]["error"] == "boom"
+        assert outcomes[0]["totals"] == {"subj": {"class_type": "LECTURE"}}
+    
+    async def test_rows_upserted_in_chunks(self):
+        from app.services.semester_totals import semester_total_rows, upsert_semester_total_rows
+        
+        totals = {
+            f"subj-{i}": {
+                "class_type": "LECTURE",
+                "slots_per_week": 3,
+                "total_classes_in_semester": 45,
+                "calculation_details": {}
+            }
+            for i in range(5)
+        }
+        rows = semester_total_rows("b1", "sem", totals, "now") + semester_total_rows("b2", "sem", totals, "now")
+        db = _upsert_db(reject={("b2", "subj-1")})
+        
+        outcomes = await upsert_semester_total_rows(db, rows, chunk_size=4)
+        
+        # b2/subj-1 sits in the 2nd chunk: rejected, retried row by row
+        assert _chunk_sizes(db) == [4, 4, 1, 1, 1, 1, 2]
+        assert {q.on_conflict for q in db.executed("semester_subject_totals")} == {"batch_id,semester_id,subject_id"}
+        assert [o["subject_id"] for o in outcomes] == [r["subject_id"] for r in rows]
+        failed = [o for o in outcomes if o["status"] == "failed"]
+        assert [(o["batch_id"], o["subject_id"]) for o in failed] == [("b2", "subj-1")]
+        assert outcomes[0]["id"] == "b1:subj-0"
+        # Read models of both batches are dropped: their expected totals changed
+        dropped = db.executed("student_read_models", "delete")
+        assert sorted((q.filter_value("batch_id"), q.filter_value("semester_id")) for q in dropped) == [
+            ("b1", "sem"), ("b2", "sem")
+        ]
+    
+    async def test_persist_semester_totals_single_request(self):
+        from app.services.semester_totals import persist_semester_totals
+        
+        totals = {
+            f"subj-{i}": {
+                "class_type": "LAB",
+                "slots_per_week": 1,
+                "total_classes_in_semester": 15,
+                "calculation_details": {}
+            }
+            for i in range(12)
+        }
+        db = _upsert_db()
+        
+        outcomes = await persist_semester_totals(db, "b1", "sem", totals)
+        
+        assert _chunk_sizes(db) == [12]
+        assert all(o["status"] == "upserted" for o in outcomes)
+
+
+def _upsert_db(reject=()):
+    """FakeDB that rejects any semester_subject_totals chunk containing a row in `reject`."""
+    def totals(query):
+        if any((r["batch_id"], r["subject_id"]) in reject for r in query.payload):
+            raise RuntimeError("violates check constraint")
+        return [dict(r, id=f"{r['batch_id']}:{r['subject_id']}") for r in query.payload]
+    
+    return FakeDB({"semester_subject_totals": totals})
+
+
+def _chunk_sizes(db):
+    return [len(q.payload) for q in db.executed("semester_subject_totals", "upsert")]
+
+
+class TestLatencyPercentiles:
+    """Nearest-rank latency summary."""
+    
+    def test_percentiles(self):
+        from app.core.metrics import latency_percentiles
+        
+        summary = latency_percentiles(range(1, 101))
+        
+        assert summary == {"count": 100, "p50": 50, "p90": 90, "p99": 99, "max": 100}
+    
+    def test_empty(self):
+        from app.core.metrics import latency_percentiles
+        
+        assert latency_percentiles([])["p99"] == 0
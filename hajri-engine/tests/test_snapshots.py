@@ -0,0 +1,308 @@
+"""
+Tests for snapshot confirmation and OCR subject code matching.
+These run against FakeDB - no database required.
+"""
+
+import pytest
+from datetime import datetime
+from postgrest.exceptions import APIError
+
+from app.core.pagination import encode_cursor, decode_cursor
+from app.models.schemas import SnapshotConfirmRequest
+from app.routers import snapshots as snapshots_router
+from app.services import snapshots
+from app.services.snapshots import (
+    build_subject_code_index,
+    match_subject_code,
+    confirm_snapshot_pipeline,
+    diff_snapshot_entries,
+    find_snapshot_decreases,
+    get_snapshot_history,
+    snapshot_percentages
+)
+from tests.conftest import FakeDB
+
+
+MAPPINGS = [{"ocr_code": "DS-LAB", "subject_id": "subj-3"}]
+SUBJECTS = [
+    {"id": "subj-1", "code": "CS101"},
+    {"id": "subj-2", "code": "ma201"},
+    {"id": "subj-3", "code": "CS103"},
+]
+
+
+def _snapshot_db(previous=None):
+    """
+    FakeDB with the subject catalogue and ocr_snapshots: the latest read
+    returns previous and an insert comes back as snap-2.
+    """
+    def ocr_snapshots(query):
+        if query.action == "insert":
+            return [dict(query.payload, id="snap-2")]
+        return [previous] if previous else []
+    
+    return FakeDB({
+        "subject_code_mappings": list(MAPPINGS),
+        "subjects": list(SUBJECTS),
+        "ocr_snapshots": ocr_snapshots,
+    })
+
+
+def _lookups(db):
+    """Subject catalogue reads, in order."""
+    return [q.name for q in db.queries if q.name in ("subject_code_mappings", "subjects")]
+
+
+def _snapshot_actions(db):
+    return [q.action for q in db.executed("ocr_snapshots")]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(snapshots, "_subject_codes", None)
+
+
+def _request(*codes, total=10, confirm_decreases=False):
+    return SnapshotConfirmRequest(
+        entries=[
+            {"course_code": code, "course_name": code, "class_type": "LECTURE", "present": 8, "total": total, "percentage": 80.0}
+            for code in codes
+        ],
+        captured_at=datetime(2025, 1, 20, 10, 0),
+        confirm_decreases=confirm_decreases
+    )
+
+
+class TestMatchSubjectCode:
+    """Mapping, exact code, then case-insensitive code."""
+    
+    def test_precedence(self):
+        index = build_subject_code_index(MAPPINGS, SUBJECTS)
+        
+        assert match_subject_code(index, "DS-LAB") == "subj-3"
+        assert match_subject_code(index, "CS101") == "subj-1"
+        assert match_subject_code(index, " MA201") == "subj-2"
+        assert match_subject_code(index, "XX999") is None
+    
+    def test_mapping_wins_over_code(self):
+        index = build_subject_code_index([{"ocr_code": "CS101", "subject_id": "subj-9"}], SUBJECTS)
+        
+        assert match_subject_code(index, "CS101") == "subj-9"
+
+
+PREVIOUS = {"id": "snap-1", "entries": [{"course_code": "CS101", "present": 9, "total": 12}]}
+CONTEXT = {"student_id": "s1", "batch_id": "b1", "semester_id": "sem"}
+
+
+class TestSnapshotCodeMatching:
+    """The confirm pipeline matches codes from the cached index."""
+    
+    async def test_matched_without_extra_queries(self):
+        db = _snapshot_db()
+        
+        result = await confirm_snapshot_pipeline(db, "s1", CONTEXT, _request("CS101", "MA201", "DS-LAB"))
+        assert result["unmatched"] == []
+        assert _lookups(db) == ["subject_code_mappings", "subjects"]
+        mappings = db.executed("subject_code_mappings")[0]
+        assert (mappings.filter_value("batch_id"), mappings.filter_value("semester_id")) == ("b1", "sem")
+        assert db.executed("subjects")[0].filter_value("semester_id") == "sem"
+        
+        await confirm_snapshot_pipeline(db, "s1", CONTEXT, _request("CS101", "CS103"))
+        assert _lookups(db) == ["subject_code_mappings", "subjects"]
+    
+    async def test_miss_reloads_once(self):
+        db = _snapshot_db()
+        await confirm_snapshot_pipeline(db, "s1", CONTEXT, _request("CS101"))
+        db.rows["subject_code_mappings"].append({"ocr_code": "NEW1", "subject_id": "subj-1"})
+        
+        result = await confirm_snapshot_pipeline(db, "s1", CONTEXT, _request("NEW1", "XX999"))
+        
+        assert result["unmatched"] == ["XX999"]
+        assert len(_lookups(db)) == 4
+
+
+class TestConfirmSnapshotPipeline:
+    """One previous-snapshot read, one insert, matching from the cached index."""
+    
+    async def test_saves_and_returns_stored_row(self):
+        db = _snapshot_db(previous=PREVIOUS)
+        
+        result = await confirm_snapshot_pipeline(db, "s1", CONTEXT, _request("CS101", total=14))
+        
+        latest, insert = db.executed("ocr_snapshots")
+        assert _snapshot_actions(db) == ["select", "insert"]
+        assert (latest.filter_value("student_id"), latest.filter_value("batch_id")) == ("s1", "b1")
+        assert insert.payload["student_id"] == "s1"
+        assert result["decreases"] == []
+        assert result["snapshot"]["id"] == "snap-2"
+        assert result["snapshot"]["entries"][0]["course_code"] == "CS101"
+        assert result["unmatched"] == []
+    
+    async def test_decrease_stops_before_insert(self):
+        db = _snapshot_db(previous=PREVIOUS)
+        
+        result = await confirm_snapshot_pipeline(db, "s1", CONTEXT, _request("CS101"))
+        
+        assert _snapshot_actions(db) == ["select"]
+        assert result["snapshot"] is None
+        assert result["decreases"][0]["old_total"] == 12
+    
+    async def test_confirmed_decrease_is_saved(self):
+        db = _snapshot_db(previous=PREVIOUS)
+        
+        result = await confirm_snapshot_pipeline(
+            db, "s1", CONTEXT, _request("CS101", "MA201", confirm_decreases=True)
+        )
+        
+        assert _snapshot_actions(db) == ["select", "insert"]
+        assert result["snapshot"]["id"] == "snap-2"
+        assert result["decreases"] == []
+
+
+def _entry(code, present, total, class_type="LECTURE"):
+    return {"course_code": code, "class_type": class_type, "present": present, "total": total}
+
+
+class TestDiffSnapshotEntries:
+    """Per-subject changes keyed by code and class type."""
+    
+    def test_added_removed_changed(self):
+        before = [_entry("CS101", 8, 10), _entry("CS101", 4, 5, "LAB"), _entry("MA201", 6, 8)]
+        after = [_entry("CS101", 9, 12), _entry("CS101", 4, 5, "LAB"), _entry("PH101", 1, 1)]
+        
+        changes = diff_snapshot_entries(before, after)
+        
+        assert [(c["course_code"], c["class_type"], c["change_type"]) for c in changes] == [
+            ("CS101", "LECTURE", "changed"),
+            ("PH101", "LECTURE", "added"),
+            ("MA201", "LECTURE", "removed"),
+        ]
+        assert (changes[0]["present_delta"], changes[0]["total_delta"]) == (1, 2)
+        assert changes[2]["total_after"] is None
+        assert changes[2]["total_delta"] == -8
+    
+    def test_first_snapshot_all_added(self):
+        changes = diff_snapshot_entries(None, [_entry("CS101", 8, 10)])
+        
+        assert changes[0]["change_type"] == "added"
+        assert changes[0]["total_before"] is None
+    
+    def test_decrease_ignores_other_class_type(self):
+        previous = {"entries": [_entry("CS101", 4, 5, "LAB"), _entry("CS101", 8, 10)]}
+        request = _request("CS101", total=12)
+        
+        assert find_snapshot_decreases(previous, request.entries) == []
+
+
+def _snapshot_id(n):
+    return f"00000000-0000-0000-0000-{n:012d}"
+
+
+HISTORY = [
+    {"id": _snapshot_id(n), "confirmed_at": f"2025-01-{n:02d}T10:00:00+00:00", "captured_at": None,
+     "source_type": "university_portal", "entries": [_entry("CS101", n, 10), {"subject_code": "CS102", "present": 1, "total": 4}]}
+    for n in (5, 4, 3)
+]
+
+
+@pytest.fixture
+def history_client(make_client):
+    return lambda db: make_client(db, snapshots_router.router)
+
+
+def _percentages_db(installed=True):
+    """
+    FakeDB serving HISTORY; the snapshot_percentages computed field is
+    answered the way Postgres would, or fails as an unknown column.
+    """
+    def ocr_snapshots(query):
+        if "snapshot_percentages" not in query.columns:
+            return HISTORY[:query.limit_count]
+        if not installed:
+            raise APIError({"code": "42703", "message": "column ocr_snapshots.snapshot_percentages does not exist"})
+        return [
+            {"id": s["id"], "confirmed_at": s["confirmed_at"], "percentages": snapshot_percentages(s["entries"])}
+            for s in HISTORY[:query.limit_count]
+        ]
+    
+    return FakeDB({"ocr_snapshots": ocr_snapshots})
+
+
+PERCENTAGES = [
+    {"course_code": "CS101", "class_type": "LECTURE", "percentage": 50.0},
+    {"course_code": "CS102", "percentage": 25.0},
+]
+
+
+class TestSnapshotHistory:
+    """Keyset pages on (confirmed_at, id); projection drops full entries."""
+    
+    def test_first_page_has_cursor(self, history_client):
+        db = FakeDB({"ocr_snapshots": HISTORY})
+        
+        body = history_client(db).get("/snapshots/history?limit=2").json()
+        
+        assert [s["id"] for s in body["snapshots"]] == [_snapshot_id(5), _snapshot_id(4)]
+        assert db.queries[0].limit_count == 3
+        assert db.queries[0].filter_value("student_id") == "s1"
+        assert decode_cursor(body["next_cursor"], ("timestamp", "uuid")) == [HISTORY[1]["confirmed_at"], _snapshot_id(4)]
+    
+    def test_cursor_filters_after_last_row(self, history_client):
+        db = FakeDB({"ocr_snapshots": HISTORY[2:]})
+        cursor = encode_cursor(HISTORY[1]["confirmed_at"], _snapshot_id(4))
+        
+        body = history_client(db).get(f"/snapshots/history?limit=2&cursor={cursor}").json()
+        
+        assert [s["id"] for s in body["snapshots"]] == [_snapshot_id(3)]
+        assert "next_cursor" not in body
+        condition, = db.queries[0].or_filters
+        assert condition.startswith(f'confirmed_at.lt."{HISTORY[1]["confirmed_at"]}"')
+        assert f'id.lt."{_snapshot_id(4)}"' in condition
+    
+    def test_percentages_projection(self, history_client):
+        db = _percentages_db()
+        
+        body = history_client(db).get("/snapshots/history?fields=percentages&limit=1").json()
+        snapshot = body["snapshots"][0]
+        
+        # Only the computed field is selected - entries stay in Postgres
+        assert [q.columns for q in db.queries] == ["id, confirmed_at, percentages:snapshot_percentages"]
+        assert "entries" not in snapshot
+        assert snapshot["percentages"] == PERCENTAGES
+        assert "next_cursor" in body
+    
+    def test_percentages_without_function_reads_entries(self, history_client):
+        db = _percentages_db(installed=False)
+        
+        body = history_client(db).get("/snapshots/history?fields=percentages&limit=1").json()
+        
+        assert [q.columns for q in db.queries] == [
+            "id, confirmed_at, percentages:snapshot_percentages",
+            "id, confirmed_at, entries",
+        ]
+        assert body["snapshots"][0]["percentages"] == PERCENTAGES
+        assert "entries" not in body["snapshots"][0]
+    
+    async def test_full_history_does_not_fall_back(self):
+        def missing_column(query):
+            raise APIError({"code": "42703", "message": "column does not exist"})
+        db = FakeDB({"ocr_snapshots": missing_column})
+        
+        with pytest.raises(APIError):
+            await get_snapshot_history(db, "s1", "b1")
+        
+        assert len(db.queries) == 1
+    
+    def test_bad_cursor(self, history_client):
+        response = history_client(FakeDB({"ocr_snapshots": HISTORY})).get("/snapshots/history?cursor=%%%")
+        
+        assert response.status_code == 400
+    
+    def test_cursor_cannot_break_filter(self, history_client):
+        cursor = encode_cursor(HISTORY[1]["confirmed_at"], 'x"),id.gt.(0')
+        db = FakeDB({"ocr_snapshots": HISTORY})
+        
+        response = history_client(db).get(f"/snapshots/history?cursor={cursor}")
+        
+        assert response.status_code == 400
+        assert not any(q.or_filters for q in db.queries)
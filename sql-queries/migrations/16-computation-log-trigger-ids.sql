@@ -0,0 +1,15 @@
+-- ============================================================================
+-- ENGINE COMPUTATION LOG: COALESCED TRIGGERS
+-- Migration: 16-computation-log-trigger-ids.sql
+-- Purpose: Record every trigger folded into one debounced recompute
+-- ============================================================================
+
+-- The engine debounces recompute triggers per student, so one computation
+-- can serve several manual entries. trigger_id keeps the latest trigger;
+-- trigger_ids keeps all of them.
+
+ALTER TABLE engine_computation_log
+ADD COLUMN IF NOT EXISTS trigger_ids UUID[] DEFAULT '{}';
+
+COMMENT ON COLUMN engine_computation_log.trigger_ids IS
+  'All trigger record IDs coalesced into this computation (debounce window)';
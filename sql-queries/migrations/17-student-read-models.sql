@@ -0,0 +1,47 @@
+-- ============================================================================
+-- STUDENT READ MODELS
+-- Migration: 17-student-read-models.sql
+-- Purpose: One denormalized document per student for the read endpoints
+-- ============================================================================
+
+-- The engine writes this row at the end of every recompute. It holds what
+-- /predictions, /predictions/dashboard and /attendance/summary need
+-- (subject codes/names, counts, percentages, can_bunk, must_attend,
+-- semester name/end), so each of them is a single primary-key read instead
+-- of a join on attendance_summary plus semester_subject_totals/semesters.
+--
+-- Rows are a cache of attendance_summary: when semester totals change the
+-- engine drops the batch's rows and the endpoints fall back to the joined
+-- reads until the next recompute (or a rebuild: python -m app.commands.rebuild_read_models).
+
+CREATE TABLE IF NOT EXISTS student_read_models (
+  student_id UUID PRIMARY KEY REFERENCES students(id) ON DELETE CASCADE,
+  batch_id UUID NOT NULL REFERENCES batches(id) ON DELETE CASCADE,
+  semester_id UUID NOT NULL REFERENCES semesters(id) ON DELETE CASCADE,
+
+  -- Denormalized read document (see app/services/read_models.py)
+  document JSONB NOT NULL,
+
+  computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_student_read_models_batch
+  ON student_read_models(batch_id, semester_id);
+
+-- RLS
+ALTER TABLE student_read_models ENABLE ROW LEVEL SECURITY;
+
+-- Students can read their own read model
+DROP POLICY IF EXISTS "student_read_models_own" ON student_read_models;
+CREATE POLICY "student_read_models_own" ON student_read_models
+  FOR SELECT USING (student_id IN (
+    SELECT student_id FROM app_users WHERE id = auth.uid()
+  ));
+
+-- Engine backend writes
+DROP POLICY IF EXISTS "student_read_models_service_write" ON student_read_models;
+CREATE POLICY "student_read_models_service_write" ON student_read_models
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+COMMENT ON TABLE student_read_models IS
+  'Per-student denormalized dashboard/predictions/summary document, written by the engine on recompute';
@@ -0,0 +1,26 @@
+-- ============================================================================
+-- SEMESTER SUBJECT TOTALS: CUMULATIVE CLASSES
+-- Migration: 18-semester-totals-cumulative-classes.sql
+-- Purpose: Calendar-aware "classes remaining after date D" lookups
+-- ============================================================================
+
+-- Written by the engine alongside total_classes_in_semester:
+-- cumulative_classes[i] is the number of classes held from cumulative_start
+-- through cumulative_start + i days (holidays, vacations, exams and weekly
+-- offs excluded). Remaining classes after D is
+--   total_classes_in_semester - cumulative_classes[D - cumulative_start]
+-- so predictions use the same calendar as the semester totals.
+-- Rows calculated before this migration have NULLs until the totals are
+-- recalculated; the engine falls back to the weekly-slot estimate for them.
+
+ALTER TABLE semester_subject_totals
+ADD COLUMN IF NOT EXISTS cumulative_start DATE;
+
+ALTER TABLE semester_subject_totals
+ADD COLUMN IF NOT EXISTS cumulative_classes INTEGER[];
+
+COMMENT ON COLUMN semester_subject_totals.cumulative_start IS
+  'First date of cumulative_classes (semester teaching period start)';
+
+COMMENT ON COLUMN semester_subject_totals.cumulative_classes IS
+  'Running class count per date from cumulative_start; last element = total_classes_in_semester';
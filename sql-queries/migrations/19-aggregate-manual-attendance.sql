@@ -0,0 +1,36 @@
+-- ============================================================================
+-- MANUAL ATTENDANCE AGGREGATION
+-- Migration: 19-aggregate-manual-attendance.sql
+-- Purpose: Count a student's manual entries in Postgres, not in the engine
+-- ============================================================================
+
+-- The engine needs, per subject, how many PRESENT / ABSENT manual entries
+-- a student has after their latest snapshot date. Grouping here returns a
+-- few rows per subject instead of every manual_attendance row.
+-- Called once per student recompute:
+--   select * from aggregate_manual_attendance('<student>', '2025-01-20');
+-- The engine falls back to selecting the rows if this function is missing.
+-- Served by idx_manual_attendance_date (student_id, event_date).
+
+CREATE OR REPLACE FUNCTION aggregate_manual_attendance(
+  p_student_id UUID,
+  p_after DATE
+) RETURNS TABLE (
+  subject_id UUID,
+  class_type TEXT,
+  status TEXT,
+  entries INTEGER
+) AS $$
+  SELECT
+    m.subject_id,
+    m.class_type,
+    m.status,
+    COUNT(*)::INTEGER AS entries
+  FROM manual_attendance m
+  WHERE m.student_id = p_student_id
+    AND m.event_date > p_after
+  GROUP BY m.subject_id, m.class_type, m.status;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION aggregate_manual_attendance(UUID, DATE) IS
+  'Manual attendance entry counts per subject/class_type/status after a date (engine recompute)';
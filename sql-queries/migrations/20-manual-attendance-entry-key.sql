@@ -0,0 +1,31 @@
+-- ============================================================================
+-- MANUAL ATTENDANCE: ONE ENTRY PER SUBJECT/DATE/CLASS TYPE
+-- Migration: 20-manual-attendance-entry-key.sql
+-- Purpose: Conflict target for bulk manual attendance upserts
+-- ============================================================================
+
+-- The engine treats (student, subject, date, class type) as one entry and
+-- POST /attendance/manual/bulk upserts on exactly those columns. The
+-- existing UNIQUE constraint also includes period_slot, which is usually
+-- NULL, so it never caught duplicates.
+
+-- Keep only the most recently updated row of any duplicates. updated_at
+-- is nullable, so fall back to created_at; every duplicate gets a rank
+-- and all but the first are removed, so no NULL comparison lets one
+-- survive and fail the index below.
+DELETE FROM manual_attendance
+WHERE id IN (
+  SELECT id FROM (
+    SELECT
+      id,
+      ROW_NUMBER() OVER (
+        PARTITION BY student_id, subject_id, event_date, class_type
+        ORDER BY COALESCE(updated_at, created_at, 'epoch'::timestamptz) DESC, id DESC
+      ) AS rank
+    FROM manual_attendance
+  ) ranked
+  WHERE rank > 1
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_manual_attendance_entry
+  ON manual_attendance(student_id, subject_id, event_date, class_type);
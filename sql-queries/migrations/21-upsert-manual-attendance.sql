@@ -0,0 +1,69 @@
+-- ============================================================================
+-- MANUAL ATTENDANCE UPSERT
+-- Migration: 21-upsert-manual-attendance.sql
+-- Purpose: Insert-or-update manual entries in one round trip, with the
+--          status each entry had before (for incremental recomputes)
+-- ============================================================================
+
+-- Replaces SELECT-then-INSERT/UPDATE in the engine: two round trips and a
+-- window in which a retried request could insert a duplicate row.
+-- Conflict target is uq_manual_attendance_entry (migration 20).
+-- On conflict the status and period_slot are updated; snapshot_id keeps the
+-- baseline the entry was first recorded against.
+--
+--   select * from upsert_manual_attendance('[{"student_id": "...",
+--     "subject_id": "...", "snapshot_id": "...", "event_date": "2025-02-03",
+--     "class_type": "LECTURE", "status": "PRESENT", "period_slot": null}]');
+
+CREATE OR REPLACE FUNCTION upsert_manual_attendance(
+  p_rows JSONB
+) RETURNS TABLE (
+  id UUID,
+  subject_id UUID,
+  event_date DATE,
+  class_type TEXT,
+  status TEXT,
+  previous_status TEXT
+) AS $$
+  WITH input AS (
+    SELECT *
+    FROM jsonb_to_recordset(p_rows) AS r(
+      student_id UUID,
+      subject_id UUID,
+      snapshot_id UUID,
+      event_date DATE,
+      class_type TEXT,
+      status TEXT,
+      period_slot INTEGER
+    )
+  ),
+  previous AS (
+    SELECT m.id, m.status
+    FROM manual_attendance m
+    JOIN input i
+      ON m.student_id = i.student_id
+     AND m.subject_id = i.subject_id
+     AND m.event_date = i.event_date
+     AND m.class_type = i.class_type
+    FOR UPDATE OF m
+  ),
+  written AS (
+    INSERT INTO manual_attendance (
+      student_id, subject_id, snapshot_id, event_date, class_type, status, period_slot
+    )
+    SELECT student_id, subject_id, snapshot_id, event_date, class_type, status, period_slot
+    FROM input
+    ON CONFLICT (student_id, subject_id, event_date, class_type) DO UPDATE
+      SET status = EXCLUDED.status,
+          period_slot = EXCLUDED.period_slot
+    RETURNING manual_attendance.id, manual_attendance.subject_id,
+              manual_attendance.event_date, manual_attendance.class_type,
+              manual_attendance.status
+  )
+  SELECT w.id, w.subject_id, w.event_date, w.class_type, w.status, p.status
+  FROM written w
+  LEFT JOIN previous p ON p.id = w.id;
+$$ LANGUAGE sql VOLATILE;
+
+COMMENT ON FUNCTION upsert_manual_attendance(JSONB) IS
+  'Insert or update manual attendance entries; returns each id with its previous status (NULL if inserted)';
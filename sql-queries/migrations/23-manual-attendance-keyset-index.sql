@@ -0,0 +1,15 @@
+-- ============================================================================
+-- MANUAL ATTENDANCE KEYSET INDEX
+-- Migration: 23-manual-attendance-keyset-index.sql
+-- Purpose: Index for GET /attendance/manual keyset pages on (event_date, id)
+-- ============================================================================
+
+-- The engine pages a student's manual entries newest first with
+--   WHERE student_id = $1
+--     AND (event_date < $2 OR (event_date = $2 AND id < $3))
+--   ORDER BY event_date DESC, id DESC LIMIT n
+-- This index serves every page as a range scan. Without it, the id
+-- tiebreak within a day needs a sort.
+
+CREATE INDEX IF NOT EXISTS idx_manual_attendance_keyset
+  ON manual_attendance(student_id, event_date DESC, id DESC);
@@ -0,0 +1,41 @@
+-- ============================================================================
+-- SNAPSHOT PERCENTAGES
+-- Migration: 24-snapshot-percentages.sql
+-- Purpose: Per-subject percentages of a snapshot, computed in Postgres
+-- ============================================================================
+
+-- GET /snapshots/history?fields=percentages returns each subject's code,
+-- class type and percentage per snapshot. Taking a row of ocr_snapshots
+-- makes this a PostgREST computed field, so the engine selects
+--   select=id,confirmed_at,percentages:snapshot_percentages
+-- and only the reduced list leaves the database, not the full entries
+-- JSON. Entries without a code are skipped; a missing percentage is
+-- derived from present/total (0 when total is 0), as the engine does.
+-- The engine falls back to reading entries if this function is missing.
+
+CREATE OR REPLACE FUNCTION snapshot_percentages(s ocr_snapshots)
+RETURNS JSONB AS $$
+  SELECT COALESCE(
+    jsonb_agg(
+      jsonb_build_object(
+        'course_code', COALESCE(e->>'course_code', e->>'subject_code'),
+        'class_type', e->>'class_type',
+        'percentage', COALESCE(
+          (e->>'percentage')::NUMERIC,
+          CASE
+            WHEN COALESCE((e->>'total')::NUMERIC, 0) > 0
+              THEN ROUND(COALESCE((e->>'present')::NUMERIC, 0) / (e->>'total')::NUMERIC * 100, 2)
+            ELSE 0
+          END
+        )
+      )
+      ORDER BY t.ord
+    ),
+    '[]'::JSONB
+  )
+  FROM jsonb_array_elements(s.entries) WITH ORDINALITY AS t(e, ord)
+  WHERE COALESCE(e->>'course_code', e->>'subject_code') IS NOT NULL;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION snapshot_percentages(ocr_snapshots) IS
+  'Per-subject code, class type and percentage of a snapshot (history percentages projection)';